@@ -0,0 +1,103 @@
+"""
+跨请求微批处理的负载测试: 模拟大量会话同时进行查询向量化和 rerank。
+
+Usage:
+    python -m benchmarks.batching_load_test [--sessions 64] [--rounds 3]
+
+向量化使用一个模拟的同步模型 (每次调用有固定开销, 每条文本另有少量开销, 在线程池中运行);
+rerank 使用 tests/stubs.py 中的本地桩服务, 每个请求固定延迟。每个会话的查询向量化互不相同,
+rerank 查询从少量热门问题中选取。"unbatched" 模式把批大小设为 1, 其余代码路径完全相同。
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from src import metrics
+from src.embeddings import QueryEmbedder
+from src.rerank_client import RerankClient
+from tests.stubs import create_rerank_app, serve
+
+EMBED_OVERHEAD = 0.02  # 每次向量化调用的固定开销 (秒)
+EMBED_PER_ITEM = 0.001  # 每条文本的额外开销 (秒)
+RERANK_DELAY = 0.03  # 桩 rerank 服务每个请求的延迟 (秒)
+POPULAR_QUERIES = [f"tell me about the blue bowl {i}" for i in range(8)]
+DOCUMENTS = [f"candidate chunk {i} about a blue and white bowl" for i in range(8)]
+
+
+def fake_embedding_function(texts: list[str]) -> list[list[float]]:
+    time.sleep(EMBED_OVERHEAD + EMBED_PER_ITEM * len(texts))
+    return [[float(len(text))] for text in texts]
+
+
+async def session(embedder: QueryEmbedder, client: RerankClient, query_id: int):
+    start = time.perf_counter()
+    await embedder.embed(f"unique question number {query_id}")
+    scores = await client.scores(random.choice(POPULAR_QUERIES), DOCUMENTS)
+    assert scores is not None
+    return time.perf_counter() - start
+
+
+async def run(url: str, batched: bool, sessions: int, rounds: int) -> dict:
+    options = {} if batched else {"max_batch_size": 1, "max_wait": 0}
+    embedder = QueryEmbedder(fake_embedding_function, cache_size=0, **options)
+    client = RerankClient(endpoint=url, api_key="test", deadline=30, **options)
+
+    latencies = []
+    start = time.perf_counter()
+    for round_id in range(rounds):
+        latencies += await asyncio.gather(
+            *(
+                session(embedder, client, round_id * sessions + i)
+                for i in range(sessions)
+            )
+        )
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+
+    latencies.sort()
+    return {
+        "throughput": sessions * rounds / elapsed,
+        "p50": statistics.median(latencies),
+        "p99": latencies[max(int(len(latencies) * 0.99) - 1, 0)],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Micro-batching load test")
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    app = create_rerank_app(delay=RERANK_DELAY)
+    with serve(app) as base_url:
+        url = f"{base_url}/rerank"
+        print(f"{args.sessions} concurrent sessions x {args.rounds} rounds")
+        print(
+            f"{'mode':>10} {'sessions/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'speedup':>8}"
+        )
+        baseline = None
+        for mode in ["unbatched", "batched"]:
+            app.state.requests.clear()
+            result = await run(url, mode == "batched", args.sessions, args.rounds)
+            baseline = baseline or result["throughput"]
+            print(
+                f"{mode:>10} {result['throughput']:>11.1f} {result['p50'] * 1000:>8.0f}"
+                f" {result['p99'] * 1000:>8.0f} {result['throughput'] / baseline:>7.1f}x"
+                f"   ({len(app.state.requests)} rerank requests)"
+            )
+
+    histograms = metrics.snapshot()["histograms"]
+    for name in ["query_embedding", "rerank"]:
+        size = histograms[f"batch.{name}.size"]
+        depth = histograms[f"batch.{name}.queue_depth"]
+        print(
+            f"batch.{name}: size p50={size['p50']} p99={size['p99']}, "
+            f"queue depth p99={depth['p99']}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
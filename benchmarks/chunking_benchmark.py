@@ -0,0 +1,189 @@
+"""
+对比整篇文档入库 + format_docs (优化前) 与按章节分块 + 父文档展开 + 上下文打包 (优化后)
+的提示词大小和端到端延迟。
+
+Usage:
+    python -m benchmarks.chunking_benchmark [--docs data/Objectifying_China/docs] [--generate]
+
+两种模式分别建立一个内存 Chroma 集合, 对同一组问题执行向量检索并拼出生成器的提示词。
+不加 --generate 时只统计提示词大小和检索耗时; 加上后还会调用 `rag_generator`
+(需要 Azure OpenAI 配置), 统计首 token 延迟和端到端耗时。
+--hash-embeddings 用词哈希向量代替默认的向量化模型, 只用于在没有模型的环境中检查脚本本身。
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import statistics
+import time
+from pathlib import Path
+
+import chromadb
+from langchain_core.documents import Document
+
+from src.chunking import chunk_document, embedding_text, expand_to_parents
+from src.context_packer import pack_context
+from src.prompts import GENERATOR_PROMPT
+from src.retrieval_graph import FINAL_DOCS_COUNT, VECTOR_N_RESULTS
+from src.utils import estimate_tokens
+
+LEGACY_FINAL_DOCS_COUNT = 3  # 分块前送入提示词的整篇文档数量
+QUERIES = [
+    "What is Kraak porcelain?",
+    "Why did European collectors mount Chinese porcelain in gilt silver?",
+    "Where did the word porcelain come from?",
+    "Tell me about the plate with a coat of arms.",
+    "How was porcelain used as ballast in merchant ships?",
+    "什麼是粉彩？",
+    "歐洲瓷廠是如何發現製瓷秘方的？",
+    "What is a kendi used for?",
+]
+
+
+def format_docs(docs: list[Document]) -> str:
+    """优化前生成器使用的上下文格式: 不设上限地拼接所有文档。"""
+    formatted = ""
+    for idx, doc in enumerate(docs):
+        formatted += f"DOC{idx + 1}: {doc.page_content}\n\n"
+    return formatted
+
+
+def hash_embeddings(texts: list[str], dim: int = 256) -> list[list[float]]:
+    vectors = []
+    for text in texts:
+        vector = [0.0] * dim
+        for word in re.findall(r"\w+", text.lower()):
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dim] += 1.0
+        vectors.append(vector)
+    return vectors
+
+
+def load_corpus(docs_path: Path) -> list[tuple[str, str, dict]]:
+    corpus = []
+    for filepath in sorted(docs_path.glob("*.json")):
+        with open(filepath, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        data["metadata"].pop("description", None)
+        data["metadata"].pop("images", None)
+        corpus.append((data["ids"], data["documents"], data["metadata"]))
+    return corpus
+
+
+def build_collection(client, name: str, corpus, chunked: bool, embed):
+    collection = client.create_collection(name=name)
+    ids, documents, metadatas = [], [], []
+    for doc_id, document, metadata in corpus:
+        if chunked:
+            chunk_ids, chunk_texts, chunk_metadatas = chunk_document(
+                doc_id, document, metadata
+            )
+        else:
+            chunk_ids, chunk_texts, chunk_metadatas = [doc_id], [document], [metadata]
+        ids.extend(chunk_ids)
+        documents.extend(chunk_texts)
+        metadatas.extend(chunk_metadatas)
+
+    texts = [
+        embedding_text(d, m) if chunked else d for d, m in zip(documents, metadatas)
+    ]
+    collection.add(
+        ids=ids, documents=documents, metadatas=metadatas, embeddings=embed(texts)
+    )
+    return collection
+
+
+def retrieve(collection, query: str, chunked: bool, embed):
+    from langchain_core.documents import Document
+
+    results = collection.query(
+        query_embeddings=embed([query]),
+        n_results=VECTOR_N_RESULTS,
+        include=["documents", "metadatas"],
+    )
+    docs = [
+        Document(id=i, page_content=d, metadata=m)
+        for i, d, m in zip(
+            results["ids"][0], results["documents"][0], results["metadatas"][0]
+        )
+    ]
+    if chunked:
+        return expand_to_parents(docs[:FINAL_DOCS_COUNT])
+    return docs[:LEGACY_FINAL_DOCS_COUNT]
+
+
+async def generate(docs: str, query: str) -> tuple[float, float]:
+    """返回 (首 token 延迟, 生成总耗时)"""
+    from src.chains import rag_generator
+
+    start = time.perf_counter()
+    first_token = None
+    async for _ in rag_generator.astream({"query": query, "docs": docs}):
+        if first_token is None:
+            first_token = time.perf_counter() - start
+    return first_token or 0.0, time.perf_counter() - start
+
+
+async def run_mode(collection, chunked: bool, embed, with_generation: bool) -> dict:
+    stats = {"chars": [], "tokens": [], "retrieval": [], "ttft": [], "e2e": []}
+    for query in QUERIES:
+        start = time.perf_counter()
+        docs = retrieve(collection, query, chunked, embed)
+        retrieval = time.perf_counter() - start
+
+        # 分块后的流程使用带 token 预算的上下文打包
+        formatted = pack_context(docs).text if chunked else format_docs(docs)
+        prompt = GENERATOR_PROMPT + formatted + query
+        stats["chars"].append(len(prompt))
+        stats["tokens"].append(estimate_tokens(prompt))
+        stats["retrieval"].append(retrieval)
+
+        if with_generation:
+            ttft, total = await generate(formatted, query)
+            stats["ttft"].append(retrieval + ttft)
+            stats["e2e"].append(retrieval + total)
+    return stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark section-level chunking")
+    parser.add_argument("--docs", default="data/Objectifying_China/docs")
+    parser.add_argument("--generate", action="store_true")
+    parser.add_argument("--hash-embeddings", action="store_true")
+    args = parser.parse_args()
+
+    if args.hash_embeddings:
+        embed = hash_embeddings
+    else:
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+        embed = DefaultEmbeddingFunction()
+
+    corpus = load_corpus(Path(args.docs))
+    client = chromadb.EphemeralClient()
+    modes = {
+        "whole": build_collection(client, "bench_whole", corpus, False, embed),
+        "chunked": build_collection(client, "bench_chunked", corpus, True, embed),
+    }
+    print(
+        f"{len(corpus)} documents -> {modes['chunked'].count()} chunks, "
+        f"{len(QUERIES)} queries"
+    )
+
+    print(
+        f"{'mode':>8} {'prompt chars':>13} {'~tokens':>9} {'retrieval ms':>13}"
+        f" {'ttft ms':>9} {'e2e ms':>9}"
+    )
+    for mode, collection in modes.items():
+        stats = await run_mode(collection, mode == "chunked", embed, args.generate)
+        mean = lambda key: statistics.mean(stats[key]) if stats[key] else float("nan")
+        print(
+            f"{mode:>8} {mean('chars'):>13.0f} {mean('tokens'):>9.0f}"
+            f" {mean('retrieval') * 1000:>13.1f} {mean('ttft') * 1000:>9.0f}"
+            f" {mean('e2e') * 1000:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+对比 preprocess 三种模式在整个语料上的分词吞吐量 (tokens/second)。
+
+Usage:
+    python -m benchmarks.preprocess_benchmark [--docs data/Objectifying_China/docs] [--repeat 3]
+
+需要先下载 en_core_web_sm 和 zh_core_web_sm 模型 (见 README); 加上 --blank 时改用空白管线,
+只用于在没有模型的环境中检查脚本本身。
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from src import utils
+from src.utils import preprocess
+
+MODES = ["pipeline", "batched", "lookup"]
+
+
+def load_corpus(docs_path: Path) -> list[str]:
+    corpus = []
+    for filepath in sorted(docs_path.glob("*.json")):
+        with open(filepath, "r", encoding="utf-8") as f:
+            corpus.append(json.load(f)["documents"])
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preprocess tokenization")
+    parser.add_argument("--docs", default="data/Objectifying_China/docs")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--blank", action="store_true")
+    args = parser.parse_args()
+
+    if args.blank:
+        import spacy
+
+        utils.en_nlp = spacy.blank("en")
+        utils.zh_nlp = spacy.blank("zh")
+
+    corpus = load_corpus(Path(args.docs))
+    # 预热: 加载模型不计入耗时
+    for mode in MODES:
+        preprocess(corpus[0], mode=mode)
+
+    baseline = None
+    print(f"{len(corpus)} documents, {sum(len(doc) for doc in corpus)} characters")
+    print(
+        f"{'mode':>10} {'tokens':>10} {'seconds':>10} {'tokens/s':>12} {'speedup':>8}"
+    )
+    for mode in MODES:
+        best = float("inf")
+        num_tokens = 0
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            num_tokens = sum(len(preprocess(doc, mode=mode)) for doc in corpus)
+            best = min(best, time.perf_counter() - start)
+        baseline = baseline or best
+        print(
+            f"{mode:>10} {num_tokens:>10} {best:>10.3f} "
+            f"{num_tokens / best:>12.0f} {baseline / best:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
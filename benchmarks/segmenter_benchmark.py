@@ -0,0 +1,114 @@
+"""
+对比旧版 (每个 token 重新 findall 整个缓冲区) 与增量分句器的单 token 开销。
+
+Usage:
+    python -m benchmarks.segmenter_benchmark [--tokens 4000] [--skip-legacy]
+
+两种实现都使用不会触发切分的阈值, 缓冲区随回答一起增长, 这是旧实现的最坏情况。
+输出每个区间内平均每个 token 的耗时 (微秒), 增量实现应当随回答变长保持平稳:
+最后一个区间的耗时超过前两个区间较小值的 FLAT_TOLERANCE 倍时报错。
+旧实现是平方复杂度, 长回答 (例如 --tokens 80000) 时用 --skip-legacy 只测增量实现。
+"""
+
+import argparse
+import math
+import re
+import time
+
+from src.segmenter import SentenceSegmenter
+
+FLAT_TOLERANCE = 3.0
+
+LEGACY_PATTERN = re.compile(r"(.*?)[。！？!:\.\?][\n\s]", flags=re.MULTILINE)
+
+SAMPLE_TOKENS = [
+    "這件",
+    "瓷碗",
+    "來自",
+    "清代",
+    "，",
+    "釉色",
+    "翠綠",
+    "。 ",
+    "The ",
+    "bowl ",
+    "shows ",
+    "horses ",
+    "and ",
+    "waves",
+    ". ",
+    "![](",
+    "/static/images/objectifying_china/1_1.jpeg",
+    ")\n",
+]
+
+
+def legacy_add_chunk(buffer: str, chunk: str, num_sentence_cached: int) -> str:
+    """旧版 AudioAccumulator.add_chunk 的分句逻辑。"""
+    buffer += chunk
+    sentences = LEGACY_PATTERN.findall(buffer)
+    if len(sentences) >= num_sentence_cached:
+        pos = buffer.rfind(sentences[-1])
+        if pos != -1:
+            buffer = buffer[pos + len(sentences[-1]) + 2 :]
+    return buffer
+
+
+def run_legacy(tokens: list[str], bucket: int) -> list[float]:
+    buffer = ""
+    costs = []
+    start = time.perf_counter()
+    for idx, token in enumerate(tokens, start=1):
+        buffer = legacy_add_chunk(buffer, token, num_sentence_cached=len(tokens))
+        if idx % bucket == 0:
+            now = time.perf_counter()
+            costs.append((now - start) / bucket * 1e6)
+            start = now
+    return costs
+
+
+def run_incremental(tokens: list[str], bucket: int) -> list[float]:
+    segmenter = SentenceSegmenter()
+    costs = []
+    start = time.perf_counter()
+    for idx, token in enumerate(tokens, start=1):
+        if segmenter.feed(token) >= len(tokens):
+            segmenter.pop_sentences()
+        if idx % bucket == 0:
+            now = time.perf_counter()
+            costs.append((now - start) / bucket * 1e6)
+            start = now
+    return costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sentence segmentation")
+    parser.add_argument("--tokens", type=int, default=4000)
+    parser.add_argument("--bucket", type=int, default=500)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    tokens = [SAMPLE_TOKENS[i % len(SAMPLE_TOKENS)] for i in range(args.tokens)]
+    incremental = run_incremental(tokens, args.bucket)
+    if args.skip_legacy:
+        legacy = [math.nan] * len(incremental)
+    else:
+        legacy = run_legacy(tokens, args.bucket)
+
+    print(
+        f"{'tokens':>8} {'chars':>8} {'legacy us/token':>16} {'incremental us/token':>21}"
+    )
+    for idx, (old, new) in enumerate(zip(legacy, incremental), start=1):
+        n = idx * args.bucket
+        chars = len("".join(tokens[:n]))
+        print(f"{n:>8} {chars:>8} {old:>16.2f} {new:>21.2f}")
+
+    baseline = min(incremental[:2])
+    assert incremental[-1] <= FLAT_TOLERANCE * baseline, (
+        f"incremental per-token cost grew from {baseline:.2f} to "
+        f"{incremental[-1]:.2f} us as the answer got longer"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+对比 astream_events 过滤 (优化前) 与 stream_mode="custom" (优化后) 两种文本流的开销。
+
+Usage:
+    python -m benchmarks.streaming_benchmark [--sessions 32] [--tokens 400]
+
+模型替换为不带延迟的 FakeListChatModel, 每个字符作为一个 token 流式输出; 查询为寒暄,
+由本地路由直接判定为不需要 RAG, 不涉及网络请求。本地和远程两个模型层级都替换为假模型,
+降级阈值高于并发会话数, 路由复核关闭, 测得的开销只包含流式输出路径本身。所有会话在同一个事件循环中并发运行,
+因此进程 CPU 时间即为事件循环的 CPU 时间。"raw" 直接迭代生成 chain 本身, 作为基线;
+每个 token 的额外开销为各模式与基线之差。
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+# 导入 src.chains 时会创建 Azure 客户端, 基准测试使用占位配置, 不会发出真实请求
+os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-10-21")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1:9")
+os.environ.setdefault("AZURE_OPENAI_DEPLOYEMENT", "gpt-4o")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("ROUTER_CACHE_PATH", "")
+os.environ.setdefault("LOCAL_ROUTER_AUDIT_RATE", "0")
+
+from langchain_core.language_models import FakeListChatModel
+
+from src import chains
+from src.graph import graph
+
+QUERY = "hello"
+
+
+async def raw_session() -> int:
+    tokens = 0
+    async for chunk in chains.direct_generator.astream({"query": QUERY}):
+        tokens += bool(chunk.content)
+    return tokens
+
+
+async def events_session() -> int:
+    """优化前 main.py 中 text_generation_task 的做法。"""
+    tokens = 0
+    generator_id = None
+    graph_input = {"messages": [{"role": "user", "content": QUERY}], "doc_id": None}
+    async for event in graph.astream_events(graph_input, version="v2"):
+        if generator_id is None and event["name"] == "generator":
+            generator_id = event["run_id"]
+        if (
+            event["event"] == "on_chat_model_stream"
+            and generator_id in event["parent_ids"]
+        ):
+            tokens += bool(event["data"]["chunk"].content)
+    return tokens
+
+
+async def custom_session() -> int:
+    tokens = 0
+    graph_input = {"messages": [{"role": "user", "content": QUERY}], "doc_id": None}
+    async for update in graph.astream(graph_input, stream_mode="custom"):
+        tokens += "chunk" in update
+    return tokens
+
+
+async def run(session, sessions: int) -> tuple[float, float, int]:
+    """返回 (墙钟时间, CPU 时间, token 总数)"""
+    start, cpu_start = time.perf_counter(), time.process_time()
+    tokens = sum(await asyncio.gather(*(session() for _ in range(sessions))))
+    return time.perf_counter() - start, time.process_time() - cpu_start, tokens
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark token streaming paths")
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--tokens", type=int, default=400)
+    args = parser.parse_args()
+
+    reply = ("The museum opens at nine. " * args.tokens)[: args.tokens]
+    chains.remote.llm = FakeListChatModel(responses=[reply])
+    chains.local.llm = FakeListChatModel(responses=[reply])
+    chains.DEGRADE_CONCURRENCY = args.sessions + 1
+
+    modes = {"raw": raw_session, "events": events_session, "custom": custom_session}
+    await run(custom_session, 1)  # 预热
+
+    print(f"{args.sessions} sessions x {args.tokens} tokens")
+    print(
+        f"{'mode':>7} {'wall s':>8} {'cpu ms/session':>15} {'us/token':>9}"
+        f" {'overhead us/token':>18}"
+    )
+    baseline = None
+    for mode, session in modes.items():
+        wall, cpu, tokens = await run(session, args.sessions)
+        per_token = cpu / tokens * 1e6
+        baseline = per_token if baseline is None else baseline
+        print(
+            f"{mode:>7} {wall:>8.2f} {cpu / args.sessions * 1000:>15.1f}"
+            f" {per_token:>9.1f} {per_token - baseline:>18.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+import json
+from pathlib import Path
+
+from src.accumulator import AudioAccumulator
+from src.graph import graph
+from src.narration_pack import (
+    AUDIO_DIR_NAME,
+    DEFAULT_NARRATION_QUERY,
+    NARRATION_DIR,
+    audio_filename,
+    document_hash,
+    read_manifest,
+    write_manifest,
+)
+from src.segmenter import SEGMENTATION_POLICY
+from src.utils import get_tts
+
+TTS_CONCURRENCY = 4  # 每个展品同时合成的音频段落数量
+DOC_CONCURRENCY = 2  # 同时生成讲解的展品数量
+
+
+def load_sources() -> dict[str, Path]:
+    """收集 data/*/docs 下所有文档, 返回 doc_id 到源文件的映射"""
+    sources = {}
+    for filepath in Path("data").glob("*/docs/*.json"):
+        try:
+            with open(filepath, "r", encoding="utf-8") as f:
+                sources[json.load(f)["ids"]] = filepath
+        except (json.JSONDecodeError, KeyError):
+            print(f"Error loading {filepath}")
+    return sources
+
+
+async def narrate(doc_id: str, source_hash: str, audio_dir: Path, concurrency: int):
+    """用现有的 graph 生成讲解文本, 再按实时服务相同的分段策略并发合成音频"""
+    result = await graph.ainvoke(
+        {
+            "messages": [{"role": "user", "content": DEFAULT_NARRATION_QUERY}],
+            "doc_id": doc_id,
+        }
+    )
+    text = result["messages"][-1].content
+
+    acc = AudioAccumulator(
+        tts_function=get_tts(), max_concurrency=concurrency, policy=SEGMENTATION_POLICY
+    )
+    await acc.add_chunk(text)
+    await acc.flush()
+
+    audio = []
+    async for audio_chunk in acc:
+        filename = audio_filename(source_hash, len(audio))
+        (audio_dir / filename).write_bytes(audio_chunk)
+        audio.append(filename)
+
+    # 同步 TTS 每段产出一个音频文件; 有段落合成失败时不记录哈希, 下次运行重新生成
+    if len(audio) != acc.num_segments:
+        print(f"{doc_id}: {acc.num_segments - len(audio)} audio segments failed")
+        return {"text": text, "audio": audio}
+    return {"hash": source_hash, "text": text, "audio": audio}
+
+
+async def run(output: Path, force: bool, concurrency: int, jobs: int):
+    manifest = read_manifest(output)
+    entries = manifest["entries"]
+    audio_dir = output / AUDIO_DIR_NAME
+    audio_dir.mkdir(parents=True, exist_ok=True)
+
+    sources = load_sources()
+    hashes = {doc_id: document_hash(path) for doc_id, path in sources.items()}
+    stale = [
+        doc_id
+        for doc_id, source_hash in hashes.items()
+        if force or entries.get(doc_id, {}).get("hash") != source_hash
+    ]
+    removed = [doc_id for doc_id in entries if doc_id not in sources]
+    print(
+        f"{len(sources)} documents, {len(stale)} to regenerate, {len(removed)} removed."
+    )
+    if not stale and not removed:
+        return
+
+    semaphore = asyncio.Semaphore(jobs)
+
+    async def _narrate(doc_id: str):
+        async with semaphore:
+            try:
+                entry = await narrate(doc_id, hashes[doc_id], audio_dir, concurrency)
+            except Exception as e:
+                print(f"Failed to narrate {doc_id}: {e}")
+                return
+            entries[doc_id] = entry
+            print(f"Narrated {doc_id} ({len(entry['audio'])} audio segments)")
+
+    await asyncio.gather(*(_narrate(doc_id) for doc_id in stale))
+    for doc_id in removed:
+        entries.pop(doc_id)
+
+    manifest["version"] += 1
+    write_manifest(output, manifest)
+    print(f"Saved narration pack v{manifest['version']} to {output}")
+
+    # 清单替换后再删除不再引用的音频文件
+    referenced = {filename for entry in entries.values() for filename in entry["audio"]}
+    for path in audio_dir.glob("*.mp3"):
+        if path.name not in referenced:
+            path.unlink()
+
+
+def main():
+    """
+    Usage:
+        python narrate.py [--force] [--concurrency N] [--jobs N]
+
+    This script pre-renders the narration for every QR-code exhibit in
+    'data/*/docs'. Each document is run through the existing graph with a
+    default "tell me about this object" query, and the answer is synthesized
+    with the same segmentation policy used by the live service. The text and
+    audio are written to a versioned pack under 'static/narrations', which
+    the WebSocket endpoint streams from when a scan has no custom question.
+
+    Only documents whose source file hash changed since the last run are
+    regenerated; entries of deleted documents are dropped.
+
+    Arguments:
+        --force         Regenerate every entry regardless of its hash.
+        --concurrency   Audio segments synthesized in parallel per document.
+        --jobs          Documents narrated in parallel.
+    """
+    parser = argparse.ArgumentParser(description="Pre-render the narration pack")
+    parser.add_argument(
+        "--force", action="store_true", help="Regenerate all narrations"
+    )
+    parser.add_argument("--concurrency", type=int, default=TTS_CONCURRENCY)
+    parser.add_argument("--jobs", type=int, default=DOC_CONCURRENCY)
+    parser.add_argument("--output", type=Path, default=NARRATION_DIR)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.output, args.force, args.concurrency, args.jobs))
+
+
+if __name__ == "__main__":
+    main()
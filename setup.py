@@ -1,8 +1,187 @@
 import argparse
+import hashlib
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
 
 from chromadb import PersistentClient
+from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+from src.bm25_index import BM25Index
+from src.chunking import (
+    CHUNK_MAX_CHARS,
+    CHUNK_MIN_CHARS,
+    chunk_document,
+    embedding_text,
+)
+from src.doc_store import write_version
+from src.retrieval_graph import (
+    BM25_INDEX_PATH,
+    CLIENT_PATH,
+    COLLECTION_NAME,
+    VERSION_PATH,
+)
+
+DOCS_GLOB = "data/*/docs/*.json"
+MANIFEST_PATH = Path(CLIENT_PATH) / "ingest_manifest.json"  # doc_id -> 内容哈希
+UPSERT_BATCH_SIZE = 64  # 每次 upsert 的片段数量
+DOCS_PER_TASK = 16  # 每个工作线程任务解析和向量化的文档数量
+NUM_WORKERS = 4  # 并行解析和向量化的线程数量
+
+_timings_lock = threading.Lock()
+
+
+@contextmanager
+def timed(timings: dict[str, float], phase: str):
+    """累计每个阶段的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _timings_lock:
+            timings[phase] = timings.get(phase, 0.0) + elapsed
+
+
+def load_document(filepath: Path) -> tuple[str, str, dict] | None:
+    """读取一个文档文件, 返回 (id, 文本, 元数据), 文件格式错误时返回 None"""
+    with open(filepath.absolute(), "r", encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Error loading {filepath}")
+            return None
+
+    data["metadata"].pop("description", None)
+    data["metadata"].pop("images", None)
+    return data["ids"], data["documents"], data["metadata"]
+
+
+def content_hash(document: str, metadata: dict) -> str:
+    """写入集合的内容 (文本、元数据和分块参数) 的哈希, 与源文件的格式无关"""
+    payload = json.dumps(
+        [document, metadata, CHUNK_MAX_CHARS, CHUNK_MIN_CHARS],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def scan_document(filepath: Path) -> tuple[str, str, Path] | None:
+    """只保留 (id, 哈希, 路径), 未变化的文档不会常驻内存"""
+    loaded = load_document(filepath)
+    if loaded is None:
+        return None
+    doc_id, document, metadata = loaded
+    return doc_id, content_hash(document, metadata), filepath
+
+
+def read_manifest(path: Path = MANIFEST_PATH) -> dict[str, str]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def write_manifest(manifest: dict[str, str], path: Path = MANIFEST_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def embed_batch(filepaths: list[Path], embedding_function, timings: dict[str, float]):
+    """在工作线程中重新读取一批变化的文档, 分块并向量化"""
+    parent_ids, ids, documents, metadatas = [], [], [], []
+    for filepath in filepaths:
+        loaded = load_document(filepath)
+        if loaded is None:
+            continue
+        parent_ids.append(loaded[0])
+        chunk_ids, chunk_texts, chunk_metadatas = chunk_document(*loaded)
+        ids.extend(chunk_ids)
+        documents.extend(chunk_texts)
+        metadatas.extend(chunk_metadatas)
+
+    with timed(timings, "embed (summed over workers)"):
+        texts = [embedding_text(d, m) for d, m in zip(documents, metadatas)]
+        embeddings = embedding_function(texts) if texts else []
+    return parent_ids, ids, documents, metadatas, embeddings
+
+
+def ingest(
+    collection,
+    manifest: dict[str, str],
+    docs_glob: str = DOCS_GLOB,
+    embedding_function=None,
+    batch_size: int = UPSERT_BATCH_SIZE,
+    num_workers: int = NUM_WORKERS,
+    docs_per_task: int = DOCS_PER_TASK,
+) -> tuple[dict[str, str], dict[str, float], bool]:
+    """
+    按内容哈希增量同步集合: 跳过未变化的文档, 删除源文件已不存在的文档,
+    变化的文档分批并行解析、分块、向量化后按固定批大小 upsert 片段。
+
+    返回新的清单、各阶段耗时以及集合是否有变化。
+    """
+    timings: dict[str, float] = {}
+    embedding_function = embedding_function or DefaultEmbeddingFunction()
+
+    with timed(timings, "scan"):
+        filepaths = sorted(Path().glob(docs_glob))
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            scanned = [s for s in executor.map(scan_document, filepaths) if s]
+
+    with timed(timings, "diff"):
+        hashes = {doc_id: doc_hash for doc_id, doc_hash, _ in scanned}
+        changed = [
+            (doc_id, filepath)
+            for doc_id, doc_hash, filepath in scanned
+            if manifest.get(doc_id) != doc_hash
+        ]
+        deleted = [doc_id for doc_id in manifest if doc_id not in hashes]
+    print(
+        f"Found {len(scanned)} documents: {len(changed)} new or changed, "
+        f"{len(scanned) - len(changed)} unchanged, {len(deleted)} deleted."
+    )
+
+    new_manifest = {
+        doc_id: doc_hash for doc_id, doc_hash in manifest.items() if doc_id in hashes
+    }
+
+    # 删除变化和已删除文档的旧片段 (片段数量可能减少), 以及未分块时写入的整篇文档
+    stale = [doc_id for doc_id, _ in changed] + deleted
+    if stale:
+        with timed(timings, "delete"):
+            collection.delete(where={"parent_id": {"$in": stale}})
+            collection.delete(ids=stale)
+
+    tasks = [
+        [filepath for _, filepath in changed[i : i + docs_per_task]]
+        for i in range(0, len(changed), docs_per_task)
+    ]
+    with timed(timings, "embed + upsert"):
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            futures = [
+                executor.submit(embed_batch, task, embedding_function, timings)
+                for task in tasks
+            ]
+            # 已完成的任务立即写入, 其余任务继续在工作线程中解析和向量化
+            for future in as_completed(futures):
+                parent_ids, ids, documents, metadatas, embeddings = future.result()
+                for i in range(0, len(ids), batch_size):
+                    with timed(timings, "upsert"):
+                        collection.upsert(
+                            ids=ids[i : i + batch_size],
+                            documents=documents[i : i + batch_size],
+                            metadatas=metadatas[i : i + batch_size],
+                            embeddings=embeddings[i : i + batch_size],
+                        )
+                for doc_id in parent_ids:
+                    new_manifest[doc_id] = hashes[doc_id]
+                print(f"Upserted {len(ids)} chunks from {len(parent_ids)} documents.")
+
+    return new_manifest, timings, bool(changed or deleted)
 
 
 def main():
@@ -11,11 +190,16 @@ def main():
         python backend/setup.py [--reset]
 
     This script sets up the ChromaDB vector database with documents from the
-    'data/Objectifying_China/docs' directory.
+    'data/*/docs' directories.
 
-    By default, it will update the existing 'museum_knowledge_base' collection
-    with the latest documents. This is an 'upsert' operation, meaning it will
-    add new documents and update existing ones based on their IDs.
+    By default, it incrementally updates the existing 'museum_knowledge_base'
+    collection. A manifest of content hashes per document id is kept next to
+    the database: unchanged documents are skipped, documents whose source
+    file was deleted are removed from the collection, and new or changed
+    documents are split into heading- and paragraph-aware chunks (each
+    carrying its parent document id), embedded in parallel and upserted in
+    fixed-size batches. Afterwards the BM25 keyword index is rebuilt from the whole
+    collection and a timing report per phase is printed.
 
     Arguments:
         --reset     If this flag is provided, the script will first delete the
@@ -33,8 +217,8 @@ def main():
     )
     args = parser.parse_args()
 
-    client = PersistentClient(path="chroma_db")
-    collection_name = "museum_knowledge_base"
+    client = PersistentClient(path=CLIENT_PATH)
+    collection_name = COLLECTION_NAME
 
     if args.reset:
         print("Resetting ChromaDB database...")
@@ -45,39 +229,32 @@ def main():
             print(f"No existing collection to delete: {e}")
         collection = client.create_collection(name=collection_name)
         print(f"Created new collection: {collection_name}")
+        manifest = {}
     else:
         print("Using existing ChromaDB database...")
         collection = client.get_or_create_collection(name=collection_name)
+        manifest = read_manifest()
 
-    docs_path = Path("data/Objectifying_China/docs")
-
-    documents = []
-    ids = []
-    metadatas = []
-    for filepath in docs_path.glob("*.json"):
-        with open(filepath.absolute(), "r", encoding="utf-8") as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError:
-                print(f"Error loading {filepath}")
-                continue
-
-            documents.append(data["documents"])
-            ids.append(data["ids"])
-            data["metadata"].pop("description", None)
-            data["metadata"].pop("images", None)
-            metadatas.append(data["metadata"])
-
-    if not ids:
-        print("No documents found to add to the database.")
-        return
-
-    print(f"Attempting update {len(ids)} documents to the collection...")
-    collection.upsert(
-        ids=ids,
-        documents=documents,
-        metadatas=metadatas,
-    )
+    manifest, timings, changed = ingest(collection, manifest)
+    write_manifest(manifest)
+
+    if changed or not Path(BM25_INDEX_PATH).exists():
+        # 用集合中的全部文档重建 BM25 索引, 与向量检索的语料保持一致
+        print("Building BM25 index...")
+        with timed(timings, "bm25"):
+            corpus = collection.get(include=["documents"])
+            index = BM25Index.build(corpus["ids"], corpus["documents"] or [])
+            index.save(BM25_INDEX_PATH)
+        print(f"Saved BM25 index with {len(index.ids)} documents to {BM25_INDEX_PATH}")
+
+        # 通知运行中的服务重新加载内存文档索引和 BM25 索引
+        write_version(VERSION_PATH)
+    else:
+        print("Collection is up to date.")
+
+    print("Timing report:")
+    for phase, seconds in timings.items():
+        print(f"\t{phase:<30}{seconds:8.3f}s")
 
 
 if __name__ == "__main__":
@@ -1,11 +1,31 @@
 import asyncio
+import inspect
+import os
 import re
-from typing import AsyncIterator, Callable, List, Optional
+import time
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
 from asyncio import Queue
-from src.utils import get_logger
+from src import metrics
+from src.segmenter import SegmentationPolicy, SentenceSegmenter
+from src.utils import estimate_tokens, get_logger
 
 logger = get_logger()
 
+DEFAULT_MAX_CONCURRENCY = 3  # 同时进行 TTS 的段落数量上限
+# 朗读时长的粗略估计: 中文约 4 字/秒, 英文约 15 字符/秒, 按 estimate_tokens 计算时都接近 0.25 秒/token
+SPEECH_SECONDS_PER_TOKEN = 0.25
+# 合成完毕但尚未被取走的音频上限 (字节): 超过时暂停合成, 直到消费方取走音频
+MAX_BUFFERED_AUDIO_BYTES = int(
+    os.getenv("TTS_MAX_BUFFERED_BYTES", str(2 * 1024 * 1024))
+)
+
+# 支持同步函数、协程函数, 以及逐块产出音频的异步生成器函数
+TTSFunction = (
+    Callable[[str], bytes | None]
+    | Callable[[str], Awaitable[bytes | None]]
+    | Callable[[str], AsyncIterator[bytes]]
+)
+
 
 class AudioAccumulator:
     """
@@ -14,15 +34,55 @@ class AudioAccumulator:
     """
 
     def __init__(
-        self, tts_function: Callable[[str], bytes | None], num_sentence_cached: int = 2
+        self,
+        tts_function: TTSFunction,
+        num_sentence_cached: int = 2,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        policy: SegmentationPolicy | None = None,
+        max_buffered_bytes: int | None = MAX_BUFFERED_AUDIO_BYTES,
     ):
+        """
+        Args:
+            num_sentence_cached: 未指定 `policy` 时, 累积多少个完整句子后合成一段音频
+            max_concurrency: 同时进行 TTS 的段落数量上限
+            policy: 自适应分段策略, 指定后取代 `num_sentence_cached`
+            max_buffered_bytes: 尚未被取走的音频上限, 超过时暂停合成; None 表示不限制
+        """
         self.tts_function = tts_function
         self.num_sentence_cached = num_sentence_cached
-        self.pattern = re.compile(r"(.*?)[。！？!:\.\?][\n\s]", flags=re.MULTILINE)
-        self._buffer = ""
+        self.policy = policy
+        self.max_buffered_bytes = max_buffered_bytes
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: dict[asyncio.Task, str] = {}  # 进行中的 TTS 任务 -> 段落文本
+        self.reset()
+
+    def reset(self):
+        """开始一个新的回答。同一会话的多轮问答复用同一个实例, 上一轮的音频需已全部取出。"""
+        self._segmenter = SentenceSegmenter(track_clauses=self.policy is not None)
         self._audio_queue: Queue[Optional[bytes]] = Queue()
         self._finished = False
 
+        # TTS 流水线: 段落按序号并发合成, 按序号重排再放入音频队列
+        self._next_seq = 0  # 下一个分配给段落的序号
+        self._deliver_seq = 0  # 当前正在交付的序号, 它的音频块可以直接入队
+        self._pending: dict[int, list[bytes]] = {}  # 尚未轮到交付的音频块
+        self._done: set[int] = set()  # 已合成完毕但尚未交付完的序号
+
+        # 背压: 音频队列和暂存中的字节数, 消费方取走音频或交付推进时唤醒等待的合成任务
+        self._queued_bytes = 0
+        self._pending_bytes = 0
+        self._space = asyncio.Event()
+        self.peak_buffered_bytes = 0
+        self._muted = False  # 本次回答余下的音频不再需要
+
+        # 首段音频延迟: 从创建或 reset (即请求开始) 到第一块音频入队
+        self._started_at = time.perf_counter()
+        self.time_to_first_audio: float | None = None
+
+    @property
+    def _buffer(self) -> str:
+        return self._segmenter.buffer
+
     def __aiter__(self) -> AsyncIterator[bytes]:
         return self
 
@@ -31,16 +91,106 @@ class AudioAccumulator:
         item = await self._audio_queue.get()
         if item is None:  # None 作为结束信号
             raise StopAsyncIteration
+        self._queued_bytes -= len(item)
+        self._space.set()
         return item
 
+    @property
+    def num_segments(self) -> int:
+        """本次回答已调度合成的段落数量。"""
+        return self._next_seq
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._queued_bytes + self._pending_bytes
+
+    def _over_limit(self, seq: int) -> bool:
+        """
+        队列和暂存的音频合计超过上限时暂停。暂存的音频要等交付中的段落完成才能取走,
+        所以音频队列为空时交付中的段落不等待; 信号量按序号先后获取, 交付中的段落总能拿到名额。
+        """
+        if self.max_buffered_bytes is None:
+            return False
+        if seq == self._deliver_seq and not self._queued_bytes:
+            return False
+        return self.buffered_bytes >= self.max_buffered_bytes
+
+    async def _wait_for_space(self, seq: int):
+        while self._over_limit(seq):
+            metrics.counter("tts.backpressure_waits").inc()
+            self._space.clear()
+            await self._space.wait()
+
     def _clean_text(self, text: str) -> str:
         image_pattern = r"!\[.*?\]\(.*?\)"
         return re.sub(image_pattern, "", text)
 
+    async def _synthesize(self, seq: int, text: str):
+        """调用TTS函数, 音频块按序号交付。"""
+        try:
+            async with self._semaphore:
+                await self._wait_for_space(seq)
+                if inspect.isasyncgenfunction(self.tts_function):
+                    # 流式TTS: 轮到该段落时, 音频块一到达就可以转发;
+                    # 消费方跟不上时暂停读取, 由 TTS 连接承担背压
+                    async for audio_chunk in self.tts_function(text):
+                        self._emit(seq, audio_chunk)
+                        await self._wait_for_space(seq)
+                elif inspect.iscoroutinefunction(self.tts_function):
+                    self._emit(seq, await self.tts_function(text))
+                else:
+                    # 使用 to_thread 在单独的线程中运行同步的TTS函数，避免阻塞
+                    audio_chunk = await asyncio.to_thread(self.tts_function, text)
+                    self._emit(seq, audio_chunk)  # type: ignore
+        except Exception as e:
+            logger.error(f"Error during TTS conversion: {e}")
+        finally:
+            self._done.add(seq)
+            self._deliver_in_order()
+
+    def _emit(self, seq: int, audio_chunk: bytes | None):
+        """当前交付中的段落直接入队, 其余段落先暂存。"""
+        if not audio_chunk:
+            return
+        if seq == self._deliver_seq:
+            self._enqueue(audio_chunk)
+        else:
+            self._pending.setdefault(seq, []).append(audio_chunk)
+            self._pending_bytes += len(audio_chunk)
+            self.peak_buffered_bytes = max(
+                self.peak_buffered_bytes, self.buffered_bytes
+            )
+
+    def _deliver_in_order(self):
+        """依次推进已完成的序号, 保证播放顺序与文本顺序一致。"""
+        while self._deliver_seq in self._done:
+            self._done.remove(self._deliver_seq)
+            self._deliver_seq += 1
+            for audio_chunk in self._pending.pop(self._deliver_seq, []):
+                self._pending_bytes -= len(audio_chunk)
+                self._enqueue(audio_chunk)
+            self._space.set()
+
+    def _enqueue(self, audio_chunk: bytes):
+        if self.time_to_first_audio is None:
+            self.time_to_first_audio = time.perf_counter() - self._started_at
+            metrics.histogram("tts.time_to_first_audio").observe(
+                self.time_to_first_audio
+            )
+            logger.info(f"Time to first audio: {self.time_to_first_audio:.3f}s")
+        self._audio_queue.put_nowait(audio_chunk)
+        self._queued_bytes += len(audio_chunk)
+        self.peak_buffered_bytes = max(self.peak_buffered_bytes, self.buffered_bytes)
+
     async def _process_segment(self, segment: str):
-        """在线程中调用TTS函数并把结果放入队列。"""
+        """为段落分配序号并调度TTS任务, 不等待合成完成。"""
         if not segment or segment.isspace():
             return
+        if self._muted:
+            metrics.counter("tts.muted_seconds").inc(
+                estimate_tokens(segment) * SPEECH_SECONDS_PER_TOKEN
+            )
+            return
 
         cleaned_segment = self._clean_text(segment)
         # expected logging: Process Text Chunk: This is the true fact that... (total 74 words)
@@ -48,40 +198,88 @@ class AudioAccumulator:
             f"Process Text Chunk: {cleaned_segment[:50]}... (total {len(cleaned_segment)} words)"
         )
 
-        try:
-            # 使用 to_thread 在单独的线程中运行同步的TTS函数，避免阻塞
-            audio_chunk = await asyncio.to_thread(self.tts_function, cleaned_segment)
-            if audio_chunk:
-                await self._audio_queue.put(audio_chunk)
-        except Exception as e:
-            logger.error(f"Error during TTS conversion: {e}")
+        seq = self._next_seq
+        self._next_seq += 1
+        metrics.counter("tts.segments").inc()
+        task = asyncio.create_task(self._synthesize(seq, cleaned_segment))
+        self._tasks[task] = cleaned_segment
+        task.add_done_callback(lambda t: self._tasks.pop(t, None))
 
     async def add_chunk(self, chunk: str):
         """添加文本块并检查是否需要处理一个段落。"""
-        self._buffer += chunk
+        # 分句器只扫描新增的文本
+        num_sentence = self._segmenter.feed(chunk)
+
+        if self.policy is not None:
+            # 按策略切分, 一次添加的文本可能足够切出多段
+            while (
+                split_pos := self.policy.split_position(self._segmenter, self._next_seq)
+            ) is not None:
+                await self._process_segment(self._segmenter.pop(split_pos))
+            return
 
-        # 寻找最靠后的分隔符作为分割点
-        # delimiter_count = sum(self._buffer.count(d) for d in self.delimiters)
-        sentences = self.pattern.findall(self._buffer)
-        num_sentence = len(sentences)
-        # 如果超过字符阈值，则处理
+        # 缓冲区中已完整的句子数量超过阈值时在最后一个句子边界处切分
         if num_sentence >= self.num_sentence_cached:
-            split_pos = -1
-            pos = self._buffer.rfind(sentences[-1])
-            if pos == -1:
-                return
-
-            split_pos = pos + len(sentences[-1]) + 2
-            segment_to_process = self._buffer[:split_pos]
-            self._buffer = self._buffer[split_pos:]
+            segment_to_process = self._segmenter.pop_sentences()
             await self._process_segment(segment_to_process)
 
     async def flush(self):
         """处理缓冲区中剩余的所有文本。"""
         if self._buffer:
-            remaining_buffer = self._buffer
-            self._buffer = ""
+            remaining_buffer = self._segmenter.drain()
             await self._process_segment(remaining_buffer)
 
+        # 等待所有进行中的TTS任务完成后再发送结束信号; 任务被 `mute` 取消时同样继续
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
         # 发送结束信号
         await self._audio_queue.put(None)
+
+    async def cancel(self) -> float:
+        """
+        取消进行中和排队中的 TTS, 丢弃尚未取出的音频并结束迭代。
+        返回不再需要合成的文本的估计朗读时长 (秒)。
+        """
+        return await self._stop_synthesis(self._segmenter.drain(), finish=True)
+
+    async def mute(self):
+        """
+        本次回答余下的音频不再需要 (例如客户端跟不上而被丢弃): 停止进行中的 TTS,
+        之后的文本也不再合成。文本仍可继续添加, `flush` 照常结束迭代。
+        """
+        if self._muted:
+            return
+        self._muted = True
+        seconds = await self._stop_synthesis()
+        metrics.counter("tts.muted_seconds").inc(seconds)
+
+    async def _stop_synthesis(
+        self, unsynthesized_text: str = "", finish: bool = False
+    ) -> float:
+        """
+        取消 TTS 任务并丢弃尚未取出的音频, 返回不再合成的文本的估计朗读时长 (秒)。
+        `finish` 时结束迭代; 否则只在 `flush` 已经放入结束信号时把它放回队列。
+        """
+        unsynthesized = list(self._tasks.values()) + [unsynthesized_text]
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        # 等待取消完成, 之后 reset 开始的下一个回答不会被这些任务影响
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        dropped = sum(
+            len(chunk) for chunks in self._pending.values() for chunk in chunks
+        )
+        self._pending.clear()
+        while not self._audio_queue.empty():
+            item = self._audio_queue.get_nowait()
+            if item is None:
+                finish = True
+            else:
+                dropped += len(item)
+        self._queued_bytes = self._pending_bytes = 0
+        metrics.counter("cancel.audio_bytes_dropped").inc(dropped)
+        if finish:
+            self._audio_queue.put_nowait(None)
+
+        return estimate_tokens("".join(unsynthesized)) * SPEECH_SECONDS_PER_TOKEN
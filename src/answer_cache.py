@@ -0,0 +1,174 @@
+"""语义答案缓存 - 缓存完整回答的文本和音频帧, 相同或高度相似的问题直接重放"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+import numpy as np
+
+from src import metrics
+from src.utils import get_logger, normalize_query
+
+logger = get_logger()
+
+TTL = 6 * 60 * 60  # 缓存条目的有效期 (秒)
+MAX_ENTRIES = 512
+MAX_BYTES = 256 * 1024 * 1024  # 所有条目中音频和文本的总大小上限
+SIMILARITY_THRESHOLD = 0.95  # 余弦相似度不低于该值才视为同一个问题
+
+# WebSocket 发送给客户端的帧: JSON 消息或二进制音频
+Frame = dict | bytes
+
+
+@dataclass
+class CachedAnswer:
+    scope: str
+    query: str
+    embedding: Any
+    frames: list[Frame]
+    size: int
+    created_at: float
+
+
+def _frame_size(frame: Frame) -> int:
+    if isinstance(frame, bytes):
+        return len(frame)
+    return len(str(frame))
+
+
+class AnswerCache:
+    """
+    以 `doc_id` 为作用域的答案缓存。
+
+    先按规范化后的问题精确匹配; 未命中时在同一作用域内比较问题向量的余弦相似度。
+    条目按最近使用顺序排列, 超过有效期、条目数或总大小时淘汰。
+    `version` 返回当前的语料版本戳, 版本变化 (重新导入语料) 后清空所有条目,
+    不会继续重放包含旧资料的回答。
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], Awaitable[Any]] | None = None,
+        ttl: float = TTL,
+        max_entries: int = MAX_ENTRIES,
+        max_bytes: int = MAX_BYTES,
+        similarity_threshold: float = SIMILARITY_THRESHOLD,
+        version: Callable[[], int | None] | None = None,
+    ):
+        self.embed = embed
+        self.version = version
+        self._version = version() if version is not None else None
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.similarity_threshold = similarity_threshold
+        self._entries: OrderedDict[tuple[str, str], CachedAnswer] = OrderedDict()
+        self._bytes = 0
+
+        self._exact_hits = metrics.counter("answer_cache.hits.exact")
+        self._semantic_hits = metrics.counter("answer_cache.hits.semantic")
+        self._misses = metrics.counter("answer_cache.misses")
+        self._evictions = metrics.counter("answer_cache.evictions")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def _embedding(self, query: str) -> Any:
+        if self.embed is None:
+            return None
+        try:
+            embedding = np.asarray(await self.embed(query), dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Failed to embed query for answer cache: {e}")
+            return None
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else None
+
+    def _remove(self, key: tuple[str, str]):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _check_version(self):
+        if self.version is None:
+            return
+        current = self.version()
+        if current == self._version:
+            return
+        if self._entries:
+            logger.info("Corpus version changed, clearing the answer cache.")
+            metrics.counter("answer_cache.invalidations").inc()
+        self._entries.clear()
+        self._bytes = 0
+        self._version = current
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [k for k, e in self._entries.items() if now - e.created_at > self.ttl]
+        for key in expired:
+            self._remove(key)
+            self._evictions.inc()
+
+    async def lookup(self, query: str, doc_id: str | None) -> list[Frame] | None:
+        """返回缓存的帧序列, 未命中时返回 None。"""
+        self._check_version()
+        self._expire()
+        scope = doc_id or ""
+        key = (scope, normalize_query(query))
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self._exact_hits.inc()
+            return entry.frames
+
+        candidates = [
+            (k, e)
+            for k, e in self._entries.items()
+            if e.scope == scope and e.embedding is not None
+        ]
+        if candidates:
+            embedding = await self._embedding(query)
+            if embedding is not None:
+                best_key, best_score = None, -1.0
+                for k, e in candidates:
+                    score = float(np.dot(embedding, e.embedding))
+                    if score > best_score:
+                        best_key, best_score = k, score
+                if (
+                    best_key in self._entries
+                    and best_score >= self.similarity_threshold
+                ):
+                    self._entries.move_to_end(best_key)
+                    self._semantic_hits.inc()
+                    logger.info(
+                        f'Answer cache hit for "{query}" via "{self._entries[best_key].query}" '
+                        f"(similarity {best_score:.3f})"
+                    )
+                    return self._entries[best_key].frames
+
+        self._misses.inc()
+        return None
+
+    async def store(self, query: str, doc_id: str | None, frames: list[Frame]):
+        """保存一次完整回答的帧序列。"""
+        if not frames:
+            return
+        scope = doc_id or ""
+        key = (scope, normalize_query(query))
+        size = sum(_frame_size(frame) for frame in frames)
+        if size > self.max_bytes:
+            return
+
+        self._check_version()
+        embedding = await self._embedding(query)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CachedAnswer(
+            scope, query, embedding, list(frames), size, time.monotonic()
+        )
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._evictions.inc()
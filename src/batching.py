@@ -0,0 +1,104 @@
+"""微批处理 - 把短时间窗口内来自不同会话的请求合并成一次批量调用"""
+
+import asyncio
+import os
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from src import metrics
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+MAX_BATCH_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+MAX_WAIT = float(
+    os.getenv("BATCH_MAX_WAIT", "0.005")
+)  # 第一个请求到达后最多等待的时间 (秒)
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    收集并发到达的请求, 当凑满 `max_batch_size` 个或等待超过 `max_wait` 秒时,
+    用一次 `batch_fn` 调用处理整批请求, 再把结果按顺序分发给各个调用方。
+    `batch_fn` 返回的结果中可以包含异常对象, 只有对应的调用方会收到该异常。
+    一批中的所有调用方都已放弃等待 (例如超过截止时间被取消) 时, 取消进行中的 `batch_fn`。
+
+    指定 `name` 时记录 `batch.<name>.queue_depth` (请求到达时排队的数量) 和
+    `batch.<name>.size` (每批的请求数量) 两个分布, 以及被放弃的批次数 `batch.<name>.abandoned`。
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[list[T]], Awaitable[list[R | BaseException]]],
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait: float = MAX_WAIT,
+        name: str | None = None,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self._queue: list[tuple[T, asyncio.Future[R]]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[R] = loop.create_future()
+        self._queue.append((item, future))
+        if self.name is not None:
+            metrics.histogram(f"batch.{self.name}.queue_depth").observe(
+                len(self._queue)
+            )
+
+        if len(self._queue) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._queue = self._queue, []
+        if not batch:
+            return
+        if self.name is not None:
+            metrics.histogram(f"batch.{self.name}.size").observe(len(batch))
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[T, asyncio.Future[R]]]):
+        futures = [future for _, future in batch]
+        call = asyncio.ensure_future(self.batch_fn([item for item, _ in batch]))
+
+        def abandon(_):
+            if not call.done() and all(future.cancelled() for future in futures):
+                if self.name is not None:
+                    metrics.counter(f"batch.{self.name}.abandoned").inc()
+                call.cancel()
+
+        for future in futures:
+            future.add_done_callback(abandon)
+
+        try:
+            results = await call
+        except asyncio.CancelledError:
+            # 所有调用方都已放弃时正常结束, 自身被取消时继续向上抛出
+            if asyncio.current_task().cancelling():  # type: ignore[union-attr]
+                raise
+            return
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,90 @@
+"""BM25 关键词索引 - 与 Chroma 向量检索互补, 让展品名称和藏品编号能够精确命中"""
+
+import json
+import re
+from pathlib import Path
+from typing import Callable
+
+from rank_bm25 import BM25Okapi
+
+from src.utils import preprocess
+
+# 藏品编号, 例如 HKU.C.1972.0432; preprocess 会把它拆成几个数字, 这里保留完整编号作为额外的词项
+IDENTIFIER_PATTERN = re.compile(r"\b[A-Za-z]{2,}(?:\.[A-Za-z0-9]+){2,}\b")
+
+
+def tokenize(text: str) -> list[str]:
+    """BM25 使用的分词: `preprocess` 的结果加上完整的藏品编号。"""
+    identifiers = [match.lower() for match in IDENTIFIER_PATTERN.findall(text)]
+    return preprocess(text, mode="lookup") + identifiers
+
+
+class BM25Index:
+    """
+    持久化的 BM25 倒排索引。
+
+    索引文件只保存文档 ID 和分词结果, 加载时重建 `BM25Okapi`, 文档内容仍以 Chroma 为准。
+    """
+
+    def __init__(
+        self,
+        ids: list[str],
+        corpus_tokens: list[list[str]],
+        tokenizer: Callable[[str], list[str]] = tokenize,
+    ):
+        self.ids = ids
+        self.corpus_tokens = corpus_tokens
+        self.tokenizer = tokenizer
+        self._bm25 = BM25Okapi(corpus_tokens) if corpus_tokens else None
+
+    @classmethod
+    def build(
+        cls,
+        ids: list[str],
+        documents: list[str],
+        tokenizer: Callable[[str], list[str]] = tokenize,
+    ) -> "BM25Index":
+        return cls(ids, [tokenizer(doc) for doc in documents], tokenizer=tokenizer)
+
+    @classmethod
+    def load(
+        cls, path: str | Path, tokenizer: Callable[[str], list[str]] = tokenize
+    ) -> "BM25Index":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["ids"], data["tokens"], tokenizer=tokenizer)
+
+    def save(self, path: str | Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"ids": self.ids, "tokens": self.corpus_tokens}, f, ensure_ascii=False
+            )
+        tmp_path.replace(path)
+
+    def search(self, query: str, n_results: int = 10) -> list[tuple[str, float]]:
+        """返回得分最高的 (文档 ID, 分数), 只包含至少命中一个词项的文档。"""
+        query_tokens = self.tokenizer(query)
+        if self._bm25 is None or not query_tokens:
+            return []
+
+        scores = self._bm25.get_scores(query_tokens)
+        query_set = set(query_tokens)
+        ranked = sorted(range(len(self.ids)), key=lambda i: scores[i], reverse=True)
+        return [
+            (self.ids[i], float(scores[i]))
+            for i in ranked[:n_results]
+            if query_set.intersection(self.corpus_tokens[i])
+        ]
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    """倒数排名融合 (RRF): 合并多路检索的排序结果, 分数为各路 1 / (k + 排名) 之和。"""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    # 分数相同时保持首次出现的顺序, 结果是确定的
+    return sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
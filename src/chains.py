@@ -1,24 +1,167 @@
 """定义 LangChain 中的 Runnable Chain 对象"""
 
-from src.utils import get_gpt4o
+import os
+import statistics
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable
+
+from src import metrics
+from src.utils import get_gemma3_270m, get_gpt4o, get_logger
 from src.models import QueryRouting
 from src.prompts import QUERY_ROUTER_PROMPT, GENERATOR_PROMPT
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.language_models import BaseChatModel
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableConfig
+
+logger = get_logger()
+
+# 路由使用的模型层级: local (本地 Ollama 小模型, 失败时退回 Azure) 或 remote
+ROUTER_TIER = os.getenv("ROUTER_TIER", "local")
+# Azure 上进行中的调用数或最近的延迟中位数超过阈值时, 非 RAG 回答降级到本地小模型;
+# 流式调用的延迟是首 token 延迟, 长回答本身的生成时间不算作过载
+DEGRADE_CONCURRENCY = int(os.getenv("LLM_DEGRADE_CONCURRENCY", "16"))
+DEGRADE_LATENCY = float(os.getenv("LLM_DEGRADE_LATENCY", "6.0"))
+LATENCY_WINDOW = 20  # 每个 chain 保留最近多少次调用的延迟
+LATENCY_MAX_AGE = 60.0  # 超过该时间 (秒) 的延迟不再参与判断, 降级后能自动恢复
+
+
+class _Call:
+    """一次调用的计时, 流式调用在第一个块到达时调用 `first_token`。"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token_at: float | None = None
+
+    def first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+
+class ModelTier:
+    """
+    一个模型层级: 统计进行中的调用数和各 chain 最近的延迟, 并记录每层的指标。
+    非流式调用记录完整耗时 (latency), 流式调用记录首 token 延迟 (ttft)。
+    """
+
+    def __init__(self, name: str, llm: BaseChatModel):
+        self.name = name
+        self.llm = llm
+        self.in_flight = 0
+        self._latencies: dict[str, deque[tuple[float, float]]] = {}
+
+    @asynccontextmanager
+    async def track(self, chain: str, streaming: bool = False):
+        self.in_flight += 1
+        metrics.counter(f"llm.{self.name}.calls").inc()
+        metrics.counter(f"llm.{self.name}.{chain}.calls").inc()
+        call = _Call()
+        try:
+            yield call
+        except Exception:
+            metrics.counter(f"llm.{self.name}.errors").inc()
+            raise
+        finally:
+            self.in_flight -= 1
+
+        end = time.perf_counter()
+        if streaming:
+            latency, kind = (call.first_token_at or end) - call.start, "ttft"
+        else:
+            latency, kind = end - call.start, "latency"
+        self._latencies.setdefault(chain, deque(maxlen=LATENCY_WINDOW)).append(
+            (time.monotonic(), latency)
+        )
+        metrics.histogram(f"llm.{self.name}.{kind}").observe(latency)
+        metrics.histogram(f"llm.{self.name}.{chain}.{kind}").observe(latency)
+
+    def overloaded(self, chain: str) -> bool:
+        if self.in_flight >= DEGRADE_CONCURRENCY:
+            return True
+        cutoff = time.monotonic() - LATENCY_MAX_AGE
+        recent = [lat for t, lat in self._latencies.get(chain, ()) if t >= cutoff]
+        return bool(recent) and statistics.median(recent) >= DEGRADE_LATENCY
+
+
+remote = ModelTier("remote", get_gpt4o())
+local = ModelTier("local", get_gemma3_270m())
+
+
+class TieredChain:
+    """
+    `prompt | llm` 形式的 chain, 按 `select()` 给出的顺序依次尝试各个模型层级, 前一个失败时退回下一个。
+
+    不包装成 Runnable: 每多一层 Runnable, 流式输出的每个块都要多一次 AIMessageChunk 的累加。
+    内层调用从上下文继承 config, astream_events 和 LangGraph 仍能看到模型的运行。
+    `astream` 已经输出内容后失败不再退回, 避免重复的回答。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        prompt: ChatPromptTemplate,
+        select: Callable[[], list[ModelTier]],
+        schema: type | None = None,
+    ):
+        self.name = name
+        self.prompt = prompt
+        self.select = select
+        self.schema = schema
+
+    async def ainvoke(self, inputs: dict, config: RunnableConfig | None = None):
+        tiers = self.select()
+        for idx, tier in enumerate(tiers):
+            llm = tier.llm
+            model = llm.with_structured_output(self.schema) if self.schema else llm
+            try:
+                async with tier.track(self.name):
+                    return await (self.prompt | model).ainvoke(inputs, config)
+            except Exception as e:
+                if idx == len(tiers) - 1:
+                    raise
+                logger.warning(
+                    f"{self.name} failed on {tier.name} tier, falling back: {e}"
+                )
+
+    async def astream(self, inputs: dict, config: RunnableConfig | None = None):
+        messages = await self.prompt.ainvoke(inputs, config)
+        tiers = self.select()
+        for idx, tier in enumerate(tiers):
+            started = False
+            try:
+                async with tier.track(self.name, streaming=True) as call:
+                    async for chunk in tier.llm.astream(messages, config):
+                        call.first_token()
+                        started = True
+                        yield chunk
+                return
+            except Exception as e:
+                if started or idx == len(tiers) - 1:
+                    raise
+                logger.warning(
+                    f"{self.name} failed on {tier.name} tier, falling back: {e}"
+                )
 
-gpt4o = get_gpt4o()
 
 # QUERY ROUTER
-structured_llm_grader = gpt4o.with_structured_output(QueryRouting)
 query_router_prompt = ChatPromptTemplate(
     [("system", QUERY_ROUTER_PROMPT), ("human", "User Query: {query}")]
 )
-query_router = query_router_prompt | structured_llm_grader
+query_router = TieredChain(
+    "query_router",
+    query_router_prompt,
+    lambda: [local, remote] if ROUTER_TIER == "local" else [remote],
+    schema=QueryRouting,
+)
 
 
 # RAG GENERATOR
-prompt = ChatPromptTemplate.from_messages(
+# 两个生成器都可以带上同一会话中之前的对话 (history)
+rag_generator_prompt = ChatPromptTemplate.from_messages(
     [
         ("system", GENERATOR_PROMPT),
+        MessagesPlaceholder("history", optional=True),
         (
             "user",
             'Here are some relevant documents:\n{docs}\n\n"'
@@ -26,14 +169,26 @@ prompt = ChatPromptTemplate.from_messages(
         ),
     ]
 )
-rag_generator = prompt | gpt4o
+rag_generator = TieredChain("rag_generator", rag_generator_prompt, lambda: [remote])
 
 
 # NON-RAG GENERATOR
-prompt = ChatPromptTemplate.from_messages(
+direct_generator_prompt = ChatPromptTemplate.from_messages(
     [
         ("system", GENERATOR_PROMPT),
+        MessagesPlaceholder("history", optional=True),
         ("user", "{query}"),
     ]
 )
-direct_generator = prompt | gpt4o
+
+
+def _direct_generator_tiers() -> list[ModelTier]:
+    if remote.overloaded("direct_generator"):
+        metrics.counter("llm.degraded").inc()
+        return [local, remote]
+    return [remote, local]
+
+
+direct_generator = TieredChain(
+    "direct_generator", direct_generator_prompt, _direct_generator_tiers
+)
@@ -0,0 +1,171 @@
+"""文档分块 - 按标题和段落把长文档切成片段, 片段通过 parent_id 关联回原文档"""
+
+import re
+from dataclasses import dataclass
+
+from langchain_core.documents import Document
+
+CHUNK_MAX_CHARS = 800  # 单个片段的最大长度 (超长段落按句子切分)
+CHUNK_MIN_CHARS = 200  # 小于该长度的末尾片段合并到同一章节的上一个片段
+CHUNK_SEPARATOR = "\n\n"
+SPAN_SEPARATOR = "\n\n...\n\n"  # 同一文档中不相邻的片段之间的分隔符
+
+HEADING_PATTERN = re.compile(r"^#{1,6}\s+(.*?)\s*$")
+PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+SENTENCE_PATTERN = re.compile(r".+?(?:[。！？]+|[\.!\?]+(?=\s)|$)\s*", re.S)
+CHUNK_METADATA_KEYS = ("parent_id", "chunk_index", "section")
+
+
+@dataclass
+class Chunk:
+    text: str
+    section: str  # 片段所在章节的标题
+
+
+def _split_long_paragraph(paragraph: str, max_chars: int) -> list[str]:
+    """按句子切分超长段落, 单个句子超长时按长度硬切。"""
+    pieces, current = [], ""
+    for match in SENTENCE_PATTERN.finditer(paragraph):
+        sentence = match.group()
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) > max_chars:
+            pieces.append(current.strip())
+            current = ""
+        current += sentence
+    if current.strip():
+        pieces.append(current.strip())
+    return pieces
+
+
+def split_chunks(
+    text: str, max_chars: int = CHUNK_MAX_CHARS, min_chars: int = CHUNK_MIN_CHARS
+) -> list[Chunk]:
+    """
+    按标题和段落切分文档。
+
+    标题开启新章节, 同一章节内的段落依次合并, 直到超过 `max_chars`; 片段不会跨越章节。
+    所有片段按顺序用 `CHUNK_SEPARATOR` 连接即可还原文档 (只有段落首尾和段落被切开处的空白不同)。
+    """
+    chunks: list[Chunk] = []
+    section = ""
+    section_start = 0  # 当前章节第一个片段的下标
+    current: list[str] = []
+
+    def flush():
+        if current:
+            chunks.append(Chunk(CHUNK_SEPARATOR.join(current), section))
+            current.clear()
+
+    def merge_short_tail():
+        if (
+            len(chunks) - section_start >= 2
+            and len(chunks[-1].text) < min_chars
+            and len(chunks[-2].text) + len(chunks[-1].text) <= max_chars + min_chars
+        ):
+            tail = chunks.pop()
+            chunks[-1].text += CHUNK_SEPARATOR + tail.text
+
+    for paragraph in PARAGRAPH_PATTERN.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+
+        heading = HEADING_PATTERN.match(paragraph.splitlines()[0])
+        if heading:
+            flush()
+            merge_short_tail()
+            section = heading.group(1)
+            section_start = len(chunks)
+
+        for piece in (
+            _split_long_paragraph(paragraph, max_chars)
+            if len(paragraph) > max_chars
+            else [paragraph]
+        ):
+            size = sum(len(p) + len(CHUNK_SEPARATOR) for p in current)
+            if current and size + len(piece) > max_chars:
+                flush()
+            current.append(piece)
+
+    flush()
+    merge_short_tail()
+    return chunks
+
+
+def chunk_id(parent_id: str, index: int) -> str:
+    return f"{parent_id}#{index}"
+
+
+def chunk_document(
+    doc_id: str, document: str, metadata: dict
+) -> tuple[list[str], list[str], list[dict]]:
+    """把一个文档切成片段, 返回可以直接写入 Chroma 的 (ids, documents, metadatas)。"""
+    ids, documents, metadatas = [], [], []
+    for index, chunk in enumerate(split_chunks(document)):
+        ids.append(chunk_id(doc_id, index))
+        documents.append(chunk.text)
+        metadatas.append(
+            {
+                **metadata,
+                "parent_id": doc_id,
+                "chunk_index": index,
+                "section": chunk.section,
+            }
+        )
+    return ids, documents, metadatas
+
+
+def embedding_text(document: str, metadata: dict) -> str:
+    """向量化时在片段前加上文档标题, 避免后续片段丢失 "这是哪件展品" 的信息。"""
+    name = str(metadata.get("name", "")).strip()
+    if not name or document.lstrip().startswith("#"):
+        return document
+    return f"# {name}{CHUNK_SEPARATOR}{document}"
+
+
+def parent_metadata(metadata: dict) -> dict:
+    return {k: v for k, v in metadata.items() if k not in CHUNK_METADATA_KEYS}
+
+
+def expand_to_parents(chunks: list[Document]) -> list[Document]:
+    """
+    父文档展开: 把属于同一文档的片段合并为一个文档, 片段按原文顺序排列。
+
+    文档按其最佳片段的排名排序, 内容只包含被选中的片段, 不会把整篇长文放入提示词。
+    没有 `parent_id` 的文档 (例如按 ID 直接取出的完整文档) 原样保留。
+    """
+    groups: dict[str, list[Document]] = {}
+    for chunk in chunks:
+        parent_id = chunk.metadata.get("parent_id") or chunk.id
+        groups.setdefault(parent_id, []).append(chunk)
+
+    parents = []
+    for parent_id, group in groups.items():
+        if len(group) == 1 and "parent_id" not in group[0].metadata:
+            parents.append(group[0])
+            continue
+
+        group.sort(key=lambda d: d.metadata.get("chunk_index", 0))
+        metadata = parent_metadata(group[0].metadata)
+        scores = [
+            d.metadata["rerank_score"] for d in group if "rerank_score" in d.metadata
+        ]
+        if scores:
+            metadata["rerank_score"] = max(scores)
+        metadata["chunk_ids"] = [d.id for d in group]
+
+        spans = []
+        for prev, chunk in zip([None] + group[:-1], group):
+            if prev is not None:
+                adjacent = (
+                    chunk.metadata.get("chunk_index", 0)
+                    == prev.metadata.get("chunk_index", 0) + 1
+                )
+                spans.append(CHUNK_SEPARATOR if adjacent else SPAN_SEPARATOR)
+            spans.append(chunk.page_content)
+        parents.append(
+            Document(id=parent_id, page_content="".join(spans), metadata=metadata)
+        )
+    return parents
@@ -0,0 +1,101 @@
+"""上下文打包 - 在 token 预算内为生成器挑选文档内容, 取代不设上限的 format_docs"""
+
+import os
+import re
+from dataclasses import dataclass
+
+from langchain_core.documents import Document
+
+from src import metrics
+from src.utils import IMAGE_LINK_PATTERN, estimate_tokens, get_logger
+
+logger = get_logger()
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+MIN_DOC_TOKENS = 40  # 剩余预算不足以放下这么多内容时, 不再截取低分文档的开头
+PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int  # 打包后的 token 数 (估计值)
+    original_tokens: int  # 直接拼接全部文档时的 token 数 (估计值)
+    doc_ids: list[str]
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.tokens
+
+
+def _clean(text: str) -> list[str]:
+    """去除 Markdown 图片链接, 按段落拆分并丢弃空段落。"""
+    text = IMAGE_LINK_PATTERN.sub("", text)
+    paragraphs = [p.strip() for p in PARAGRAPH_PATTERN.split(text)]
+    return [p for p in paragraphs if p]
+
+
+def _take_head(paragraphs: list[str], budget: int, truncate: bool) -> list[str]:
+    """保留开头的段落直到用完预算, 尾部的低价值内容被截掉。"""
+    kept, used = [], 0
+    for paragraph in paragraphs:
+        tokens = estimate_tokens(paragraph)
+        if used + tokens > budget:
+            if truncate and not kept:
+                # 第一个段落就放不下时按比例截取它的开头
+                kept.append(paragraph[: len(paragraph) * budget // tokens])
+            break
+        kept.append(paragraph)
+        used += tokens
+    return kept
+
+
+def _doc_key(doc: Document) -> str:
+    return doc.id or str(doc.metadata.get("name", ""))
+
+
+def pack_context(
+    docs: list[Document], budget: int = CONTEXT_TOKEN_BUDGET
+) -> PackedContext:
+    """
+    按 `rerank_score` 从高到低贪心地装入文档, 放不下的文档只保留开头的段落。
+
+    选中的文档按 ID 排序输出, 相同的文档集合总是得到相同的提示词前缀, 与分数的细微波动无关。
+    """
+    original_tokens = sum(estimate_tokens(doc.page_content) for doc in docs)
+    # 稳定排序: 分数相同 (例如 rerank 失败时都没有分数) 的文档保持检索顺序
+    ranked = sorted(docs, key=lambda d: -d.metadata.get("rerank_score", 0.0))
+
+    selected: list[tuple[Document, list[str]]] = []
+    remaining = budget
+    for doc in ranked:
+        if remaining < MIN_DOC_TOKENS:
+            break
+        # 只有得分最高的文档会被截断到段落中间, 保证上下文不会为空
+        paragraphs = _take_head(
+            _clean(doc.page_content), remaining, truncate=not selected
+        )
+        if not paragraphs:
+            continue
+        selected.append((doc, paragraphs))
+        remaining -= sum(estimate_tokens(p) for p in paragraphs)
+
+    selected.sort(key=lambda item: _doc_key(item[0]))
+    text = "".join(
+        f"DOC{idx + 1}: " + "\n\n".join(paragraphs) + "\n\n"
+        for idx, (_, paragraphs) in enumerate(selected)
+    )
+    packed = PackedContext(
+        text=text,
+        tokens=estimate_tokens(text),
+        original_tokens=original_tokens,
+        doc_ids=[_doc_key(doc) for doc, _ in selected],
+    )
+
+    metrics.histogram("context.tokens").observe(packed.tokens)
+    metrics.histogram("context.tokens_saved").observe(packed.tokens_saved)
+    logger.info(
+        f"Packed {len(selected)}/{len(docs)} documents into {packed.tokens} tokens "
+        f"(saved {packed.tokens_saved} of {original_tokens})"
+    )
+    return packed
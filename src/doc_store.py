@@ -0,0 +1,97 @@
+"""只读的内存文档索引 - 按 ID 直接查找文档, 不需要访问 Chroma"""
+
+import os
+import time
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+from src.chunking import CHUNK_SEPARATOR, parent_metadata
+
+LOAD_BATCH_SIZE = 1000  # 从 Chroma 分页读取文档的批大小
+
+
+def write_version(path: str | Path):
+    """写入语料版本戳, 由 setup.py 在更新集合后调用。"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(str(time.time_ns()), encoding="utf-8")
+
+
+def read_version(path: str | Path) -> int | None:
+    """读取版本戳的修改时间, 只需一次 stat 调用, 可以在事件循环中直接使用。"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class DocumentStore:
+    """
+    启动时从 Chroma 集合一次性加载的文档索引。键为片段 ID, 也可以用 `get_parent` 按父文档 ID
+    取回拼接好的完整文档。
+
+    查找是字典访问, 每次返回新的 `Document` 和元数据副本, 下游节点 (如 rerank 写入分数)
+    可以随意修改而不会影响索引中的数据。
+    """
+
+    def __init__(self, documents: dict[str, tuple[str, dict]], version: int | None):
+        self._documents = documents
+        self.version = version
+        # 父文档 ID -> 按原文顺序排列的片段 ID; 没有分块的文档是自己的父文档
+        self._parents: dict[str, list[str]] = {}
+        for doc_id, (_, metadata) in documents.items():
+            self._parents.setdefault(metadata.get("parent_id", doc_id), []).append(
+                doc_id
+            )
+        for chunk_ids in self._parents.values():
+            chunk_ids.sort(key=lambda i: documents[i][1].get("chunk_index", 0))
+
+    @classmethod
+    def from_collection(cls, collection, version: int | None = None) -> "DocumentStore":
+        documents = {}
+        offset = 0
+        while True:
+            results = collection.get(
+                include=["documents", "metadatas"],
+                limit=LOAD_BATCH_SIZE,
+                offset=offset,
+            )
+            ids = results["ids"]
+            if not ids:
+                break
+            for doc_id, doc, metadata in zip(
+                ids, results["documents"] or [], results["metadatas"] or []
+            ):
+                documents[doc_id] = (doc, dict(metadata or {}))
+            offset += len(ids)
+        return cls(documents, version)
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._documents
+
+    def get(self, doc_id: str) -> Document | None:
+        entry = self._documents.get(doc_id)
+        if entry is None:
+            return None
+        page_content, metadata = entry
+        return Document(id=doc_id, page_content=page_content, metadata=dict(metadata))
+
+    def get_many(self, ids: list[str]) -> list[Document]:
+        """按给定顺序返回存在的文档。"""
+        docs = [self.get(doc_id) for doc_id in ids]
+        return [doc for doc in docs if doc is not None]
+
+    def get_parent(self, parent_id: str) -> Document | None:
+        """由全部片段拼接出的完整文档, 用于二维码扫描等需要整篇文档的场景。"""
+        chunk_ids = self._parents.get(parent_id)
+        if not chunk_ids:
+            return None
+        if chunk_ids == [parent_id]:
+            return self.get(parent_id)
+        page_content = CHUNK_SEPARATOR.join(self._documents[i][0] for i in chunk_ids)
+        metadata = parent_metadata(self._documents[chunk_ids[0]][1])
+        return Document(id=parent_id, page_content=page_content, metadata=metadata)
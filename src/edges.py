@@ -5,4 +5,7 @@ from src.models import State
 
 def to_retrieval(state: State):
     """条件函数 - 判断是否需要RAG"""
-    return "rag" if state["need_rag"] else "no_rag"
+    if not state["need_rag"]:
+        return "no_rag"
+    # 推测式检索已经在 router 节点中取回了文档
+    return "prefetched" if state.get("docs") else "rag"
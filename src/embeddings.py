@@ -0,0 +1,63 @@
+"""查询向量化 - 规范化查询的 LRU 缓存, 并把并发会话的查询合并成一次批量向量化"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Any, Callable
+
+from src import metrics
+from src.batching import MAX_BATCH_SIZE, MAX_WAIT, MicroBatcher
+from src.utils import normalize_query
+
+CACHE_SIZE = 2048  # 缓存的查询向量数量
+
+
+class QueryEmbedder:
+    """
+    带缓存的查询向量化器。
+
+    重复的问题 (例如 "what is this bowl made of?") 直接命中缓存; 未命中的查询交给
+    `MicroBatcher`, 在同一时间窗口内到达的查询只调用一次向量化函数。
+    """
+
+    def __init__(
+        self,
+        embedding_function: Callable[[list[str]], Any],
+        cache_size: int = CACHE_SIZE,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait: float = MAX_WAIT,
+    ):
+        self.embedding_function = embedding_function
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, Any] = OrderedDict()
+        self._batcher: MicroBatcher[str, Any] = MicroBatcher(
+            self._embed_batch,
+            max_batch_size=max_batch_size,
+            max_wait=max_wait,
+            name="query_embedding",
+        )
+        self._hits = metrics.counter("query_embedding.cache_hits")
+        self._misses = metrics.counter("query_embedding.cache_misses")
+
+    async def embed(self, query: str) -> Any:
+        key = normalize_query(query)
+        embedding = self._cache.get(key)
+        if embedding is not None:
+            self._cache.move_to_end(key)
+            self._hits.inc()
+            return embedding
+
+        self._misses.inc()
+        embedding = await self._batcher.submit(key)
+        self._cache[key] = embedding
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return embedding
+
+    async def _embed_batch(self, queries: list[str]) -> list[Any]:
+        # 同一批中相同的查询只向量化一次
+        unique = list(dict.fromkeys(queries))
+        metrics.histogram("query_embedding.batch_size").observe(len(unique))
+        embeddings = await asyncio.to_thread(self.embedding_function, unique)
+        by_query = dict(zip(unique, embeddings))
+        return [by_query[query] for query in queries]
@@ -1,8 +1,9 @@
 from langgraph.graph import StateGraph, END, START
-from src.retrieval_graph import retrieval_graph
+from src.retrieval_graph import retrieval_graph, rerank
 from src.models import State
-from src.nodes import router, generator
+from src.nodes import router, generator, SPECULATIVE_RERANK
 from src.edges import to_retrieval
+from src.session import checkpointer
 
 
 """创建并返回 LangGraph"""
@@ -12,6 +13,7 @@ workflow = StateGraph(State)
 workflow.add_node("generator", generator)
 workflow.add_node("router", router)
 workflow.add_node("retrieval", retrieval_graph)
+workflow.add_node("rerank", rerank)  # 对推测式检索的结果进行重排序
 
 # 添加边
 workflow.add_edge(START, "router")
@@ -21,11 +23,16 @@ workflow.add_conditional_edges(
     {
         "rag": "retrieval",  # 如果需要RAG，则跳转到RAG节点
         "no_rag": "generator",  # 否则跳转到聊天机器人节点
+        # 推测式检索的结果已可用, 根据是否已经 rerank 跳过检索子图
+        "prefetched": "generator" if SPECULATIVE_RERANK else "rerank",
     },
 )
 workflow.add_edge("retrieval", "generator")
+workflow.add_edge("rerank", "generator")
 workflow.add_edge("generator", END)
 
 
 # 编译图
 graph = workflow.compile()
+# WebSocket 会话使用的图: 以会话 ID 为 thread_id 保存多轮对话的状态
+session_graph = workflow.compile(checkpointer=checkpointer)
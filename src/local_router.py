@@ -0,0 +1,234 @@
+"""本地路由 - 在调用 LLM 路由之前, 用规则和历史路由结果的近邻投票判断是否需要 RAG"""
+
+import asyncio
+import os
+import random
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+import numpy as np
+
+from src import metrics
+from src.bm25_index import IDENTIFIER_PATTERN
+from src.utils import get_logger, normalize_query
+
+logger = get_logger()
+
+ROUTER_EXAMPLES_PATH = Path("chroma_db/router_examples.npz")
+CONFIDENCE_THRESHOLD = float(os.getenv("LOCAL_ROUTER_THRESHOLD", "0.8"))
+# 本地路由有把握时, 仍按该比例在后台调用 LLM 路由, 统计两者的一致率
+AUDIT_RATE = float(os.getenv("LOCAL_ROUTER_AUDIT_RATE", "0.05"))
+NUM_NEIGHBORS = 5
+MIN_SIMILARITY = 0.75  # 余弦相似度低于该值的历史查询不参与投票
+MAX_EXAMPLES = 5000
+SAVE_EVERY = 20  # 每新增多少条样本写一次文件
+
+SMALL_TALK_PATTERN = re.compile(
+    r"^(hi|hello|hey|yo|thanks|thank you|thx|ok|okay|bye|goodbye|good (morning|afternoon|evening|night)"
+    r"|你好|您好|嗨|哈囉|哈喽|謝謝|谢谢|再見|再见|早安|午安|晚安)[\s!！.。,，~～?？]*$"
+)
+ARITHMETIC_PREFIX_PATTERN = re.compile(r"^(what is|what's|whats|calculate|compute)\s+")
+ARITHMETIC_PATTERN = re.compile(
+    r"^[\d\s.()]*\d\s*[-+*/x×÷^%]\s*[\d\s.()+\-*/x×÷^%]*[=?？\s]*$"
+)
+
+
+@dataclass
+class LocalDecision:
+    need_rag: bool | None  # 没有任何依据时为 None
+    confidence: float
+    source: str  # "rule" | "knn" | "none"
+    embedding: Any = None
+
+    @property
+    def confident(self) -> bool:
+        return self.need_rag is not None and self.confidence >= CONFIDENCE_THRESHOLD
+
+
+def match_rules(query: str) -> bool | None:
+    """明确的寒暄和算术不需要 RAG, 带藏品编号的查询一定需要 RAG; 其余情况返回 None。"""
+    if IDENTIFIER_PATTERN.search(query):
+        return True
+    normalized = normalize_query(query)
+    if SMALL_TALK_PATTERN.match(normalized):
+        return False
+    if ARITHMETIC_PATTERN.match(ARITHMETIC_PREFIX_PATTERN.sub("", normalized)):
+        return False
+    return None
+
+
+class LocalRouter:
+    """
+    规则 + 近邻分类器。
+
+    LLM 路由的每次判断都会以 (查询向量, need_rag) 的形式保存下来; 新查询取余弦相似度最高的
+    `NUM_NEIGHBORS` 个历史查询按相似度加权投票, 置信度为多数票的权重占比乘以找到的近邻比例,
+    历史样本不足时自然偏低, 交给 LLM 路由。
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], Awaitable[Any]],
+        path: Path | None = ROUTER_EXAMPLES_PATH,
+        audit_rate: float = AUDIT_RATE,
+    ):
+        self.embed = embed
+        self.path = path
+        self.audit_rate = audit_rate
+        self._queries: list[str] = []
+        self._labels: list[bool] = []
+        self._embeddings: list[np.ndarray] = []
+        self._matrix: np.ndarray | None = None
+        self._unsaved = 0
+        self._saving: asyncio.Task | None = None
+        self._audits: set[asyncio.Task] = set()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def _load(self):
+        if self.path is None or not self.path.exists():
+            return
+        with np.load(self.path) as data:
+            self._queries = data["queries"].tolist()
+            self._labels = data["need_rag"].tolist()
+            self._matrix = data["embeddings"].astype(np.float32)
+        self._embeddings = list(self._matrix)
+
+    def _snapshot(self) -> dict[str, np.ndarray]:
+        """在事件循环中复制样本, 写文件的线程不会看到 `record` 进行到一半的列表。"""
+        matrix = (
+            self._matrix if self._matrix is not None else np.stack(self._embeddings)
+        )
+        self._matrix = matrix  # _matrix 不会被原地修改, 之后的投票可以直接复用
+        return {
+            "queries": np.array(self._queries, dtype=str),
+            "need_rag": np.array(self._labels, dtype=bool),
+            "embeddings": matrix,
+        }
+
+    def _save(self, snapshot: dict[str, np.ndarray]):
+        """以二进制格式写入, 向量不需要逐个转换成 JSON 数字。"""
+        assert self.path is not None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **snapshot)
+        os.replace(tmp_path, self.path)
+
+    async def _embedding(self, query: str) -> np.ndarray | None:
+        try:
+            embedding = np.asarray(await self.embed(query), dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Failed to embed query for local router: {e}")
+            return None
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else None
+
+    def _vote(self, embedding: np.ndarray) -> tuple[bool | None, float]:
+        if not self._embeddings:
+            return None, 0.0
+        if self._matrix is None:
+            self._matrix = np.stack(self._embeddings)
+        similarities = self._matrix @ embedding
+        nearest = np.argsort(-similarities)[:NUM_NEIGHBORS]
+        weights = {True: 0.0, False: 0.0}
+        found = 0
+        for idx in nearest:
+            if similarities[idx] < MIN_SIMILARITY:
+                break
+            weights[self._labels[idx]] += float(similarities[idx])
+            found += 1
+        if not found:
+            return None, 0.0
+        need_rag = weights[True] >= weights[False]
+        share = weights[need_rag] / (weights[True] + weights[False])
+        return need_rag, share * found / NUM_NEIGHBORS
+
+    async def route(self, query: str) -> LocalDecision:
+        rule = match_rules(query)
+        if rule is not None:
+            return LocalDecision(rule, 1.0, "rule")
+
+        embedding = await self._embedding(query)
+        if embedding is None:
+            return LocalDecision(None, 0.0, "none")
+        need_rag, confidence = self._vote(embedding)
+        return LocalDecision(need_rag, confidence, "knn", embedding)
+
+    async def record(
+        self, query: str, need_rag: bool, embedding: np.ndarray | None = None
+    ):
+        """保存 LLM 路由的判断作为新样本, `embedding` 为 `route` 时已算出的查询向量。"""
+        if embedding is None:
+            embedding = await self._embedding(query)
+            if embedding is None:
+                return
+        self._queries.append(query)
+        self._labels.append(need_rag)
+        self._embeddings.append(embedding)
+        if len(self._labels) > MAX_EXAMPLES:
+            del self._queries[0], self._labels[0], self._embeddings[0]
+        self._matrix = None
+
+        self._unsaved += 1
+        # 在后台写文件, 路由请求不等待; 上一次写入尚未完成时推迟到下一条样本,
+        # 同一时间只有一个线程写文件
+        saving = self._saving is not None and not self._saving.done()
+        if self.path is not None and self._unsaved >= SAVE_EVERY and not saving:
+            self._unsaved = 0
+            self._saving = asyncio.create_task(
+                asyncio.to_thread(self._save, self._snapshot())
+            )
+            self._saving.add_done_callback(self._log_save_error)
+
+    @staticmethod
+    def _log_save_error(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to save router examples: {task.exception()}")
+
+    def compare(self, decision: LocalDecision, need_rag: bool):
+        """统计本地判断与 LLM 路由的一致率, 按置信度分桶, 用于调整阈值。"""
+        if decision.need_rag is None:
+            return
+        agreed = decision.need_rag == need_rag
+        bucket = f"{min(int(decision.confidence * 10), 9) / 10:.1f}"
+        outcome = "agree" if agreed else "disagree"
+        metrics.counter(f"router.agreement.{outcome}").inc()
+        metrics.counter(f"router.agreement.{bucket}.{outcome}").inc()
+
+        agree = metrics.counter("router.agreement.agree").value
+        total = agree + metrics.counter("router.agreement.disagree").value
+        logger.info(
+            f"Local router {outcome}s with LLM (source={decision.source}, "
+            f"confidence={decision.confidence:.2f}); agreement {agree / total:.1%} "
+            f"over {int(total)} comparisons"
+        )
+
+    def audit(
+        self,
+        query: str,
+        decision: LocalDecision,
+        llm_route: Callable[[str], Awaitable[bool]],
+    ):
+        """按 `audit_rate` 抽样, 在后台用 LLM 路由复核有把握的本地判断。"""
+        if random.random() >= self.audit_rate:
+            return
+
+        async def _audit():
+            try:
+                need_rag = await llm_route(query)
+            except Exception as e:
+                logger.error(f"Router audit failed: {e}")
+                return
+            self.compare(decision, need_rag)
+            if decision.source == "knn" and need_rag != decision.need_rag:
+                # 让错误的近邻投票在之后得到纠正
+                await self.record(query, need_rag, decision.embedding)
+
+        task = asyncio.create_task(_audit())
+        self._audits.add(task)
+        task.add_done_callback(self._audits.discard)
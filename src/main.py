@@ -1,17 +1,37 @@
 import asyncio
 import os
 import traceback
+import uuid
+from contextlib import asynccontextmanager
 from typing import TypedDict
 import warnings
 import json
-from langchain_core.runnables.schema import StreamEvent
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from src.graph import graph
-from src.utils import get_tts, get_logger
-from src.accumulator import AudioAccumulator
+from langchain_core.messages import AIMessage, HumanMessage
+from starlette.websockets import WebSocketState
+from src.graph import session_graph
+from src.retrieval_graph import warmup
+from src.utils import (
+    estimate_tokens,
+    get_answer_cache,
+    get_async_tts,
+    get_logger,
+    get_narration_pack,
+)
+from src.narration_pack import DEFAULT_NARRATION_QUERY
+from src.accumulator import SPEECH_SECONDS_PER_TOKEN, AudioAccumulator
+from src.outbound import OutboundQueue
+from src.segmenter import SEGMENTATION_POLICY
+from src.session import (
+    SESSION_IDLE_TIMEOUT,
+    SESSION_LIMIT_CLOSE_CODE,
+    SessionLimitExceeded,
+    sessions,
+)
+from src import metrics
 from api_exception import register_exception_handlers
 
 os.environ["ANONYMIZED_TELEMETRY"] = "False"
@@ -19,11 +39,24 @@ os.environ["ANONYMIZED_TELEMETRY"] = "False"
 warnings.filterwarnings("ignore")
 logger = get_logger()
 origins = ["*", "http://localhost:5174"]
+TTS_MAX_CONCURRENCY = 3  # 每个请求同时合成的语音段落数量
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时加载内存文档索引, 二维码扫描不再需要访问 Chroma
+    try:
+        await warmup()
+    except Exception as e:
+        logger.warning(f"Failed to warm up retrieval indexes: {e}")
+    yield
+
 
 app = FastAPI(
     title="Museum Tour Guide API",
     description="API for the Museum Tour Guide application using RAG with LangGraph and LangChain",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 register_exception_handlers(app, log_traceback=False, log=True)
@@ -44,106 +77,270 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/api/v1/metrics")
+def get_metrics():
+    return metrics.snapshot()
+
+
 @app.get("/api/v1/error")
 async def error():
     raise ValueError("This is a test error endpoint.")
 
 
-@app.websocket("/api/v1/invoke")
-async def invoke(websocket: WebSocket):
-    await websocket.accept()
-    acc = None
-
-    # 获取节点ID的辅助函数
-    def get_node_id(node_name: str, event):
-        if event["name"] == node_name:
-            return event["run_id"]
-        else:
-            return None
-
-    try:
-        data = await websocket.receive_json()
-        query = data.get("query", None)
-        doc_id = data.get("doc_id", None)
+async def answer(
+    websocket: WebSocket,
+    data: dict,
+    thread_id: str,
+    acc: AudioAccumulator,
+    outbound: OutboundQueue,
+):
+    """回答会话中的一个问题: 以 "connected" 开始, 以 "done" 结束。"""
+    query = data.get("query", None)
+    doc_id = data.get("doc_id", None)
 
-        if not query:
+    if not query:
+        if not doc_id or doc_id == "null":
             raise ValueError("Query parameter is required.")
+        # 扫码且没有自定义问题: 优先使用离线讲解包, 没有时实时生成默认讲解
+        query = DEFAULT_NARRATION_QUERY
+        cached_frames = await asyncio.to_thread(get_narration_pack().frames, doc_id)
+    else:
+        cached_frames = None
 
-        graph_input = {
-            "messages": [{"role": "user", "content": query}],
-            "doc_id": doc_id,
-        }
+    config = {"configurable": {"thread_id": thread_id}}
+    state = await session_graph.aget_state(config)
+    # 答案缓存中的回答没有考虑上下文, 只用于会话的第一个问题;
+    # 讲解包只对应展品本身, 会话中任何一次扫码都可以重放
+    first_turn = not state.values.get("messages")
+
+    # 相同或高度相似的问题直接重放缓存的文本和音频帧
+    answer_cache = get_answer_cache()
+    if cached_frames is None and first_turn:
+        cached_frames = await answer_cache.lookup(query, doc_id)
+    if cached_frames is not None:
+        await websocket.send_json({"event": "connected", "data": {"status": "success"}})
+        for frame in cached_frames:
+            if isinstance(frame, dict):
+                await websocket.send_json(frame)
+            else:
+                await websocket.send_bytes(frame)
+        await websocket.send_json({"event": "done", "data": {"status": "success"}})
 
-        # 结果队列, 存储任务完成后的结果
-        queue = asyncio.Queue()
+        # 重放的回答同样记入对话历史, 之后的问题可以引用它
+        text = "".join(
+            frame["data"]["chunk"]
+            for frame in cached_frames
+            if isinstance(frame, dict) and frame["event"] == "message"
+        )
+        await session_graph.aupdate_state(
+            config,
+            {"messages": [HumanMessage(query), AIMessage(text)]},
+            as_node="generator",
+        )
+        return
 
-        tts = get_tts()
-        acc = AudioAccumulator(tts_function=tts, num_sentence_cached=1)
+    graph_input = {
+        "messages": [{"role": "user", "content": query}],
+        "doc_id": doc_id,
+        "docs": [],  # 清除上一轮检索到的文档
+    }
 
-        await websocket.send_json({"event": "connected", "data": {"status": "success"}})
+    # 发送队列: 文本优先于音频, 客户端跟不上时合并或丢弃音频
+    outbound.reset()
+    acc.reset()
+    streamed = []  # 已生成的文本块, 用于估计取消时节省的 token 数
 
-        # 文本生成函数
-        async def text_generation_task():
-            event: StreamEvent
-            generator_id = None
-            async for event in graph.astream_events(graph_input, version="v2"):
-                if generator_id is None:
-                    generator_id = get_node_id("generator", event)
-
-                if (
-                    event["event"] == "on_chat_model_stream"
-                    and generator_id in event["parent_ids"]
-                ):
-                    if "data" not in event or "chunk" not in event["data"]:
-                        logger.error(f"No data in event: {event}")
-                        continue
+    await websocket.send_json({"event": "connected", "data": {"status": "success"}})
 
-                    chunk = event["data"]["chunk"].content
-                    if chunk:
-                        data = {
-                            "event": "message",
-                            "data": {"chunk": chunk},
-                        }
-                        # 将结果添加到结果队列以及 accumulator 中
-                        await queue.put(data)
-                        await acc.add_chunk(chunk)
-            await acc.flush()
+    # 文本生成函数
+    async def text_generation_task():
+        try:
+            # generator 节点通过 stream writer 只推送阶段标记和文本块
+            async for update in session_graph.astream(
+                graph_input, config, stream_mode="custom"
+            ):
+                if "stage" in update:
+                    await outbound.put({"event": "stage", "data": update})
+                    continue
 
-        # 音频生成任务
-        async def audio_generation_task():
-            async for audio_chunk in acc:
-                await queue.put(audio_chunk)
+                chunk = update["chunk"]
+                streamed.append(chunk)
+                data = {
+                    "event": "message",
+                    "data": {"chunk": chunk},
+                }
+                # 将结果添加到结果队列以及 accumulator 中
+                # add_chunk 只调度 TTS 任务, 不会阻塞文本流
+                await outbound.put(data)
+                await acc.add_chunk(chunk)
+        except Exception as e:
+            # 交给发送循环抛出, 由它取消其余任务
+            await outbound.put(e)
+            return
+        metrics.histogram("generation.tokens").observe(
+            estimate_tokens("".join(streamed))
+        )
+        await acc.flush()
 
-            await queue.put(None)  # 使用 None 标记任务的结束
+    # 音频生成任务
+    async def audio_generation_task():
+        # put_audio 在 "block" 策略下等待发送, accumulator 随之暂停合成
+        async for audio_chunk in acc:
+            await outbound.put_audio(audio_chunk)
+            if outbound.audio_dropped:
+                # 余下的音频不会再发送, 停止合成
+                await acc.mute()
 
-        text_task = asyncio.create_task(text_generation_task())
-        audio_task = asyncio.create_task(audio_generation_task())
+        await outbound.close()  # 队列取空后 get 返回 None, 标记回答的结束
 
-        asyncio.gather(text_task, audio_task)
+    # 两个任务都属于这次回答: 正常结束时已经完成, 断开、出错或被取消时一并取消
+    text_task = asyncio.create_task(text_generation_task())
+    audio_task = asyncio.create_task(audio_generation_task())
 
+    sent_frames = []  # 按发送顺序记录的帧, 完整回答结束后写入答案缓存
+    try:
         while True:
-            item = await queue.get()
+            item = await outbound.get()
             if item is None:
                 break
+            if isinstance(item, Exception):
+                raise item
 
             if isinstance(item, dict):
                 await websocket.send_json(item)
             elif isinstance(item, bytes):
                 await websocket.send_bytes(item)
+            # 阶段标记只对实时生成有意义, 不写入答案缓存
+            if not (isinstance(item, dict) and item["event"] == "stage"):
+                sent_frames.append(item)
+    except BaseException:
+        await cancel_answer(text_task, audio_task, acc, streamed)
+        raise
+
+    await websocket.send_json({"event": "done", "data": {"status": "success"}})
+    # 丢弃过音频的回答不完整, 不写入答案缓存
+    if first_turn and not outbound.audio_dropped:
+        await answer_cache.store(query, doc_id, sent_frames)
+
+
+async def cancel_answer(
+    text_task: asyncio.Task,
+    audio_task: asyncio.Task,
+    acc: AudioAccumulator,
+    streamed: list[str],
+):
+    """
+    取消 LLM 流 (连同检索)、进行中的 TTS, 并丢弃尚未发送的音频。
+    节省的 token 数按已完成回答的长度中位数减去已生成的部分估计。
+    """
+    generating = not text_task.done()
+    for task in (text_task, audio_task):
+        task.cancel()
+    await asyncio.gather(text_task, audio_task, return_exceptions=True)
+    tts_seconds_saved = await acc.cancel()
+
+    tokens_saved = 0.0
+    expected = metrics.histogram("generation.tokens").percentile(50)
+    if generating and expected is not None:
+        tokens_saved = max(0.0, expected - estimate_tokens("".join(streamed)))
+    tts_seconds_saved += tokens_saved * SPEECH_SECONDS_PER_TOKEN
+
+    metrics.counter("cancel.answers").inc()
+    metrics.counter("cancel.tokens_saved").inc(tokens_saved)
+    metrics.counter("cancel.tts_seconds_saved").inc(tts_seconds_saved)
+    logger.info(
+        f"Cancelled answer: ~{tokens_saved:.0f} tokens and "
+        f"~{tts_seconds_saved:.1f}s of TTS saved."
+    )
 
-        await websocket.send_json({"event": "done", "data": {"status": "success"}})
+
+@app.websocket("/api/v1/invoke")
+async def invoke(websocket: WebSocket):
+    """
+    一个连接依次回答多个问题, 对话历史保存在服务端。
+    连接空闲超过 SESSION_IDLE_TIMEOUT 秒或客户端断开时会话结束并释放历史。
+    """
+    await websocket.accept()
+    try:
+        sessions.open()
+    except SessionLimitExceeded as e:
+        logger.warning(str(e))
+        error_payload = {"error": type(e).__name__, "detail": str(e)}
+        await websocket.send_json({"event": "error", "data": error_payload})
+        await websocket.close(code=SESSION_LIMIT_CLOSE_CODE)
+        return
+
+    thread_id = uuid.uuid4().hex
+    queries = 0
+    outbound: OutboundQueue | None = None
+    receiver: asyncio.Task | None = None
+    answer_task: asyncio.Task | None = None
+
+    # 会话已计入名额, 之后的初始化也要在 try 中, 失败时同样释放名额
+    try:
+        # 流式TTS: 同一会话的所有回答复用 TTS 客户端的连接池和同一个 accumulator
+        tts = get_async_tts()
+        acc = AudioAccumulator(
+            tts_function=tts.stream,
+            max_concurrency=TTS_MAX_CONCURRENCY,
+            policy=SEGMENTATION_POLICY,
+        )
+        outbound = OutboundQueue()
+        # 回答期间也在等待下一条消息, 客户端断开时立即取消正在进行的回答
+        receiver = asyncio.create_task(websocket.receive_json())
+
+        while True:
+            done, _ = await asyncio.wait({receiver}, timeout=SESSION_IDLE_TIMEOUT)
+            if not done:
+                metrics.counter("sessions.idle_timeouts").inc()
+                logger.info(f"Session {thread_id} idle, closing.")
+                break
+            message = receiver
+            receiver = asyncio.create_task(websocket.receive_json())
+
+            queries += 1
+            try:
+                data = message.result()  # 客户端已断开时抛出 WebSocketDisconnect
+                answer_task = asyncio.create_task(
+                    answer(websocket, data, thread_id, acc, outbound)
+                )
+                await asyncio.wait(
+                    {answer_task, receiver}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not answer_task.done() and isinstance(
+                    receiver.exception(), WebSocketDisconnect
+                ):
+                    # 访客在回答过程中离开: 取消回答, 不再生成和合成
+                    answer_task.cancel()
+                    await asyncio.gather(answer_task, return_exceptions=True)
+                    raise receiver.exception()  # type: ignore[misc]
+                await answer_task
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                # 单个问题出错不结束会话
+                logger.error(
+                    f"Error during WebSocket communication: {e}\n{traceback.format_exc()}"
+                )
+                error_payload = {"error": type(e).__name__, "detail": str(e)}
+                await websocket.send_json({"event": "error", "data": error_payload})
 
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected by client.")
-        if acc:
-            await acc.flush()
     except Exception as e:
-        logger.error(
-            f"Error during WebSocket communication: {e}\n{traceback.format_exc()}"
-        )
+        # 会话初始化失败 (例如缺少 TTS 配置)
+        logger.error(f"Failed to start session: {e}\n{traceback.format_exc()}")
         error_payload = {"error": type(e).__name__, "detail": str(e)}
         await websocket.send_json({"event": "error", "data": error_payload})
-        if acc:
-            await acc.flush()
     finally:
-        await websocket.close()
+        if receiver is not None:
+            receiver.cancel()
+        if answer_task is not None and not answer_task.done():
+            answer_task.cancel()
+            await asyncio.gather(answer_task, return_exceptions=True)
+        if outbound is not None:
+            # 慢速客户端在发送队列中最多占用的内存
+            metrics.histogram("outbound.high_water_bytes").observe(outbound.high_water)
+        await sessions.close(thread_id, queries)
+        if websocket.client_state != WebSocketState.DISCONNECTED:
+            await websocket.close()
@@ -0,0 +1,89 @@
+"""进程内的轻量指标 - 计数器与延迟分布, 通过 /api/v1/metrics 暴露"""
+
+import math
+import threading
+from collections import deque
+
+_lock = threading.Lock()
+_counters: dict[str, "Counter"] = {}
+_histograms: dict[str, "Histogram"] = {}
+
+
+class Counter:
+    """单调递增的计数器, 可在线程池中安全使用。"""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Histogram:
+    """保留最近 `max_samples` 个观测值的分布, 用于计算 p50/p99 等分位数。"""
+
+    def __init__(self, max_samples: int = 2048):
+        self._samples: deque[float] = deque(maxlen=max_samples)
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._samples.append(value)
+            self._count += 1
+            self._sum += value
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def percentile(self, p: float) -> float | None:
+        """最近观测值的第 p 百分位 (最近秩法), 没有观测值时返回 None。"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = max(math.ceil(p / 100 * len(samples)), 1)
+        return samples[rank - 1]
+
+    def summary(self) -> dict:
+        return {
+            "count": self._count,
+            "mean": self._sum / self._count if self._count else None,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+        }
+
+
+def counter(name: str) -> Counter:
+    """获取 (不存在时创建) 指定名称的计数器。"""
+    with _lock:
+        if name not in _counters:
+            _counters[name] = Counter()
+        return _counters[name]
+
+
+def histogram(name: str) -> Histogram:
+    """获取 (不存在时创建) 指定名称的分布。"""
+    with _lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram()
+        return _histograms[name]
+
+
+def snapshot() -> dict:
+    """当前 worker 进程中所有指标的快照。"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = dict(_histograms)
+    return {
+        "counters": {name: c.value for name, c in sorted(counters.items())},
+        "histograms": {name: h.summary() for name, h in sorted(histograms.items())},
+    }
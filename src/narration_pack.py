@@ -0,0 +1,102 @@
+"""离线讲解包 - 为每个二维码展品预先生成的讲解文本和音频, 扫码时直接重放"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from src.utils import get_logger
+
+logger = get_logger()
+
+NARRATION_DIR = Path("static/narrations")
+MANIFEST_NAME = "manifest.json"
+AUDIO_DIR_NAME = "audio"
+DEFAULT_NARRATION_QUERY = "Tell me about this object."
+
+
+def document_hash(path: str | Path) -> str:
+    """源文档文件内容的哈希, 内容不变时跳过重新生成。"""
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def audio_filename(source_hash: str, index: int) -> str:
+    """音频文件名包含源文档哈希, 新旧版本的文件可以共存, 替换清单前不会影响正在服务的请求。"""
+    return f"{source_hash[:16]}_{index:03d}.mp3"
+
+
+def read_manifest(directory: str | Path) -> dict:
+    path = Path(directory) / MANIFEST_NAME
+    if not path.exists():
+        return {"version": 0, "entries": {}}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def write_manifest(directory: str | Path, manifest: dict):
+    """先写临时文件再替换, 服务端不会读到写了一半的清单。"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp_path = directory / f"{MANIFEST_NAME}.tmp"
+    tmp_path.write_text(
+        json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+    os.replace(tmp_path, directory / MANIFEST_NAME)
+
+
+class NarrationPack:
+    """
+    由 `narrate.py` 生成的讲解包。
+
+    清单记录每个 `doc_id` 的讲解文本和按播放顺序排列的音频文件; 清单文件的修改时间变化时
+    (重新运行了批处理任务) 自动重新加载。没有 "hash" 的条目有音频段落合成失败,
+    不提供给访客, 由实时生成代替, 直到下次运行批处理任务。
+    """
+
+    def __init__(self, directory: str | Path = NARRATION_DIR):
+        self.directory = Path(directory)
+        self.version: int | None = None
+        self._entries: dict[str, dict] = {}
+        self._mtime_ns: int | None = None
+
+    def refresh(self):
+        """清单有变化时重新加载, 只需一次 stat 调用。"""
+        try:
+            mtime_ns = os.stat(self.directory / MANIFEST_NAME).st_mtime_ns
+        except FileNotFoundError:
+            self.version, self._entries, self._mtime_ns = None, {}, None
+            return
+        if mtime_ns == self._mtime_ns:
+            return
+
+        manifest = read_manifest(self.directory)
+        self.version = manifest["version"]
+        self._entries = manifest["entries"]
+        self._mtime_ns = mtime_ns
+        logger.info(
+            f"Loaded narration pack v{self.version} with {len(self._entries)} entries."
+        )
+
+    def __contains__(self, doc_id: str) -> bool:
+        self.refresh()
+        return "hash" in self._entries.get(doc_id, {})
+
+    def frames(self, doc_id: str) -> list[dict | bytes] | None:
+        """
+        返回与实时回答相同格式的帧: 一条 `message` 文本帧, 随后是按顺序排列的音频段落。
+        没有该展品的讲解、讲解不完整或音频文件缺失时返回 None。
+        """
+        self.refresh()
+        entry = self._entries.get(doc_id)
+        if entry is None or "hash" not in entry:
+            return None
+
+        frames: list[dict | bytes] = [
+            {"event": "message", "data": {"chunk": entry["text"]}}
+        ]
+        try:
+            for filename in entry["audio"]:
+                frames.append((self.directory / AUDIO_DIR_NAME / filename).read_bytes())
+        except FileNotFoundError as e:
+            logger.warning(f"Narration audio missing for {doc_id}: {e}")
+            return None
+        return frames
@@ -1,31 +1,146 @@
 """定义工作流中的节点"""
 
+import asyncio
+from langchain_core.messages import AIMessage, RemoveMessage
+from langgraph.config import get_stream_writer
+from src import metrics
 from src.models import State
 from src.chains import query_router, rag_generator, direct_generator
-from src.utils import format_docs, get_logger
+from src.retrieval_graph import speculative_retrieval
+from src.context_packer import pack_context
+from src.session import HISTORY_MAX_MESSAGES
+from src.utils import env_flag, get_local_router, get_logger, get_router_cache
 
 logger = get_logger()
 
+# 推测式检索: 路由 LLM 调用的同时开始检索, 路由判定不需要 RAG 时丢弃结果
+SPECULATIVE_RETRIEVAL = env_flag("SPECULATIVE_RETRIEVAL", True)
+# 推测式检索是否同时完成 rerank (会增加被浪费的 rerank 调用)
+SPECULATIVE_RERANK = env_flag("SPECULATIVE_RERANK", False)
+# 本地路由: 规则和近邻分类器有把握时不调用 LLM 路由
+LOCAL_ROUTER = env_flag("LOCAL_ROUTER", True)
+
+
+async def _llm_need_rag(query) -> bool:
+    response = await query_router.ainvoke({"query": query})
+    await asyncio.to_thread(get_router_cache().put, query, response)
+    return response.need_rag  # type: ignore
+
+
+async def _cached_need_rag(query) -> bool | None:
+    """查找路由结果缓存, 内存层命中时不切换线程。"""
+    cache = get_router_cache()
+    routing = cache.peek(query) or await asyncio.to_thread(cache.get, query)
+    return routing.need_rag if routing is not None else None
+
+
+def _write(payload: dict):
+    """
+    推送到 stream_mode="custom" 的流: {"stage": ...} 为阶段标记, {"chunk": ...} 为生成的文本。
+    不在图中运行时 (例如直接调用节点) 忽略。
+    """
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return
+    writer(payload)
+
 
 # 定义 router 节点
 async def router(state: State):
+    result = await _route(state)
+    if result["need_rag"]:
+        _write({"stage": "retrieving"})
+    return result
+
+
+async def _route(state: State):
     if state.get("doc_id"):
         logger.info(f"Doc ID provided: {state['doc_id']}, routing to RAG")
         return {"need_rag": True}
-    response = await query_router.ainvoke({"query": state["messages"][-1].content})
-    return {"need_rag": response.need_rag}  # type: ignore
+
+    query = state["messages"][-1].content
+    # 规范化后相同的查询直接复用之前的路由结果
+    need_rag = await _cached_need_rag(query)
+    if need_rag is not None:
+        return {"need_rag": need_rag}
+
+    if not LOCAL_ROUTER:
+        return await _llm_router(state)
+
+    local_router = get_local_router()
+    decision = await local_router.route(query)  # type: ignore
+    if decision.confident:
+        metrics.counter(f"router.local.{decision.source}").inc()
+        logger.info(
+            f"Local router chose need_rag={decision.need_rag} "
+            f"(source={decision.source}, confidence={decision.confidence:.2f})"
+        )
+        local_router.audit(query, decision, _llm_need_rag)  # type: ignore
+        return {"need_rag": decision.need_rag}
+
+    metrics.counter("router.llm").inc()
+    result = await _llm_router(state)
+    local_router.compare(decision, result["need_rag"])
+    await local_router.record(query, result["need_rag"], decision.embedding)  # type: ignore
+    return result
+
+
+async def _llm_router(state: State):
+    """LLM 路由, 调用期间推测式地开始检索"""
+    if not SPECULATIVE_RETRIEVAL:
+        return {"need_rag": await _llm_need_rag(state["messages"][-1].content)}
+
+    metrics.counter("speculative_retrieval.started").inc()
+    speculative = asyncio.create_task(
+        speculative_retrieval(state, with_rerank=SPECULATIVE_RERANK)
+    )
+    try:
+        need_rag = await _llm_need_rag(state["messages"][-1].content)
+    except BaseException:
+        speculative.cancel()
+        raise
+
+    if not need_rag:
+        speculative.cancel()
+        metrics.counter("speculative_retrieval.wasted").inc()
+        logger.info("Router chose no_rag, discarded speculative retrieval.")
+        return {"need_rag": False}
+
+    try:
+        docs = await speculative
+    except Exception as e:
+        # 推测式检索失败时退回到正常的检索节点
+        metrics.counter("speculative_retrieval.failed").inc()
+        logger.error(f"Speculative retrieval failed: {e}")
+        return {"need_rag": True}
+
+    metrics.counter("speculative_retrieval.used").inc()
+    return {"need_rag": True, "docs": docs}
 
 
 # 定义聊天机器人节点
 async def generator(state: State):
     """聊天机器人节点 - 处理用户消息并生成回复"""
+    *history, question = state["messages"]
+    inputs = {"query": question.content, "history": history}
     if state.get("docs") and len(state["docs"]) > 0:
-        response = await rag_generator.ainvoke(
-            {"query": state["messages"][-1].content, "docs": format_docs(state["docs"])}
-        )
-        return {"messages": [response]}
+        # 在 token 预算内打包上下文, 控制提示词长度和首 token 延迟
+        context = pack_context(state["docs"])
+        chunks = rag_generator.astream({**inputs, "docs": context.text})
     else:
-        response = await direct_generator.ainvoke(
-            {"query": state["messages"][-1].content}
-        )
-        return {"messages": [response]}
+        chunks = direct_generator.astream(inputs)
+
+    # 文本块直接推送给 WebSocket, 不经过 astream_events 的全图事件
+    _write({"stage": "generating"})
+    # 只拼接文本, 逐块相加 AIMessageChunk 的开销随回答长度平方增长
+    parts = []
+    async for chunk in chunks:
+        if chunk.content:
+            _write({"chunk": chunk.content})
+            parts.append(chunk.content)
+
+    # 会话中只保留最近的消息, 控制 checkpoint 大小和提示词长度
+    overflow = len(state["messages"]) + 1 - HISTORY_MAX_MESSAGES
+    removed = [RemoveMessage(id=m.id) for m in state["messages"][: max(overflow, 0)]]
+    return {"messages": [*removed, AIMessage(content="".join(parts))]}
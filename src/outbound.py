@@ -0,0 +1,132 @@
+"""WebSocket 发送队列 - 有界、文本优先, 客户端跟不上时合并或丢弃音频"""
+
+import asyncio
+import os
+from collections import deque
+from typing import Any
+
+from src import metrics
+from src.utils import get_logger
+
+logger = get_logger()
+
+# 排队中的音频超过该大小时视为客户端跟不上, 按策略处理
+MAX_AUDIO_BYTES = int(os.getenv("OUTBOUND_MAX_AUDIO_BYTES", str(2 * 1024 * 1024)))
+COALESCE_MAX_BYTES = 256 * 1024  # 一次发送最多合并的音频字节数
+# drop: 丢弃本次回答余下的音频, 只继续发送文本; block: 让音频生产方等待
+AUDIO_POLICY = os.getenv("OUTBOUND_AUDIO_POLICY", "drop")
+
+
+def _frame_size(item: Any) -> int:
+    if isinstance(item, bytes):
+        return len(item)
+    return len(str(item))
+
+
+class OutboundQueue:
+    """
+    一个会话的发送队列, 每个回答开始时 `reset`。
+
+    文本帧 (以及阶段标记、错误) 总是先于音频发送; 排队的音频块按顺序合并为一帧发送,
+    减少慢速客户端的帧数。音频超过 `max_audio_bytes` 时, "drop" 策略放弃本次回答余下的
+    音频并通知客户端 (从中间截断的音频无法正常播放), 调用方随后停止合成;
+    "block" 策略让生产方等待, 有界的 AudioAccumulator 随之暂停合成。
+    `high_water` 记录会话期间排队数据的最大字节数, 即慢速客户端实际占用的内存。
+    """
+
+    def __init__(
+        self,
+        max_audio_bytes: int = MAX_AUDIO_BYTES,
+        coalesce_max_bytes: int = COALESCE_MAX_BYTES,
+        policy: str = AUDIO_POLICY,
+    ):
+        self.max_audio_bytes = max_audio_bytes
+        self.coalesce_max_bytes = coalesce_max_bytes
+        self.policy = policy
+        self.high_water = 0
+        self.reset()
+
+    def reset(self):
+        self._text: deque[Any] = deque()
+        self._audio: deque[bytes] = deque()
+        self._text_bytes = 0
+        self._audio_bytes = 0
+        self._closed = False
+        self.audio_dropped = False
+        self._changed = asyncio.Condition()
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._text_bytes + self._audio_bytes
+
+    async def _notify(self):
+        self.high_water = max(self.high_water, self.buffered_bytes)
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def put(self, item: Any):
+        """文本帧、阶段标记和异常不受限制, 直接排在所有音频之前。"""
+        self._text.append(item)
+        self._text_bytes += _frame_size(item)
+        await self._notify()
+
+    async def put_audio(self, chunk: bytes):
+        if self.audio_dropped:
+            metrics.counter("outbound.audio_dropped_bytes").inc(len(chunk))
+            return
+
+        if self._audio_bytes + len(chunk) > self.max_audio_bytes and self._audio:
+            if self.policy == "block":
+                async with self._changed:
+                    await self._changed.wait_for(
+                        lambda: self._audio_bytes + len(chunk) <= self.max_audio_bytes
+                        or not self._audio
+                    )
+            else:
+                self.audio_dropped = True
+                metrics.counter("outbound.audio_dropped_answers").inc()
+                metrics.counter("outbound.audio_dropped_bytes").inc(len(chunk))
+                logger.warning(
+                    f"Client is {self._audio_bytes} bytes behind on audio, "
+                    "dropping the rest of this answer's audio."
+                )
+                await self.put({"event": "audio_skipped", "data": {"reason": "slow"}})
+                return
+
+        self._audio.append(chunk)
+        self._audio_bytes += len(chunk)
+        await self._notify()
+
+    async def close(self):
+        """本次回答的所有帧都已入队, 队列取空后 `get` 返回 None。"""
+        self._closed = True
+        await self._notify()
+
+    def _pop(self) -> Any:
+        if self._text:
+            item = self._text.popleft()
+            self._text_bytes -= _frame_size(item)
+            return item
+
+        # 合并连续的音频块, 同一段 mp3 流的字节直接拼接仍然可以播放
+        chunks = [self._audio.popleft()]
+        size = len(chunks[0])
+        while self._audio and size + len(self._audio[0]) <= self.coalesce_max_bytes:
+            chunk = self._audio.popleft()
+            chunks.append(chunk)
+            size += len(chunk)
+        self._audio_bytes -= size
+        if len(chunks) > 1:
+            metrics.counter("outbound.audio_coalesced").inc(len(chunks) - 1)
+        return b"".join(chunks)
+
+    async def get(self) -> Any:
+        async with self._changed:
+            await self._changed.wait_for(
+                lambda: self._text or self._audio or self._closed
+            )
+            if not self._text and not self._audio:
+                return None
+            item = self._pop()
+            self._changed.notify_all()  # 唤醒等待空间的音频生产方
+            return item
@@ -0,0 +1,47 @@
+"""rerank 分数缓存 - 相同 (查询, 文档) 组合的相关性分数只向远程服务请求一次"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from src.utils import normalize_query
+
+MAX_ENTRIES = 50_000
+
+CacheKey = tuple[str, str, str]
+
+
+class RerankScoreCache:
+    """
+    以 (规范化查询, 文档 ID, 文档内容哈希) 为键的 LRU 缓存。
+
+    rerank 模型对每个 (查询, 文档) 组合独立打分, 因此同一组候选中只有未命中的文档需要请求远程服务;
+    文档内容变化后哈希随之变化, 旧分数自然失效。
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[CacheKey, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query: str, doc_id: str | None, content: str) -> CacheKey:
+        content_hash = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        return normalize_query(query), doc_id or "", content_hash
+
+    def get(self, key: CacheKey) -> float | None:
+        with self._lock:
+            score = self._entries.get(key)
+            if score is not None:
+                self._entries.move_to_end(key)
+            return score
+
+    def put(self, key: CacheKey, score: float):
+        with self._lock:
+            self._entries[key] = score
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
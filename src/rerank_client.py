@@ -0,0 +1,153 @@
+"""异步 rerank 客户端 - keep-alive 连接池、单次请求截止时间和对冲请求"""
+
+import asyncio
+import os
+import time
+
+import httpx
+
+from src import metrics
+from src.batching import MAX_BATCH_SIZE, MAX_WAIT, MicroBatcher
+from src.utils import get_logger
+
+logger = get_logger()
+
+RERANK_MODEL = "BAAI/bge-reranker-v2-m3"
+MAX_CONNECTIONS = 8
+KEEPALIVE_EXPIRY = 30.0  # 空闲 keep-alive 连接的保留时间 (秒)
+CONNECT_TIMEOUT = 2.0
+RERANK_DEADLINE = float(os.getenv("RERANK_DEADLINE", "1.5"))  # 超过后退回检索顺序 (秒)
+# 第一个请求超过该时间仍未返回时再发一个相同的请求, 取先返回的结果; 未设置时不对冲
+RERANK_HEDGE_DELAY = (
+    float(os.environ["RERANK_HEDGE_DELAY"]) if os.getenv("RERANK_HEDGE_DELAY") else None
+)
+
+
+class RerankClient:
+    """
+    SiliconFlow 兼容的异步 rerank 客户端。
+
+    `scores` 在截止时间内返回每个文档的相关性分数, 超时或出错时返回 None,
+    由调用方退回到检索阶段的排序, 不会让整个回答失败。同一批的调用方都超时后,
+    进行中的请求 (包括对冲请求) 一并取消, 不再占用上游。
+
+    rerank 接口每次只接受一个查询, 因此同一时间窗口内来自不同会话的请求先去重,
+    再通过连接池并发发出, 相同的 (查询, 候选文档) 只请求一次。
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        api_key: str,
+        model: str = RERANK_MODEL,
+        max_connections: int = MAX_CONNECTIONS,
+        deadline: float = RERANK_DEADLINE,
+        hedge_delay: float | None = RERANK_HEDGE_DELAY,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait: float = MAX_WAIT,
+    ):
+        self.endpoint = endpoint
+        self.model = model
+        self.deadline = deadline
+        self.hedge_delay = hedge_delay
+        self._client = httpx.AsyncClient(
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {api_key}",
+            },
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(deadline, connect=CONNECT_TIMEOUT),
+        )
+        self._batcher: MicroBatcher[tuple[str, tuple[str, ...]], list[float]] = (
+            MicroBatcher(
+                self._score_batch,
+                max_batch_size=max_batch_size,
+                max_wait=max_wait,
+                name="rerank",
+            )
+        )
+
+    async def _request(self, query: str, documents: list[str]) -> list[float]:
+        response = await self._client.post(
+            self.endpoint,
+            json={"model": self.model, "query": query, "documents": documents},
+        )
+        response.raise_for_status()
+        results = response.json()
+        if "results" not in results:
+            raise ValueError(f"Rerank API error: {results}")
+
+        # 结果可能按分数排序, 用 index 对应回输入文档
+        scores = [0.0] * len(documents)
+        for position, res in enumerate(results["results"]):
+            scores[res.get("index", position)] = res["relevance_score"]
+        return scores
+
+    async def _hedged(self, query: str, documents: list[str]) -> list[float]:
+        """发出请求, 必要时在 `hedge_delay` 后再发一个, 返回先成功的结果。"""
+        tasks = [asyncio.create_task(self._request(query, documents))]
+        try:
+            if self.hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+                if not done:
+                    metrics.counter("rerank.hedged").inc()
+                    tasks.append(asyncio.create_task(self._request(query, documents)))
+
+            error: BaseException | None = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error  # type: ignore[misc]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _score_batch(
+        self, items: list[tuple[str, tuple[str, ...]]]
+    ) -> list[list[float] | BaseException]:
+        """去重后并发发出一批请求, 每个调用方得到自己的结果或异常。"""
+        unique = list(dict.fromkeys(items))
+        results = await asyncio.gather(
+            *(self._hedged(query, list(documents)) for query, documents in unique),
+            return_exceptions=True,
+        )
+        by_item = dict(zip(unique, results))
+        return [by_item[item] for item in items]
+
+    async def scores(
+        self, query: str, documents: list[str], deadline: float | None = None
+    ) -> list[float] | None:
+        """返回与 `documents` 一一对应的相关性分数, 超时或失败时返回 None。"""
+        metrics.counter("rerank.requests").inc()
+        deadline = deadline or self.deadline
+        start = time.perf_counter()
+        try:
+            scores = await asyncio.wait_for(
+                self._batcher.submit((query, tuple(documents))), timeout=deadline
+            )
+        except asyncio.TimeoutError:
+            metrics.counter("rerank.timeouts").inc()
+            # 超时的调用按截止时间计入延迟分布, 否则 p99 会偏低
+            metrics.histogram("rerank.latency").observe(deadline)
+            logger.warning(f"Rerank missed its {deadline:.2f}s deadline.")
+            return None
+        except Exception as e:
+            metrics.counter("rerank.errors").inc()
+            logger.error(f"Rerank request failed: {e!r}")
+            return None
+
+        metrics.histogram("rerank.latency").observe(time.perf_counter() - start)
+        return scores
+
+    async def aclose(self):
+        await self._client.aclose()
@@ -1,14 +1,23 @@
 """定义检索图子图 - 包含检索和重排序节点"""
 
 import asyncio
+import math
+import time
 from langgraph.graph import START, StateGraph, END
 from langchain_core.documents import Document
 from chromadb import PersistentClient
-from numpy import isin
-from regex import R
+from src.bm25_index import BM25Index, reciprocal_rank_fusion
+from src.chunking import expand_to_parents
+from src import metrics
+from src.doc_store import DocumentStore, read_version
 from src.models import State
-from src.utils import get_logger
-import requests
+from src.utils import (
+    env_flag,
+    get_logger,
+    get_query_embedder,
+    get_rerank_cache,
+    get_rerank_client,
+)
 import os
 
 logger = get_logger()
@@ -17,10 +26,23 @@ workflow = StateGraph(State)
 # 全局客户端，避免重复初始化
 _client = None
 _collection = None
-
-FINAL_DOCS_COUNT = 3  # 最终用于生成回答的文档数量
+_bm25_index = None
+_bm25_version = None  # 加载 BM25 索引时的语料版本
+_doc_store = None
+_version_checked_at = 0.0
+
+FINAL_DOCS_COUNT = 4  # 最终用于生成回答的片段数量
+VECTOR_N_RESULTS = 8  # 向量检索返回的候选片段数量
+KEYWORD_N_RESULTS = 8  # BM25 检索返回的候选片段数量
+RERANK_CANDIDATES = 8  # 融合后送入 rerank 的候选片段数量
 CLIENT_PATH = "./chroma_db"
 COLLECTION_NAME = "museum_knowledge_base"
+BM25_INDEX_PATH = os.path.join(CLIENT_PATH, "bm25_index.json")
+VERSION_PATH = os.path.join(CLIENT_PATH, "VERSION")  # setup.py 更新语料后写入的版本戳
+VERSION_CHECK_INTERVAL = 5.0  # 检查版本戳的最小间隔 (秒)
+# 向量检索的前 k 个候选与其余候选的距离差不小于该值时, 排序已经足够明确, 跳过远程 rerank
+ADAPTIVE_RERANK = env_flag("ADAPTIVE_RERANK", True)
+RERANK_SKIP_GAP = float(os.getenv("RERANK_SKIP_GAP", "0.1"))
 
 
 async def _init_chroma():
@@ -41,96 +63,209 @@ async def _init_chroma():
     return _client, _collection
 
 
-async def _retrieve_documents(query: str) -> list[Document]:
-    """异步检索文档"""
+def _check_corpus_version():
+    """语料版本变化时丢弃内存中的文档索引和 BM25 索引, 下次使用时重新加载"""
+    global _doc_store, _bm25_index, _version_checked_at
+    now = time.monotonic()
+    if _doc_store is None and _bm25_index is None:
+        return
+    if now - _version_checked_at < VERSION_CHECK_INTERVAL:
+        return
+    _version_checked_at = now
+
+    version = read_version(VERSION_PATH)
+    stale_store = _doc_store is not None and version != _doc_store.version
+    stale_bm25 = _bm25_index is not None and version != _bm25_version
+    if stale_store or stale_bm25:
+        logger.info("Corpus version changed, reloading document store and BM25 index.")
+        _doc_store = None
+        _bm25_index = None
+
+
+async def _init_doc_store() -> DocumentStore:
+    """加载内存文档索引, 之后的查找不再访问 Chroma"""
+    global _doc_store, _version_checked_at
+    _check_corpus_version()
+    if _doc_store is None:
+        _, collection = await _init_chroma()
+        version = read_version(VERSION_PATH)
+        store = await asyncio.to_thread(
+            DocumentStore.from_collection, collection, version
+        )
+        logger.info(f"Loaded {len(store)} documents into the document store.")
+        _doc_store = store
+        _version_checked_at = time.monotonic()
+    return _doc_store
+
+
+async def warmup():
+    """在服务启动时预先加载 Chroma、文档索引、BM25 索引和向量化模型"""
+    await _init_doc_store()
+    await _init_bm25()
+    await get_query_embedder().embed("warmup")
+
+
+async def _init_bm25() -> BM25Index | None:
+    """加载 BM25 索引, 索引文件不存在时只使用向量检索"""
+    global _bm25_index, _bm25_version, _version_checked_at
+    _check_corpus_version()
+    if _bm25_index is None:
+        if not os.path.exists(BM25_INDEX_PATH):
+            logger.warning(
+                f"BM25 index not found at {BM25_INDEX_PATH}, run setup.py to build it."
+            )
+            return None
+        # 先读版本再加载, 加载期间重新导入时下次检查仍会发现变化
+        version = read_version(VERSION_PATH)
+        _bm25_index = await asyncio.to_thread(BM25Index.load, BM25_INDEX_PATH)
+        _bm25_version = version
+        _version_checked_at = time.monotonic()
+    return _bm25_index
+
+
+async def _vector_search(query: str) -> list[Document]:
+    """异步向量检索"""
     _, collection = await _init_chroma()
+    # 查询向量化是独立的一步: 带缓存, 并与其他会话的并发查询合并成一次批量调用
+    query_embedding = await get_query_embedder().embed(query)
 
     def _query_sync():
         results = collection.query(
-            query_texts=[query],
-            n_results=10,
-            include=["documents", "metadatas"],
+            query_embeddings=[query_embedding],
+            n_results=VECTOR_N_RESULTS,
+            include=["documents", "metadatas", "distances"],
         )
 
         if results["documents"] is None or results["metadatas"] is None:
             logger.warning(f"No documents or metadata found for query: {query}")
             return []
 
+        distances = (results["distances"] or [[]])[0]
         return [
             Document(
                 id=id,
                 page_content=doc,
-                metadata=metadata,
+                # 保留向量距离, rerank 节点据此判断是否可以跳过远程 rerank
+                metadata={**(metadata or {}), "vector_distance": distance},
             )
-            for id, doc, metadata in zip(
-                results["ids"][0], results["documents"][0], results["metadatas"][0]
+            for id, doc, metadata, distance in zip(
+                results["ids"][0],
+                results["documents"][0],
+                results["metadatas"][0],
+                distances,
             )
         ]
 
     return await asyncio.to_thread(_query_sync)
 
 
-async def _retrieve_by_id(doc_id: str) -> list[Document]:
-    _, collection = await _init_chroma()
+async def _keyword_search(query: str) -> list[str]:
+    """异步 BM25 检索, 返回文档 ID"""
+    index = await _init_bm25()
+    if index is None:
+        return []
+    hits = await asyncio.to_thread(index.search, query, KEYWORD_N_RESULTS)
+    return [doc_id for doc_id, _ in hits]
 
-    def _get_by_id_sync():
-        try:
-            results = collection.get(
-                ids=[doc_id],
-                include=["documents", "metadatas"],
-            )
 
-            if results["documents"] is None or results["metadatas"] is None:
-                logger.warning(f"No documents or metadata found for doc_id: {doc_id}")
-                return []
+async def _get_documents(ids: list[str]) -> list[Document]:
+    """根据 ID 批量获取文档"""
+    if not ids:
+        return []
+    store = await _init_doc_store()
+    return store.get_many(ids)
 
-            return [
-                Document(
-                    id=results["ids"][0],
-                    page_content=results["documents"][0],
-                    metadata=results["metadatas"][0],
-                )
-            ]
 
-        except Exception as e:
-            logger.info(f"Error retrieving document by ID {doc_id}: {e}")
-            return []
+async def _retrieve_documents(query: str) -> list[Document]:
+    """混合检索: 向量检索与 BM25 并发执行, 用倒数排名融合合并结果"""
+    vector_docs, keyword_ids = await asyncio.gather(
+        _vector_search(query), _keyword_search(query)
+    )
 
-    return await asyncio.to_thread(_get_by_id_sync)
+    fused_ids = reciprocal_rank_fusion(
+        [[doc.id for doc in vector_docs if doc.id], keyword_ids]
+    )[:RERANK_CANDIDATES]
 
+    docs_by_id = {doc.id: doc for doc in vector_docs}
+    missing_ids = [doc_id for doc_id in fused_ids if doc_id not in docs_by_id]
+    for doc in await _get_documents(missing_ids):
+        docs_by_id[doc.id] = doc
+
+    return [docs_by_id[doc_id] for doc_id in fused_ids if doc_id in docs_by_id]
 
-async def _rerank_documents(query: str, docs: list[Document]) -> list[Document]:
-    def _rerank_documents_sync():
-        docs_raw = [doc.page_content for doc in docs]
-        response = requests.post(
-            os.environ["SILICONFLOW_RERANK_ENDPOINT"],
-            headers={
-                "Authorization": f"Bearer {os.environ['SILICONFLOW_API_KEY']}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": "BAAI/bge-reranker-v2-m3",
-                "query": query,
-                "documents": docs_raw,
-            },
-        )
-        results = response.json()
-        if "results" not in results:
-            raise ValueError(f"Rerank API error: {results}")
 
-        # 添加 rarank 分数
-        for doc, res in zip(docs, results["results"]):
-            doc.metadata["rerank_score"] = res["relevance_score"]
+async def _retrieve_by_id(doc_id: str) -> list[Document]:
+    """二维码扫描: 直接从内存文档索引中取出完整的父文档"""
+    store = await _init_doc_store()
+    doc = store.get_parent(doc_id)
+    if doc is None:
+        logger.warning(f"No documents or metadata found for doc_id: {doc_id}")
+        return []
+    return [doc]
+
+
+def _decisive_vector_order(docs: list[Document]) -> bool:
+    """
+    融合排序的前 `FINAL_DOCS_COUNT` 个候选都来自向量检索, 且它们与其余候选的距离差
+    不小于 `RERANK_SKIP_GAP` 时, rerank 不会改变入选的文档。
+    """
+    top, rest = docs[:FINAL_DOCS_COUNT], docs[FINAL_DOCS_COUNT:]
+    if any("vector_distance" not in doc.metadata for doc in top):
+        return False
+    if not rest:
+        return True
+    worst_top = max(doc.metadata["vector_distance"] for doc in top)
+    best_rest = min(doc.metadata.get("vector_distance", math.inf) for doc in rest)
+    return best_rest - worst_top >= RERANK_SKIP_GAP
+
+
+def _record_saved_latency(path: str):
+    """按当前 rerank 延迟的中位数估计省下的时间。"""
+    p50 = metrics.histogram("rerank.latency").percentile(50)
+    if p50 is not None:
+        metrics.counter(f"rerank.saved_seconds.{path}").inc(p50)
 
-        # 根据分数排序
-        ranked_docs = sorted(
-            docs, key=lambda d: d.metadata["rerank_score"], reverse=True
+
+async def _rerank_documents(query: str, docs: list[Document]) -> list[Document]:
+    """按 rerank 分数排序; rerank 超时或失败时退回检索阶段的排序"""
+    if ADAPTIVE_RERANK and _decisive_vector_order(docs):
+        metrics.counter("rerank.skipped").inc()
+        _record_saved_latency("skipped")
+        logger.info("Vector distances are decisive, skipping remote rerank.")
+        top = docs[:FINAL_DOCS_COUNT]
+        return sorted(top, key=lambda d: d.metadata["vector_distance"])
+
+    # 只有缓存中没有分数的文档需要请求远程 rerank
+    cache = get_rerank_cache()
+    keys = [cache.make_key(query, doc.id, doc.page_content) for doc in docs]
+    scores = [cache.get(key) for key in keys]
+    missing = [idx for idx, score in enumerate(scores) if score is None]
+    metrics.counter("rerank_cache.hits").inc(len(docs) - len(missing))
+    metrics.counter("rerank_cache.misses").inc(len(missing))
+
+    if missing:
+        remote_scores = await get_rerank_client().scores(
+            query, [docs[idx].page_content for idx in missing]
         )
+        if remote_scores is None:
+            logger.warning("Rerank unavailable, falling back to retrieval order.")
+            return docs[:FINAL_DOCS_COUNT]
+        for idx, score in zip(missing, remote_scores):
+            scores[idx] = score
+            cache.put(keys[idx], score)
+    else:
+        metrics.counter("rerank.cached").inc()
+        _record_saved_latency("cached")
+
+    # 添加 rarank 分数
+    for doc, score in zip(docs, scores):
+        doc.metadata["rerank_score"] = score
 
-        ranked_docs = ranked_docs[:FINAL_DOCS_COUNT]  # 只保留前5个
-        return ranked_docs
+    # 根据分数排序
+    ranked_docs = sorted(docs, key=lambda d: d.metadata["rerank_score"], reverse=True)
 
-    return await asyncio.to_thread(_rerank_documents_sync)
+    ranked_docs = ranked_docs[:FINAL_DOCS_COUNT]  # 只保留得分最高的片段
+    return ranked_docs
 
 
 async def retrieve(state: State):
@@ -180,7 +315,9 @@ async def rerank(state: State):
     docs = state.get("docs", [])
     if not docs:
         return {"docs": []}
-    ranked_docs = await _rerank_documents(query, docs)
+    ranked_chunks = await _rerank_documents(query, docs)
+    # 同一文档的片段按原文顺序合并, 生成器只看到得分最高的片段
+    ranked_docs = expand_to_parents(ranked_chunks)
 
     # expected logging: Reranked documents for query - "What is the history of...":
     #      - doc1 (score: 0.95)
@@ -189,18 +326,27 @@ async def rerank(state: State):
         f'Reranked documents for query - "{query}": \n'
         + "\n".join(
             [
-                f"\t\t{idx + 1}. {doc.metadata.get('name', 'unknown')}\t(score: {doc.metadata.get('rerank_score', 'N/A'):.4f})"
-                for idx, doc in enumerate(ranked_docs)
+                f"\t\t{idx + 1}. {doc.metadata.get('name', 'unknown')}\t(score: {doc.metadata.get('rerank_score', float('nan')):.4f})"
+                for idx, doc in enumerate(ranked_chunks)
             ]
         )
     )
     return {"docs": ranked_docs}
 
 
+async def speculative_retrieval(state: State, with_rerank: bool) -> list[Document]:
+    """与路由 LLM 并发执行的检索 (可选包括 rerank), 由 router 节点决定是否采用结果"""
+    docs = (await retrieve(state))["docs"]
+    if with_rerank and docs:
+        docs = (await rerank({**state, "docs": docs}))["docs"]
+    return docs
+
+
 workflow.add_node("retrieve", retrieve)
 workflow.add_node("rerank", rerank)
 
 workflow.add_edge(START, "retrieve")
 workflow.add_edge("retrieve", "rerank")
 workflow.add_edge("rerank", END)
-retrieval_graph = workflow.compile()
+# 检索只依赖当前问题, 作为会话图的子图时不保存 checkpoint
+retrieval_graph = workflow.compile(checkpointer=False)
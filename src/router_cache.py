@@ -0,0 +1,132 @@
+"""路由结果缓存 - 规范化后相同的查询直接复用 LLM 路由的 QueryRouting, 内存 LRU + SQLite 两级存储"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+from src import metrics
+from src.models import QueryRouting
+from src.utils import get_logger, normalize_query
+
+logger = get_logger()
+
+TTL = float(os.getenv("ROUTER_CACHE_TTL", str(24 * 60 * 60)))  # 缓存条目的有效期 (秒)
+MAX_ENTRIES = 10_000
+
+
+def routing_key(query: str) -> str:
+    """规范化查询: 统一全角/半角和大小写, 去掉标点并折叠空白。"""
+    text = "".join(
+        " " if unicodedata.category(char).startswith("P") else char
+        for char in normalize_query(query)
+    )
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class RouterCache:
+    """
+    以规范化查询为键的路由结果缓存, 同一进程内的所有会话共享。
+
+    内存层是带有效期的 LRU, 命中时无需任何 I/O; 设置了 `path` 时另有一个 SQLite 持久层,
+    在进程重启后依然有效。持久层使用墙上时间判断有效期, 内存层使用单调时钟。
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        ttl: float = TTL,
+        max_entries: int = MAX_ENTRIES,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory: OrderedDict[str, tuple[QueryRouting, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._db: sqlite3.Connection | None = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS routing "
+                "(key TEXT PRIMARY KEY, routing TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "DELETE FROM routing WHERE created_at < ?", (time.time() - ttl,)
+            )
+            self._db.commit()
+
+        self._hits_memory = metrics.counter("router_cache.hits.memory")
+        self._hits_disk = metrics.counter("router_cache.hits.disk")
+        self._misses = metrics.counter("router_cache.misses")
+        self._evictions = metrics.counter("router_cache.evictions")
+
+    def _remember(self, key: str, routing: QueryRouting, expires_at: float):
+        """写入内存层并按 LRU 淘汰。调用方需持有锁。"""
+        self._memory[key] = (routing, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._evictions.inc()
+
+    def peek(self, query: str) -> QueryRouting | None:
+        """只查找内存层, 不涉及 I/O, 可以直接在事件循环中调用。未命中不计数。"""
+        key = routing_key(query)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            routing, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self._hits_memory.inc()
+            return routing
+
+    def get(self, query: str) -> QueryRouting | None:
+        """查找缓存, 持久层命中会被提升到内存层。"""
+        routing = self.peek(query)
+        if routing is not None:
+            return routing
+
+        if self._db is not None:
+            key = routing_key(query)
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT routing, created_at FROM routing WHERE key = ?", (key,)
+                ).fetchone()
+            if row is not None:
+                remaining = row[1] + self.ttl - time.time()
+                if remaining > 0:
+                    routing = QueryRouting.model_validate_json(row[0])
+                    with self._lock:
+                        self._remember(key, routing, time.monotonic() + remaining)
+                    self._hits_disk.inc()
+                    return routing
+
+        self._misses.inc()
+        return None
+
+    def put(self, query: str, routing: QueryRouting):
+        """写入内存层和持久层。"""
+        key = routing_key(query)
+        with self._lock:
+            self._remember(key, routing, time.monotonic() + self.ttl)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO routing VALUES (?, ?, ?)",
+                    (key, routing.model_dump_json(), time.time()),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to persist routing for {key!r}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._memory)
@@ -0,0 +1,142 @@
+"""流式分句器 - 在 LLM 逐 token 输出时增量地寻找句子边界"""
+
+import re
+from dataclasses import dataclass
+
+# 句末标点后紧跟一个空白字符即视为句子边界, 与旧版正则 `(.*?)[。！？!:\.\?][\n\s]` 的切分点一致
+SENTENCE_BOUNDARY_PATTERN = r"[。！？!:\.\?]\s"
+# 分句边界: 中文逗号/分号直接生效, 英文逗号/分号后需紧跟空白字符
+CLAUSE_BOUNDARY_PATTERN = r"[，；]|[,;]\s"
+
+
+class SentenceSegmenter:
+    """
+    增量式分句器。
+
+    扫描游标和边界状态在多次 `feed` 之间保留, 每个字符只会被扫描一次;
+    新的文本块追加到列表中, 只在 `pop` 或读取 `buffer` 时拼接, 每个字符只被复制常数次,
+    因此长回答的总开销与文本长度成线性关系, 而不是每个 token 都重新扫描或复制整个缓冲区。
+    Markdown 图片链接不做特殊处理 (与旧版正则行为相同), 由调用方在 TTS 前清洗。
+    """
+
+    def __init__(self, track_clauses: bool = False):
+        pattern = f"(?P<sentence>{SENTENCE_BOUNDARY_PATTERN})"
+        if track_clauses:
+            pattern += f"|(?P<clause>{CLAUSE_BOUNDARY_PATTERN})"
+        self.pattern = re.compile(pattern)
+        self._chunks: list[str] = []  # 尚未拼接的文本块
+        self._length = 0  # 缓冲区的总长度
+        self._tail = ""  # 上一次扫描未能判断的最后一个字符 (可能是句末标点)
+        self.sentence_boundaries: list[int] = []  # 缓冲区中每个完整句子的结束位置
+        self.clause_boundaries: list[int] = []  # 缓冲区中每个分句的结束位置
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def buffer(self) -> str:
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    @property
+    def num_sentence(self) -> int:
+        return len(self.sentence_boundaries)
+
+    def feed(self, chunk: str) -> int:
+        """追加文本块, 只扫描新增部分, 返回缓冲区中完整句子的数量。"""
+        if not chunk:
+            return self.num_sentence
+        text = self._tail + chunk
+        offset = self._length - len(self._tail)
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+
+        scanned = 0
+        for match in self.pattern.finditer(text):
+            if match.lastgroup == "sentence":
+                self.sentence_boundaries.append(offset + match.end())
+            else:
+                self.clause_boundaries.append(offset + match.end())
+            scanned = match.end()
+
+        # 最后一个字符可能是句末标点, 需要等下一个字符到达后才能判断
+        self._tail = text[max(scanned, len(text) - 1) :]
+        return self.num_sentence
+
+    def pop(self, split_pos: int) -> str:
+        """取出 `split_pos` 之前的文本, 剩余部分及其边界留在缓冲区中。"""
+        buffer = self.buffer
+        segment, rest = buffer[:split_pos], buffer[split_pos:]
+        self._chunks = [rest] if rest else []
+        self._length = len(rest)
+        self._tail = self._tail[max(len(self._tail) - len(rest), 0) :]
+        self.sentence_boundaries = [
+            b - split_pos for b in self.sentence_boundaries if b > split_pos
+        ]
+        self.clause_boundaries = [
+            b - split_pos for b in self.clause_boundaries if b > split_pos
+        ]
+        return segment
+
+    def pop_sentences(self) -> str:
+        """取出截至最后一个句子边界的文本, 剩余部分留在缓冲区中。"""
+        if not self.sentence_boundaries:
+            return ""
+        return self.pop(self.sentence_boundaries[-1])
+
+    def drain(self) -> str:
+        """取出缓冲区中的全部文本并重置状态。"""
+        return self.pop(self._length)
+
+
+@dataclass
+class SegmentationPolicy:
+    """
+    自适应分段策略。
+
+    第一段在达到 `first_segment_chars` 后的第一个分句或句子边界处切分, 让访客尽快听到声音;
+    之后每段的长度预算按 `growth_factor` 增长, 只在句子边界切分, 以减少 TTS 请求次数;
+    任何一段都不超过 `max_segment_chars`。
+    """
+
+    first_segment_chars: int = 12
+    growth_factor: float = 2.0
+    max_segment_chars: int = 300
+
+    def budget(self, index: int) -> int:
+        """第 `index` 段 (从 0 开始) 的长度预算。"""
+        budget = int(self.first_segment_chars * self.growth_factor**index)
+        return min(budget, self.max_segment_chars)
+
+    def split_position(self, segmenter: SentenceSegmenter, index: int) -> int | None:
+        """返回第 `index` 段的切分位置, 还不需要切分时返回 None。"""
+        budget = self.budget(index)
+        boundaries = segmenter.sentence_boundaries
+        if index == 0:
+            boundaries = sorted(boundaries + segmenter.clause_boundaries)
+
+        for boundary in boundaries:
+            if budget <= boundary <= self.max_segment_chars:
+                return boundary
+
+        if len(segmenter) <= self.max_segment_chars:
+            return None
+
+        # 超过最大长度: 退而在最后一个句子或分句边界切分, 都没有时在空白处硬切
+        fallback = [
+            b
+            for b in segmenter.sentence_boundaries + segmenter.clause_boundaries
+            if b <= self.max_segment_chars
+        ]
+        if fallback:
+            return max(fallback)
+        whitespace = segmenter.buffer.rfind(" ", 0, self.max_segment_chars)
+        return whitespace + 1 if whitespace > 0 else self.max_segment_chars
+
+
+# 实时服务和离线讲解包共用的分段策略:
+# 第一段在首个分句处切分以尽快出声, 之后的段落逐渐变长以减少 TTS 请求次数
+SEGMENTATION_POLICY = SegmentationPolicy(
+    first_segment_chars=12, growth_factor=2.0, max_segment_chars=300
+)
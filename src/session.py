@@ -0,0 +1,96 @@
+"""WebSocket 会话 - 一个连接承载多轮问答, 对话历史保存在有界的内存 checkpointer 中"""
+
+import os
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata
+from langgraph.checkpoint.memory import InMemorySaver
+
+from src import metrics
+from src.utils import get_logger
+
+logger = get_logger()
+
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "256"))  # 每个 worker 同时保持的会话数上限
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "120"))  # 秒
+HISTORY_MAX_MESSAGES = 10  # 每个会话保留的最近消息数 (问题和回答各算一条)
+SESSION_LIMIT_CLOSE_CODE = 1013  # WebSocket "Try Again Later"
+
+
+class SessionCheckpointer(InMemorySaver):
+    """
+    只保留每个会话最新 checkpoint 的内存 checkpointer。
+
+    会话只需要从最新状态继续, 不需要回溯历史; 写入新 checkpoint 时删除同一会话更早的
+    checkpoint、它们的中间写入以及被新版本取代的通道值, 内存占用只与会话数和历史长度有关。
+    """
+
+    def __init__(self):
+        super().__init__()
+        # (会话, 命名空间) -> 通道 -> 最新版本, 用于找到被取代的通道值
+        self._versions: dict[tuple[str, str], dict[str, str | int | float]] = {}
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        stale = [cid for cid in checkpoints if cid != checkpoint["id"]]
+        for checkpoint_id in stale:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+        versions = self._versions.setdefault((thread_id, checkpoint_ns), {})
+        for channel, version in new_versions.items():
+            previous = versions.get(channel)
+            if previous is not None and previous != version:
+                self.blobs.pop((thread_id, checkpoint_ns, channel, previous), None)
+            versions[channel] = version
+        return saved
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        for key in [key for key in self._versions if key[0] == thread_id]:
+            del self._versions[key]
+
+
+checkpointer = SessionCheckpointer()
+
+
+class SessionLimitExceeded(Exception):
+    pass
+
+
+class SessionRegistry:
+    """统计当前 worker 中的会话数, 超过上限时拒绝新的连接。"""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self.active = 0
+
+    def open(self):
+        if self.active >= self.max_sessions:
+            metrics.counter("sessions.rejected").inc()
+            raise SessionLimitExceeded(
+                f"Too many active sessions ({self.active}/{self.max_sessions})."
+            )
+        self.active += 1
+        metrics.counter("sessions.opened").inc()
+        metrics.histogram("sessions.active").observe(self.active)
+
+    async def close(self, thread_id: str, queries: int):
+        """释放会话占用的名额和对话历史。"""
+        self.active -= 1
+        metrics.histogram("sessions.queries").observe(queries)
+        await checkpointer.adelete_thread(thread_id)
+        logger.info(f"Session {thread_id} closed after {queries} queries.")
+
+
+sessions = SessionRegistry()
@@ -0,0 +1,153 @@
+"""TTS 音频缓存 - 以 (规范化文本, 声音, 模型) 的哈希为键, 内存 LRU + 磁盘两级存储"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from src import metrics
+from src.utils import get_logger, normalize_text
+
+logger = get_logger()
+
+MAX_MEMORY_BYTES = 64 * 1024 * 1024  # 内存层最多缓存 64MB 音频
+MAX_DISK_BYTES = 1024 * 1024 * 1024  # 磁盘层最多缓存 1GB 音频
+
+
+class TTSCache:
+    """
+    内容寻址的 TTS 音频缓存。
+
+    内存层是按字节数限制大小的 LRU, 命中时无需任何 I/O; 磁盘层按最近访问时间淘汰,
+    在进程重启后依然有效。两层都未命中时由调用方请求 TTS 服务并调用 `put` 写回。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path | None = None,
+        max_memory_bytes: int = MAX_MEMORY_BYTES,
+        max_disk_bytes: int = MAX_DISK_BYTES,
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        # 磁盘层的索引: key -> 文件大小, 按访问顺序排列
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_bytes = 0
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._load_disk_index()
+
+        self._hits_memory = metrics.counter("tts_cache.hits.memory")
+        self._hits_disk = metrics.counter("tts_cache.hits.disk")
+        self._misses = metrics.counter("tts_cache.misses")
+        self._evictions = metrics.counter("tts_cache.evictions")
+
+    @staticmethod
+    def make_key(text: str, voice: str, model: str) -> str:
+        """根据规范化后的文本、声音和模型生成缓存键。"""
+        raw = "\x00".join([normalize_text(text), voice, model])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        assert self.cache_dir is not None
+        return self.cache_dir / f"{key}.mp3"
+
+    def _load_disk_index(self):
+        assert self.cache_dir is not None
+        entries = []
+        for path in self.cache_dir.glob("*.mp3"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        logger.info(
+            f"Loaded TTS disk cache: {len(self._disk)} entries ({self._disk_bytes} bytes)"
+        )
+
+    def _remember(self, key: str, audio: bytes):
+        """写入内存层并按 LRU 淘汰。调用方需持有锁。"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        if len(audio) > self.max_memory_bytes:
+            return
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._evictions.inc()
+
+    def peek(self, key: str) -> bytes | None:
+        """只查找内存层, 不涉及 I/O, 可以直接在事件循环中调用。未命中不计数。"""
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self._hits_memory.inc()
+            return audio
+
+    def get(self, key: str) -> bytes | None:
+        """查找缓存, 磁盘命中会被提升到内存层。"""
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self._hits_memory.inc()
+                return audio
+            on_disk = key in self._disk
+
+        if on_disk:
+            path = self._path(key)
+            try:
+                audio = path.read_bytes()
+                os.utime(path)
+            except OSError:
+                audio = None
+            if audio is not None:
+                with self._lock:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self._remember(key, audio)
+                self._hits_disk.inc()
+                return audio
+
+        self._misses.inc()
+        return None
+
+    def put(self, key: str, audio: bytes):
+        """写入内存层和磁盘层。"""
+        with self._lock:
+            self._remember(key, audio)
+            if self.cache_dir is None or key in self._disk:
+                return
+
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Failed to write TTS cache entry {key}: {e}")
+            return
+
+        evicted = []
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = len(audio)
+                self._disk_bytes += len(audio)
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            self._evictions.inc()
+            self._path(old_key).unlink(missing_ok=True)
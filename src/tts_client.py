@@ -0,0 +1,99 @@
+"""异步 TTS 客户端 - 连接池复用 keep-alive 连接, 边接收响应体边产出音频"""
+
+import asyncio
+from typing import AsyncIterator
+
+import httpx
+
+from src.tts_cache import TTSCache
+from src.utils import TTS_MODEL, TTS_VOICE, get_logger
+
+logger = get_logger()
+
+MAX_CONNECTIONS = 16  # 连接池中的最大连接数, 同时也是最大并发请求数
+KEEPALIVE_EXPIRY = 30.0  # 空闲 keep-alive 连接的保留时间 (秒)
+CONNECT_TIMEOUT = 5.0
+REQUEST_TIMEOUT = 30.0  # 单次合成请求的默认超时时间 (秒)
+
+
+class AsyncTTSClient:
+    """
+    原生异步的 TTS 客户端。
+
+    所有请求共享一个有上限的连接池, 不再占用默认线程池中的线程。`stream` 在响应体到达时
+    逐块产出音频, 调用方可以在整段音频合成完成前就开始转发; 完整音频会写入 `TTSCache`。
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        api_key: str,
+        voice: str = TTS_VOICE,
+        model: str = TTS_MODEL,
+        cache: TTSCache | None = None,
+        max_connections: int = MAX_CONNECTIONS,
+        timeout: float = REQUEST_TIMEOUT,
+    ):
+        self.endpoint = endpoint
+        self.voice = voice
+        self.model = model
+        self.cache = cache
+        self.timeout = timeout
+        self._client = httpx.AsyncClient(
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {api_key}",
+            },
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT),
+        )
+
+    async def _lookup(self, key: str) -> bytes | None:
+        if self.cache is None:
+            return None
+        # 内存层命中直接返回, 只有需要读磁盘时才切换到线程
+        audio = self.cache.peek(key)
+        if audio is not None:
+            return audio
+        return await asyncio.to_thread(self.cache.get, key)
+
+    async def stream(
+        self, text: str, timeout: float | None = None
+    ) -> AsyncIterator[bytes]:
+        """合成语音并在响应体到达时逐块产出, 失败时记录日志并停止产出。"""
+        key = TTSCache.make_key(text, self.voice, self.model)
+        cached = await self._lookup(key)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        try:
+            async with self._client.stream(
+                "POST",
+                self.endpoint,
+                json={"input": text, "voice": self.voice, "model": self.model},
+                timeout=httpx.Timeout(timeout or self.timeout, connect=CONNECT_TIMEOUT),
+            ) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    chunks.append(chunk)
+                    yield chunk
+        except httpx.HTTPError as e:
+            logger.error(f"Text-to-speech conversion failed. {e!r}")
+            return
+
+        if self.cache is not None and chunks:
+            await asyncio.to_thread(self.cache.put, key, b"".join(chunks))
+
+    async def synthesize(self, text: str, timeout: float | None = None) -> bytes | None:
+        """合成完整的一段音频, 失败时返回 None。"""
+        chunks = [chunk async for chunk in self.stream(text, timeout=timeout)]
+        return b"".join(chunks) or None
+
+    async def aclose(self):
+        await self._client.aclose()
@@ -1,7 +1,7 @@
 import os
 import re
+import unicodedata
 from dotenv import load_dotenv, find_dotenv
-from langchain_core.documents import Document
 import colorlog
 import logging
 
@@ -12,8 +12,28 @@ gemma3_270m = None
 zh_nlp = None
 en_nlp = None
 tts = None
+async_tts = None
+rerank_client = None
+rerank_cache = None
+tts_cache = None
+query_embedder = None
+answer_cache = None
+local_router = None
+router_cache = None
+narration_pack = None
 logger = None
 
+TTS_VOICE = "alloy"
+TTS_MODEL = "tts"
+
+
+def env_flag(name: str, default: bool) -> bool:
+    """读取布尔类型的环境变量开关, 例如 SPECULATIVE_RETRIEVAL=false。"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
 
 def get_gpt4o():
     global gpt4o
@@ -41,12 +61,24 @@ def get_gemma3_270m():
     return gemma3_270m
 
 
+def get_tts_cache():
+    global tts_cache
+    if tts_cache is None:
+        from src.tts_cache import TTSCache
+
+        tts_cache = TTSCache(cache_dir=os.getenv("TTS_CACHE_DIR", "tts_cache"))
+    return tts_cache
+
+
 def get_tts():
     logger = get_logger()
     global tts
     if tts is None:
         import requests
         import base64
+        from src.tts_cache import TTSCache
+
+        cache = get_tts_cache()
 
         api_key = os.getenv("AZURE_OPENAI_API_KEY")
         if not api_key:
@@ -62,6 +94,12 @@ def get_tts():
         )
 
         def convert_text_to_speech_base64(text: str) -> bytes | None:
+            # 相同的句子 (问候语、热门展品介绍等) 直接从缓存返回, 不访问网络
+            key = TTSCache.make_key(text, TTS_VOICE, TTS_MODEL)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
             endpoint = os.getenv("AZURE_OPENAI_TTS_ENDPOINT")
             if not endpoint:
                 raise ValueError(
@@ -72,13 +110,14 @@ def get_tts():
                     endpoint,
                     json={
                         "input": text,
-                        "voice": "alloy",
-                        "model": "tts",
+                        "voice": TTS_VOICE,
+                        "model": TTS_MODEL,
                     },
                 )
 
                 response.raise_for_status()
 
+                cache.put(key, response.content)
                 return response.content
             except requests.exceptions.RequestException as e:
                 logger.error(f"Text-to-speech conversion failed. {e}")
@@ -89,6 +128,111 @@ def get_tts():
     return tts
 
 
+def get_async_tts():
+    global async_tts
+    if async_tts is None:
+        from src.tts_client import AsyncTTSClient
+
+        api_key = os.getenv("AZURE_OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError(
+                "AZURE_OPENAI_API_KEY is not set in environment variables."
+            )
+        endpoint = os.getenv("AZURE_OPENAI_TTS_ENDPOINT")
+        if not endpoint:
+            raise ValueError(
+                "AZURE_OPENAI_TTS_ENDPOINT is not set in environment variables."
+            )
+        async_tts = AsyncTTSClient(
+            endpoint=endpoint, api_key=api_key, cache=get_tts_cache()
+        )
+    return async_tts
+
+
+def get_rerank_client():
+    global rerank_client
+    if rerank_client is None:
+        from src.rerank_client import RerankClient
+
+        api_key = os.getenv("SILICONFLOW_API_KEY")
+        if not api_key:
+            raise ValueError("SILICONFLOW_API_KEY is not set in environment variables.")
+        endpoint = os.getenv("SILICONFLOW_RERANK_ENDPOINT")
+        if not endpoint:
+            raise ValueError(
+                "SILICONFLOW_RERANK_ENDPOINT is not set in environment variables."
+            )
+        rerank_client = RerankClient(endpoint=endpoint, api_key=api_key)
+    return rerank_client
+
+
+def get_rerank_cache():
+    global rerank_cache
+    if rerank_cache is None:
+        from src.rerank_cache import RerankScoreCache
+
+        rerank_cache = RerankScoreCache()
+    return rerank_cache
+
+
+def get_query_embedder():
+    global query_embedder
+    if query_embedder is None:
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+        from src.embeddings import QueryEmbedder
+
+        # 与 setup.py 创建集合时使用的默认向量化函数保持一致
+        query_embedder = QueryEmbedder(DefaultEmbeddingFunction())
+    return query_embedder
+
+
+def get_answer_cache():
+    global answer_cache
+    if answer_cache is None:
+        from src.answer_cache import AnswerCache
+        from src.doc_store import read_version
+        from src.retrieval_graph import VERSION_PATH
+
+        # 复用查询向量的缓存和批处理; 语料重新导入后清空
+        answer_cache = AnswerCache(
+            embed=lambda query: get_query_embedder().embed(query),
+            version=lambda: read_version(VERSION_PATH),
+        )
+    return answer_cache
+
+
+def get_local_router():
+    global local_router
+    if local_router is None:
+        from src.local_router import LocalRouter
+
+        local_router = LocalRouter(
+            embed=lambda query: get_query_embedder().embed(query)
+        )
+    return local_router
+
+
+def get_router_cache():
+    global router_cache
+    if router_cache is None:
+        from src.router_cache import RouterCache
+
+        # 设置为空字符串时只使用内存层
+        router_cache = RouterCache(
+            path=os.getenv("ROUTER_CACHE_PATH", "chroma_db/router_cache.sqlite")
+        )
+    return router_cache
+
+
+def get_narration_pack():
+    global narration_pack
+    if narration_pack is None:
+        from src.narration_pack import NarrationPack
+
+        narration_pack = NarrationPack()
+    return narration_pack
+
+
 def get_zh_nlp():
     global zh_nlp
     if zh_nlp is None:
@@ -107,40 +251,97 @@ def get_en_nlp():
     return en_nlp
 
 
-def preprocess(text: str) -> list[str]:
-    en_nlp = get_en_nlp()
-    zh_nlp = get_zh_nlp()
+PREPROCESS_BATCH_SIZE = 256  # tokenizer.pipe 每批处理的片段数量
+IMAGE_LINK_PATTERN = re.compile(r"!\[.*?\]\(.*?\)")
+CHINESE_PATTERN = re.compile(r"[\u4e00-\u9fff·]+")
+ENGLISH_PATTERN = re.compile(r"\w+")
 
-    # remove image links
-    image_link_pattern = r"!\[.*?\]\(.*?\)"
-    text = re.sub(image_link_pattern, "", text)
 
-    chinese_pattern = r"[\u4e00-\u9fff·]+"
-    english_pattern = r"\w+"
+def preprocess(text: str, mode: str = "pipeline") -> list[str]:
+    """
+    中英文混合分词并去除停用词。
+
+    Args:
+        mode: "pipeline" 对每个片段调用完整的 spaCy 管线;
+              "batched" 只使用 tokenizer, 通过 `tokenizer.pipe` 批量处理所有片段, 结果与 "pipeline" 相同;
+              "lookup" 中文同 "batched", 英文单词直接查停用词表, 不经过 spaCy。
+    """
+    if mode not in ("pipeline", "batched", "lookup"):
+        raise ValueError(f"Unknown preprocess mode: {mode}")
+
+    # remove image links
+    text = IMAGE_LINK_PATTERN.sub("", text)
 
     text = text.lower()
     text = re.sub(r"\s+", " ", text)
 
+    chinese_matches = CHINESE_PATTERN.findall(text)
+    english_matches = ENGLISH_PATTERN.findall(text)
+
+    if mode == "pipeline":
+        en_nlp = get_en_nlp()
+        zh_nlp = get_zh_nlp()
+
+        tokens = []
+        for match in chinese_matches:
+            if len(match) <= 2:
+                tokens.append(match)
+            else:
+                doc = zh_nlp(match)
+                tokens.extend([token.text for token in doc if not token.is_stop])
+
+        for match in english_matches:
+            doc = en_nlp(match)
+            tokens.extend([token.text for token in doc if not token.is_stop])
+
+        return tokens
+
+    # 只有较长的中文片段需要分词, 一次性批量送入 tokenizer
+    long_matches = [match for match in chinese_matches if len(match) > 2]
+    zh_docs = iter(
+        get_zh_nlp().tokenizer.pipe(long_matches, batch_size=PREPROCESS_BATCH_SIZE)
+        if long_matches
+        else []
+    )
     tokens = []
-    for match in re.findall(chinese_pattern, text):
+    for match in chinese_matches:
         if len(match) <= 2:
             tokens.append(match)
         else:
-            doc = zh_nlp(match)
-            tokens.extend([token.text for token in doc if not token.is_stop])
+            tokens.extend([token.text for token in next(zh_docs) if not token.is_stop])
 
-    for match in re.findall(english_pattern, text):
-        doc = en_nlp(match)
-        tokens.extend([token.text for token in doc if not token.is_stop])
+    if mode == "lookup":
+        from spacy.lang.en.stop_words import STOP_WORDS
 
+        tokens.extend([match for match in english_matches if match not in STOP_WORDS])
+        return tokens
+
+    en_docs = get_en_nlp().tokenizer.pipe(
+        english_matches, batch_size=PREPROCESS_BATCH_SIZE
+    )
+    for doc in en_docs:
+        tokens.extend([token.text for token in doc if not token.is_stop])
     return tokens
 
 
-def format_docs(docs: list[Document]) -> str:
-    formatted = ""
-    for idx, doc in enumerate(docs):
-        formatted += f"DOC{idx + 1}: {doc.page_content}\n\n"
-    return formatted
+def normalize_text(text: str) -> str:
+    """统一全角/半角字符并折叠空白, 用于生成缓存键。"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def normalize_query(text: str) -> str:
+    """查询缓存键: 在 `normalize_text` 的基础上忽略大小写。"""
+    return normalize_text(text).lower()
+
+
+CJK_CHAR_PATTERN = re.compile(r"[\u3000-\u9fff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计 token 数: 中文字符各算一个, 其余按 4 个字符一个 token。"""
+    cjk = len(CJK_CHAR_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
 
 
 def get_logger():
@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+# 导入 src.chains 时会创建 Azure 客户端, 测试中使用占位配置, 不会发出真实请求
+os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-10-21")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1:9")
+os.environ.setdefault("AZURE_OPENAI_DEPLOYEMENT", "gpt-4o")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+
+
+@pytest.fixture(autouse=True)
+def router_cache(monkeypatch):
+    """每个测试使用独立的纯内存路由缓存, 不读写 chroma_db。"""
+    from src import utils
+    from src.router_cache import RouterCache
+
+    cache = RouterCache(path=None)
+    monkeypatch.setattr(utils, "router_cache", cache)
+    return cache
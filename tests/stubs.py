@@ -0,0 +1,137 @@
+"""测试用的本地桩服务 - 在后台线程中运行 FastAPI 应用, 模拟外部 HTTP 服务"""
+
+import asyncio
+import json
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def serve(app: FastAPI):
+    """在后台线程中启动应用, 返回其 base url。"""
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def create_tts_app(
+    num_chunks: int = 4, chunk_delay: float = 0.05, slow_delay: float = 1.0
+) -> FastAPI:
+    """
+    模拟 OpenAI 兼容的 TTS 接口: 音频分 `num_chunks` 块返回, 每块之间间隔 `chunk_delay` 秒。
+    输入文本以 "slow" 开头时先等待 `slow_delay` 秒, 用于测试超时。
+    """
+    app = FastAPI()
+    app.state.requests = []  # (输入文本, 客户端端口)
+
+    @app.post("/tts")
+    async def tts(request: Request):
+        body = await request.json()
+        text = body["input"]
+        app.state.requests.append((text, request.client.port))  # type: ignore
+
+        async def audio():
+            if text.startswith("slow"):
+                await asyncio.sleep(slow_delay)
+            for idx in range(num_chunks):
+                yield f"{text}:{idx};".encode()
+                await asyncio.sleep(chunk_delay)
+
+        return StreamingResponse(audio(), media_type="audio/mpeg")
+
+    return app
+
+
+def create_rerank_app(delay: float = 0.0) -> FastAPI:
+    """
+    模拟 SiliconFlow 的 rerank 接口: 分数为查询词在文档中出现的比例, 结果按分数从高到低返回。
+    `app.state.delays` 中的值依次作为每个请求的响应延迟 (秒), 用于测试截止时间和对冲请求;
+    用完后每个请求等待 `delay` 秒。
+    """
+    app = FastAPI()
+    app.state.requests = []  # 每个请求的 (查询, 文档数量)
+    app.state.delays = []
+
+    @app.post("/rerank")
+    async def rerank(request: Request):
+        body = await request.json()
+        app.state.requests.append((body["query"], len(body["documents"])))
+        await asyncio.sleep(app.state.delays.pop(0) if app.state.delays else delay)
+
+        words = body["query"].lower().split()
+        results = [
+            {
+                "index": idx,
+                "relevance_score": sum(w in doc.lower() for w in words) / len(words),
+            }
+            for idx, doc in enumerate(body["documents"])
+        ]
+        results.sort(key=lambda r: r["relevance_score"], reverse=True)
+        return {"results": results}
+
+    return app
+
+
+def create_ollama_app(
+    reply: str = "Hello from the local model.", need_rag: bool = False
+) -> FastAPI:
+    """
+    模拟 Ollama 的 /api/chat 接口, 以 NDJSON 流式返回 `reply` 的各个词。
+    请求带有 `format` (结构化输出) 时返回符合 QueryRouting 的 JSON, `need_rag` 为给定值。
+    """
+    app = FastAPI()
+    app.state.requests = []  # 每个请求的模型名
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        app.state.requests.append(body["model"])
+        if body.get("format"):
+            content = json.dumps({"need_rag": need_rag, "reason": "stub"})
+            pieces = [content]
+        else:
+            pieces = [word + " " for word in reply.split()]
+
+        def line(content: str, done: bool) -> bytes:
+            message = {
+                "model": body["model"],
+                "created_at": "2025-01-01T00:00:00Z",
+                "message": {"role": "assistant", "content": content},
+                "done": done,
+            }
+            if done:
+                message.update(done_reason="stop", prompt_eval_count=1, eval_count=1)
+            return (json.dumps(message) + "\n").encode()
+
+        async def stream():
+            for piece in pieces:
+                yield line(piece, False)
+            yield line("", True)
+
+        if body.get("stream", True):
+            return StreamingResponse(stream(), media_type="application/x-ndjson")
+        return json.loads(line("".join(pieces), True))
+
+    return app
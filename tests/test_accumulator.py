@@ -1,7 +1,10 @@
 import asyncio
+import threading
+import time
 from unittest.mock import MagicMock
 import pytest
 from src.accumulator import AudioAccumulator
+from src.segmenter import SegmentationPolicy
 
 
 @pytest.mark.asyncio
@@ -154,3 +157,207 @@ async def test_one_image_one_sentence():
     await accumulator.add_chunk("//example.com/image.png)\n\n这是图片后的文本。 ")
     await asyncio.sleep(0.01)
     mock_tts_function.assert_called_with("\n\n这是图片后的文本。 ")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_tts_keeps_audio_order():
+    """
+    测试：多个段落并发合成时，音频仍按文本顺序放入队列，且并发数不超过上限。
+    """
+    # 1. 设置
+    lock = threading.Lock()
+    active = 0
+    max_active = 0
+
+    def slow_tts_function(text: str) -> bytes:
+        nonlocal active, max_active
+        with lock:
+            active += 1
+            max_active = max(max_active, active)
+        # 越靠前的段落合成越慢，迫使后面的段落先完成
+        time.sleep(0.05 if text.startswith("第一") else 0.01)
+        with lock:
+            active -= 1
+        return text.encode()
+
+    accumulator = AudioAccumulator(
+        tts_function=slow_tts_function, num_sentence_cached=1, max_concurrency=2
+    )
+
+    # 2. 执行
+    for sentence in ["第一句。 ", "第二句。 ", "第三句。 ", "第四句。 "]:
+        start = time.perf_counter()
+        await accumulator.add_chunk(sentence)
+        # 文本不应等待音频合成
+        assert time.perf_counter() - start < 0.01
+    await accumulator.flush()
+
+    # 3. 验证
+    audio = [chunk async for chunk in accumulator]
+    assert audio == [
+        s.encode() for s in ["第一句。 ", "第二句。 ", "第三句。 ", "第四句。 "]
+    ]
+    assert max_active == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_segment_does_not_block_following_audio():
+    """
+    测试：某一段TTS失败时，后续段落的音频仍能按顺序交付。
+    """
+
+    def flaky_tts_function(text: str) -> bytes:
+        if text.startswith("坏"):
+            raise RuntimeError("TTS failed")
+        return text.encode()
+
+    accumulator = AudioAccumulator(
+        tts_function=flaky_tts_function, num_sentence_cached=1
+    )
+
+    await accumulator.add_chunk("坏句子。 ")
+    await accumulator.add_chunk("好句子。 ")
+    await accumulator.flush()
+
+    assert [chunk async for chunk in accumulator] == ["好句子。 ".encode()]
+
+
+@pytest.mark.asyncio
+async def test_policy_segments_and_time_to_first_audio():
+    """
+    测试：使用分段策略时，第一段在首个分句处合成，并记录首段音频延迟。
+    """
+    mock_tts_function = MagicMock(side_effect=lambda text: text.encode())
+    accumulator = AudioAccumulator(
+        tts_function=mock_tts_function,
+        policy=SegmentationPolicy(first_segment_chars=4, max_segment_chars=100),
+    )
+
+    await accumulator.add_chunk("這件瓷碗，來自清代。 ")
+    await asyncio.sleep(0.01)
+    mock_tts_function.assert_called_once_with("這件瓷碗，")
+    assert accumulator.time_to_first_audio is not None
+
+    await accumulator.flush()
+    assert [chunk async for chunk in accumulator] == [
+        "這件瓷碗，".encode(),
+        "來自清代。 ".encode(),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cancel_stops_tts_and_drops_audio():
+    """
+    测试：取消后进行中的 TTS 被中止, 已排队的音频被丢弃, reset 后可以开始新的回答。
+    """
+    started = []
+
+    async def slow_tts(text):
+        started.append(text)
+        if text.startswith("Slow"):
+            await asyncio.sleep(10)
+        return text.encode()
+
+    accumulator = AudioAccumulator(
+        tts_function=slow_tts, num_sentence_cached=1, max_concurrency=1
+    )
+    await accumulator.add_chunk("Fast one. ")
+    await accumulator.add_chunk("Slow two. ")
+    await accumulator.add_chunk("Never started. ")
+    await accumulator.add_chunk("Still in the buffer")
+    await asyncio.sleep(0.01)
+
+    seconds_saved = await accumulator.cancel()
+
+    assert started == ["Fast one. ", "Slow two. "]
+    assert seconds_saved > 0
+    assert [chunk async for chunk in accumulator] == []
+
+    accumulator.reset()
+    await accumulator.add_chunk("Fast again.")
+    await accumulator.flush()
+    assert [chunk async for chunk in accumulator] == [b"Fast again."]
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_pauses_synthesis_at_memory_limit():
+    async def streaming_tts(text):
+        for idx in range(10):
+            await asyncio.sleep(0)
+            yield f"{text[0]}{idx}".encode().ljust(100, b".")
+
+    accumulator = AudioAccumulator(
+        tts_function=streaming_tts,
+        num_sentence_cached=1,
+        max_concurrency=3,
+        max_buffered_bytes=250,
+    )
+    for sentence in ("A. ", "B. ", "C. "):
+        await accumulator.add_chunk(sentence)
+    flush = asyncio.create_task(accumulator.flush())
+
+    received = []
+    async for chunk in accumulator:
+        received.append(chunk[:2])
+        await asyncio.sleep(0.001)  # 客户端很慢
+    await flush
+
+    # 每段 10 块 x 100 字节, 共 3000 字节; 缓冲区最多超出上限几个音频块
+    assert accumulator.peak_buffered_bytes <= 250 + 3 * 100
+    assert received == [f"{s}{i}".encode() for s in "ABC" for i in range(10)]
+
+
+@pytest.mark.asyncio
+async def test_mute_stops_synthesis_for_rest_of_answer():
+    started = []
+
+    async def slow_tts(text):
+        started.append(text)
+        await asyncio.sleep(10)
+        return text.encode()
+
+    accumulator = AudioAccumulator(tts_function=slow_tts, num_sentence_cached=1)
+    await accumulator.add_chunk("First. ")
+    await asyncio.sleep(0.01)
+
+    await accumulator.mute()
+    await accumulator.add_chunk("Second. ")
+    await accumulator.flush()
+
+    assert started == ["First. "]
+    assert [chunk async for chunk in accumulator] == []
+
+
+@pytest.mark.asyncio
+async def test_mute_during_flush_still_ends_iteration():
+    async def slow_tts(text):
+        await asyncio.sleep(10)
+        return text.encode()
+
+    accumulator = AudioAccumulator(tts_function=slow_tts, num_sentence_cached=1)
+    await accumulator.add_chunk("First. ")
+    flush = asyncio.create_task(accumulator.flush())
+    await asyncio.sleep(0.01)  # flush 正在等待 TTS 任务
+
+    await accumulator.mute()
+
+    await asyncio.wait_for(flush, 1)
+    chunks = asyncio.wait_for(_collect(accumulator), 1)
+    assert await chunks == []
+
+
+@pytest.mark.asyncio
+async def test_mute_after_flush_keeps_end_signal():
+    accumulator = AudioAccumulator(
+        tts_function=lambda text: text.encode(), num_sentence_cached=1
+    )
+    await accumulator.add_chunk("First. ")
+    await accumulator.flush()  # 音频和结束信号都已入队
+
+    await accumulator.mute()
+
+    assert await asyncio.wait_for(_collect(accumulator), 1) == []
+
+
+async def _collect(accumulator: AudioAccumulator) -> list[bytes]:
+    return [chunk async for chunk in accumulator]
@@ -0,0 +1,85 @@
+import pytest
+
+from src import answer_cache as answer_cache_module
+from src.answer_cache import AnswerCache
+
+FRAMES = [{"event": "message", "data": {"chunk": "Bronze."}}, b"audio-1", b"audio-2"]
+
+VECTORS = {
+    "what is this bowl made of?": [1.0, 0.0, 0.0],
+    "what material is this bowl?": [0.99, 0.1, 0.0],
+    "who painted this scroll?": [0.0, 1.0, 0.0],
+}
+
+
+async def fake_embed(query: str):
+    return VECTORS[query.lower()]
+
+
+@pytest.mark.asyncio
+async def test_exact_hit_ignores_case_and_whitespace():
+    cache = AnswerCache()
+    await cache.store("What is this bowl made of?", None, FRAMES)
+
+    assert await cache.lookup("  what is this  bowl made of? ", None) == FRAMES
+
+
+@pytest.mark.asyncio
+async def test_semantic_hit_within_threshold():
+    cache = AnswerCache(embed=fake_embed, similarity_threshold=0.95)
+    await cache.store("What is this bowl made of?", None, FRAMES)
+
+    assert await cache.lookup("What material is this bowl?", None) == FRAMES
+    assert await cache.lookup("Who painted this scroll?", None) is None
+
+
+@pytest.mark.asyncio
+async def test_entries_are_scoped_by_doc_id():
+    cache = AnswerCache(embed=fake_embed)
+    await cache.store("What is this bowl made of?", "doc-1", FRAMES)
+
+    assert await cache.lookup("What is this bowl made of?", "doc-2") is None
+    assert await cache.lookup("What material is this bowl?", "doc-2") is None
+    assert await cache.lookup("What is this bowl made of?", "doc-1") == FRAMES
+
+
+@pytest.mark.asyncio
+async def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache_module.time, "monotonic", lambda: now[0])
+    cache = AnswerCache(ttl=60)
+    await cache.store("What is this bowl made of?", None, FRAMES)
+
+    now[0] += 61
+    assert await cache.lookup("What is this bowl made of?", None) is None
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_evicts_least_recently_used_by_size():
+    cache = AnswerCache(max_bytes=250)
+    await cache.store("first", None, [b"a" * 100])
+    await cache.store("second", None, [b"b" * 100])
+    # 访问 first 后, second 成为最久未使用的条目
+    assert await cache.lookup("first", None) is not None
+    await cache.store("third", None, [b"c" * 100])
+
+    assert await cache.lookup("second", None) is None
+    assert await cache.lookup("first", None) is not None
+    assert await cache.lookup("third", None) is not None
+
+    # 超过总大小上限的回答不缓存
+    await cache.store("huge", None, [b"d" * 300])
+    assert await cache.lookup("huge", None) is None
+
+
+@pytest.mark.asyncio
+async def test_corpus_version_change_clears_entries():
+    version = [1]
+    cache = AnswerCache(version=lambda: version[0])
+    await cache.store("What is this bowl made of?", None, FRAMES)
+    assert await cache.lookup("What is this bowl made of?", None) == FRAMES
+
+    version[0] = 2  # 重新导入语料
+    assert await cache.lookup("What is this bowl made of?", None) is None
+    assert len(cache) == 0
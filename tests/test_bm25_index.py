@@ -0,0 +1,40 @@
+from src.bm25_index import IDENTIFIER_PATTERN, BM25Index, reciprocal_rank_fusion
+
+
+def simple_tokenizer(text: str) -> list[str]:
+    return text.lower().split()
+
+
+def test_identifier_pattern_keeps_accession_numbers():
+    text = "Porcelain with overglaze enamels, 8.6 x 19 cm HKU.C.1972.0432"
+
+    assert IDENTIFIER_PATTERN.findall(text) == ["HKU.C.1972.0432"]
+
+
+def test_search_ranks_exact_matches_first(tmp_path):
+    """
+    测试：索引保存后重新加载，精确的编号能命中对应文档，未命中的文档不返回。
+    """
+    index = BM25Index.build(
+        ["bowl", "plate", "vase"],
+        [
+            "bowl with cranes hku.c.1972.0432",
+            "plate with qilin hku.c.1953.0011",
+            "rouleau vase",
+        ],
+        tokenizer=simple_tokenizer,
+    )
+    index.save(tmp_path / "bm25.json")
+    index = BM25Index.load(tmp_path / "bm25.json", tokenizer=simple_tokenizer)
+
+    hits = index.search("hku.c.1972.0432", n_results=3)
+
+    assert [doc_id for doc_id, _ in hits] == ["bowl"]
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]])
+
+    # c 在两路中都出现，排名最高
+    assert fused[0] == "c"
+    assert set(fused) == {"a", "b", "c", "d"}
@@ -0,0 +1,102 @@
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from langchain_ollama import ChatOllama
+
+from src import chains, metrics
+from tests.stubs import create_ollama_app, serve
+
+
+@pytest.fixture
+def ollama():
+    with serve(create_ollama_app(need_rag=True)) as base_url:
+        yield base_url
+
+
+@pytest.fixture
+def tiers(monkeypatch, ollama):
+    monkeypatch.setattr(
+        chains.local, "llm", ChatOllama(model="gemma3:270m", base_url=ollama)
+    )
+    monkeypatch.setattr(
+        chains.remote, "llm", FakeListChatModel(responses=["Hello from Azure."])
+    )
+    monkeypatch.setattr(chains.remote, "_latencies", {})
+
+
+@pytest.mark.asyncio
+async def test_router_runs_on_local_tier(tiers):
+    calls = metrics.counter("llm.local.query_router.calls").value
+
+    routing = await chains.query_router.ainvoke({"query": "What is this bowl?"})
+
+    assert routing.need_rag is True
+    assert metrics.counter("llm.local.query_router.calls").value == calls + 1
+    assert metrics.histogram("llm.local.query_router.latency").count > 0
+
+
+class StructuredFakeModel(FakeListChatModel):
+    """把回复解析为结构化输出的假模型。"""
+
+    def with_structured_output(self, schema, **kwargs):
+        return self | (lambda message: schema.model_validate_json(message.content))
+
+
+@pytest.mark.asyncio
+async def test_router_falls_back_to_remote(monkeypatch, tiers):
+    unreachable = ChatOllama(model="gemma3:270m", base_url="http://127.0.0.1:9")
+    remote = StructuredFakeModel(responses=['{"need_rag": false, "reason": "chat"}'])
+    monkeypatch.setattr(chains.local, "llm", unreachable)
+    monkeypatch.setattr(chains.remote, "llm", remote)
+    errors = metrics.counter("llm.local.errors").value
+
+    routing = await chains.query_router.ainvoke({"query": "hi"})
+
+    assert routing.need_rag is False
+    assert metrics.counter("llm.local.errors").value == errors + 1
+
+
+@pytest.mark.asyncio
+async def test_direct_generator_uses_remote_when_healthy(tiers):
+    response = await chains.direct_generator.ainvoke({"query": "hi"})
+    assert response.content == "Hello from Azure."
+
+
+@pytest.mark.asyncio
+async def test_direct_generator_degrades_on_concurrency(monkeypatch, tiers):
+    monkeypatch.setattr(chains, "DEGRADE_CONCURRENCY", 2)
+    monkeypatch.setattr(chains.remote, "in_flight", 2)
+    degraded = metrics.counter("llm.degraded").value
+
+    chunks = [
+        chunk.content
+        async for chunk in chains.direct_generator.astream({"query": "hi"})
+    ]
+
+    assert "".join(chunks).strip() == "Hello from the local model."
+    assert len(chunks) > 1
+    assert metrics.counter("llm.degraded").value == degraded + 1
+
+
+@pytest.mark.asyncio
+async def test_direct_generator_degrades_on_latency(monkeypatch, tiers):
+    monkeypatch.setattr(chains, "DEGRADE_LATENCY", 0.0)
+    await chains.direct_generator.ainvoke({"query": "hi"})  # 记录一次 Azure 的延迟
+
+    response = await chains.direct_generator.ainvoke({"query": "hi"})
+
+    assert response.content.strip() == "Hello from the local model."
+
+
+@pytest.mark.asyncio
+async def test_long_healthy_stream_does_not_degrade(monkeypatch, tiers):
+    monkeypatch.setattr(chains, "DEGRADE_LATENCY", 0.2)
+    # 首 token 很快, 但整个回答需要约 0.5 秒
+    slow = FakeListChatModel(responses=["a" * 50], sleep=0.01)
+    monkeypatch.setattr(chains.remote, "llm", slow)
+
+    for _ in range(2):
+        chunks = [c async for c in chains.direct_generator.astream({"query": "hi"})]
+        assert "".join(c.content for c in chunks) == "a" * 50
+
+    assert not chains.remote.overloaded("direct_generator")
+    assert metrics.histogram("llm.remote.direct_generator.ttft").count >= 2
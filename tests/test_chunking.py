@@ -0,0 +1,79 @@
+import re
+
+from langchain_core.documents import Document
+
+from src.chunking import (
+    CHUNK_SEPARATOR,
+    SPAN_SEPARATOR,
+    chunk_document,
+    expand_to_parents,
+    split_chunks,
+)
+
+ESSAY = "\n\n".join(
+    [
+        "# Chinese porcelain in Europe and Asia  ",
+        "The word porcelain originated with Marco Polo. " * 10,
+        "The first Chinese porcelains arrived in Europe in the fourteenth century. "
+        * 12,
+        "## Export porcelain",
+        "Jingdezhen responded to demand in Europe. " * 5,
+        "歐洲瓷廠的業務非常成功，使歐洲對中國瓷器的需求逐漸減少。" * 20,
+    ]
+)
+
+
+def test_chunks_respect_sections_and_size():
+    chunks = split_chunks(ESSAY, max_chars=400, min_chars=100)
+
+    assert chunks[0].text.startswith("# Chinese porcelain")
+    assert {chunk.section for chunk in chunks} == {
+        "Chinese porcelain in Europe and Asia",
+        "Export porcelain",
+    }
+    # 片段不跨越章节
+    export = [c for c in chunks if c.section == "Export porcelain"]
+    assert export[0].text.startswith("## Export porcelain")
+    assert all(len(chunk.text) <= 500 for chunk in chunks)
+
+    # 拼接全部片段可以还原原文
+    joined = CHUNK_SEPARATOR.join(chunk.text for chunk in chunks)
+    assert re.sub(r"\s+", "", joined) == re.sub(r"\s+", "", ESSAY)
+
+
+def test_chunk_document_carries_parent_id():
+    ids, documents, metadatas = chunk_document(
+        "essay", ESSAY, {"name": "Chinese porcelain in Europe and Asia"}
+    )
+
+    assert ids[0] == "essay#0"
+    assert len(ids) == len(documents) == len(metadatas) > 1
+    assert all(m["parent_id"] == "essay" for m in metadatas)
+    assert [m["chunk_index"] for m in metadatas] == list(range(len(ids)))
+
+
+def test_expand_to_parents_keeps_only_selected_spans():
+    def chunk(parent_id, index, text, score):
+        return Document(
+            id=f"{parent_id}#{index}",
+            page_content=text,
+            metadata={
+                "parent_id": parent_id,
+                "chunk_index": index,
+                "name": parent_id,
+                "rerank_score": score,
+            },
+        )
+
+    ranked = [
+        chunk("essay", 3, "D", 0.9),
+        chunk("bowl", 0, "# Bowl", 0.8),
+        chunk("essay", 0, "A", 0.7),
+        chunk("essay", 1, "B", 0.6),
+    ]
+    parents = expand_to_parents(ranked)
+
+    assert [doc.id for doc in parents] == ["essay", "bowl"]
+    assert parents[0].page_content == "A" + CHUNK_SEPARATOR + "B" + SPAN_SEPARATOR + "D"
+    assert parents[0].metadata["rerank_score"] == 0.9
+    assert "chunk_index" not in parents[0].metadata
@@ -0,0 +1,48 @@
+from langchain_core.documents import Document
+
+from src.context_packer import pack_context
+from src.utils import estimate_tokens
+
+
+def make_doc(doc_id: str, score: float, paragraphs: list[str]) -> Document:
+    return Document(
+        id=doc_id,
+        page_content="\n\n".join(paragraphs),
+        metadata={"rerank_score": score},
+    )
+
+
+def test_fills_budget_by_score_and_trims_tail():
+    paragraph = "porcelain " * 40  # 约 100 tokens
+    docs = [
+        make_doc("vase", 0.2, [f"Vase. {paragraph}"] * 3),
+        make_doc("bowl", 0.9, [f"Bowl. {paragraph}"] * 3),
+        make_doc("plate", 0.5, [f"Plate. {paragraph}"] * 3),
+    ]
+
+    packed = pack_context(docs, budget=450)
+
+    # 最高分的文档完整保留, 第二篇只保留开头的段落, 最低分的文档被舍弃
+    assert packed.doc_ids == ["bowl", "plate"]
+    assert packed.text.count("Bowl.") == 3
+    assert packed.text.count("Plate.") == 1
+    assert "Vase." not in packed.text
+    assert packed.tokens <= 450
+    assert packed.tokens_saved == packed.original_tokens - packed.tokens > 0
+
+
+def test_output_order_is_independent_of_scores():
+    docs = [make_doc("bowl", 0.9, ["# Bowl"]), make_doc("plate", 0.5, ["# Plate"])]
+    swapped = [make_doc("bowl", 0.4, ["# Bowl"]), make_doc("plate", 0.8, ["# Plate"])]
+
+    assert pack_context(docs).text == pack_context(list(reversed(swapped))).text
+    assert pack_context(docs).text == "DOC1: # Bowl\n\nDOC2: # Plate\n\n"
+
+
+def test_strips_image_links_and_truncates_long_first_paragraph():
+    doc = make_doc("essay", 1.0, ["![](objectifying_china/11_1.jpeg)", "瓷器" * 500])
+
+    packed = pack_context([doc], budget=100)
+
+    assert "![](" not in packed.text
+    assert 0 < estimate_tokens(packed.text) <= 110
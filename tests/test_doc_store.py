@@ -0,0 +1,108 @@
+import os
+
+import chromadb
+import pytest
+
+from src import retrieval_graph
+from src.bm25_index import BM25Index
+from src.doc_store import DocumentStore, read_version, write_version
+
+
+@pytest.fixture
+def collection():
+    client = chromadb.EphemeralClient()
+    collection = client.get_or_create_collection("test_doc_store")
+    collection.upsert(
+        ids=["bowl", "vase"],
+        documents=["# Bowl", "# Vase"],
+        metadatas=[{"name": "Bowl"}, {"name": "Vase"}],
+        embeddings=[[0.0, 1.0], [1.0, 0.0]],
+    )
+    yield collection
+    client.delete_collection("test_doc_store")
+
+
+def test_lookup_returns_independent_copies(collection):
+    store = DocumentStore.from_collection(collection, version=None)
+
+    doc = store.get("bowl")
+    assert doc is not None and doc.page_content == "# Bowl"
+    doc.metadata["rerank_score"] = 0.9
+
+    assert "rerank_score" not in store.get("bowl").metadata  # type: ignore
+    assert store.get("missing") is None
+    assert [d.id for d in store.get_many(["vase", "missing", "bowl"])] == [
+        "vase",
+        "bowl",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_retrieve_by_id_reloads_when_version_changes(
+    collection, tmp_path, monkeypatch
+):
+    """
+    测试：setup.py 写入新的版本戳后，文档索引会重新加载。
+    """
+    version_path = tmp_path / "VERSION"
+    write_version(version_path)
+    monkeypatch.setattr(retrieval_graph, "VERSION_PATH", version_path)
+    monkeypatch.setattr(retrieval_graph, "VERSION_CHECK_INTERVAL", 0.0)
+    monkeypatch.setattr(retrieval_graph, "_client", object())
+    monkeypatch.setattr(retrieval_graph, "_collection", collection)
+    monkeypatch.setattr(
+        retrieval_graph,
+        "_doc_store",
+        DocumentStore.from_collection(collection, read_version(version_path)),
+    )
+
+    collection.upsert(ids=["plate"], documents=["# Plate"], embeddings=[[1.0, 1.0]])
+    assert await retrieval_graph._retrieve_by_id("plate") == []
+
+    # 保证修改时间一定不同
+    stat = os.stat(version_path)
+    os.utime(version_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    docs = await retrieval_graph._retrieve_by_id("plate")
+
+    assert [doc.page_content for doc in docs] == ["# Plate"]
+
+
+def test_get_parent_joins_chunks_in_order():
+    store = DocumentStore(
+        {
+            "essay#1": ("Second paragraph.", {"parent_id": "essay", "chunk_index": 1}),
+            "essay#0": ("# Essay", {"parent_id": "essay", "chunk_index": 0}),
+            "bowl": ("# Bowl", {"name": "Bowl"}),
+        },
+        version=None,
+    )
+
+    essay = store.get_parent("essay")
+    assert essay is not None
+    assert essay.page_content == "# Essay\n\nSecond paragraph."
+    assert "parent_id" not in essay.metadata
+    assert store.get_parent("bowl").page_content == "# Bowl"  # type: ignore
+    assert store.get_parent("essay#0") is None
+
+
+@pytest.mark.asyncio
+async def test_bm25_index_reloads_when_version_changes(tmp_path, monkeypatch):
+    version_path = tmp_path / "VERSION"
+    index_path = tmp_path / "bm25_index.json"
+    write_version(version_path)
+    BM25Index(["bowl"], [["bowl"]]).save(index_path)
+    monkeypatch.setattr(retrieval_graph, "VERSION_PATH", version_path)
+    monkeypatch.setattr(retrieval_graph, "BM25_INDEX_PATH", str(index_path))
+    monkeypatch.setattr(retrieval_graph, "VERSION_CHECK_INTERVAL", 0.0)
+    monkeypatch.setattr(retrieval_graph, "_doc_store", None)
+    monkeypatch.setattr(retrieval_graph, "_bm25_index", None)
+    monkeypatch.setattr(retrieval_graph, "_bm25_version", None)
+
+    assert (await retrieval_graph._init_bm25()).ids == ["bowl"]  # type: ignore
+
+    # 文档索引尚未加载时, 重新导入语料同样会让 BM25 索引重新加载
+    BM25Index(["plate"], [["plate"]]).save(index_path)
+    stat = os.stat(version_path)
+    os.utime(version_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert (await retrieval_graph._init_bm25()).ids == ["plate"]  # type: ignore
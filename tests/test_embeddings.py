@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from src import metrics
+from src.batching import MicroBatcher
+from src.embeddings import QueryEmbedder
+
+
+class FakeEmbeddingFunction:
+    def __init__(self):
+        self.calls: list[list[str]] = []
+
+    def __call__(self, texts: list[str]) -> list[list[float]]:
+        self.calls.append(texts)
+        return [[float(len(text))] for text in texts]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_share_one_embedding_call():
+    """
+    测试：同一时间窗口内到达的查询合并成一次向量化调用，结果按调用方分发。
+    """
+    embedding_function = FakeEmbeddingFunction()
+    embedder = QueryEmbedder(embedding_function, max_wait=0.01)
+
+    results = await asyncio.gather(
+        embedder.embed("a"), embedder.embed("bb"), embedder.embed("ccc")
+    )
+
+    assert results == [[1.0], [2.0], [3.0]]
+    assert embedding_function.calls == [["a", "bb", "ccc"]]
+
+
+@pytest.mark.asyncio
+async def test_normalized_query_hits_cache():
+    embedding_function = FakeEmbeddingFunction()
+    embedder = QueryEmbedder(embedding_function, max_wait=0)
+
+    first = await embedder.embed("What is this bowl made of?")
+    second = await embedder.embed("  what is this BOWL made of？")
+
+    assert first == second
+    assert embedding_function.calls == [["what is this bowl made of?"]]
+
+
+@pytest.mark.asyncio
+async def test_batcher_flushes_when_full_and_propagates_errors():
+    calls = []
+
+    async def batch_fn(items):
+        calls.append(items)
+        if "bad" in items:
+            raise RuntimeError("batch failed")
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=2, max_wait=10)
+
+    assert await asyncio.gather(batcher.submit("a"), batcher.submit("b")) == ["A", "B"]
+    with pytest.raises(RuntimeError):
+        await asyncio.gather(batcher.submit("bad"), batcher.submit("c"))
+    assert calls == [["a", "b"], ["bad", "c"]]
+
+
+@pytest.mark.asyncio
+async def test_batcher_delivers_per_item_errors_and_records_metrics():
+    async def batch_fn(items):
+        return [ValueError(item) if item == "bad" else item for item in items]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=3, max_wait=10, name="test")
+    results = await asyncio.gather(
+        batcher.submit("a"),
+        batcher.submit("bad"),
+        batcher.submit("c"),
+        return_exceptions=True,
+    )
+
+    assert results[0] == "a" and results[2] == "c"
+    assert isinstance(results[1], ValueError)
+    histograms = metrics.snapshot()["histograms"]
+    assert histograms["batch.test.size"]["p50"] == 3
+    assert histograms["batch.test.queue_depth"]["count"] >= 3
@@ -0,0 +1,132 @@
+import asyncio
+
+import numpy as np
+import pytest
+from langchain_core.messages import HumanMessage
+
+from src import local_router, metrics, nodes
+from src.local_router import LocalRouter, match_rules
+from src.models import QueryRouting
+
+VECTORS = {
+    "what is this bowl made of": [1.0, 0.0, 0.0],
+    "what is this vase made of": [0.98, 0.2, 0.0],
+    "who painted this plate": [0.95, 0.3, 0.0],
+    "tell me a joke": [0.0, 0.0, 1.0],
+    "tell me another joke": [0.1, 0.0, 0.99],
+}
+
+
+async def fake_embed(query):
+    return np.array(VECTORS[query])
+
+
+class CountingRouter:
+    def __init__(self, need_rag: bool):
+        self.need_rag = need_rag
+        self.calls = 0
+
+    async def ainvoke(self, _):
+        self.calls += 1
+        return QueryRouting(need_rag=self.need_rag, reason="test")
+
+
+def test_rules():
+    assert match_rules("Hello!") is False
+    assert match_rules("謝謝") is False
+    assert match_rules("what is 12 * (3 + 4)?") is False
+    assert match_rules("Tell me about PR.00001.1") is True
+    assert match_rules("what is this bowl made of") is None
+
+
+@pytest.mark.asyncio
+async def test_knn_votes_with_learned_decisions(monkeypatch):
+    monkeypatch.setattr(local_router, "NUM_NEIGHBORS", 2)
+    router = LocalRouter(fake_embed, path=None)
+
+    decision = await router.route("what is this vase made of")
+    assert decision.need_rag is None and not decision.confident
+
+    await router.record("what is this bowl made of", True)
+    await router.record("who painted this plate", True)
+    await router.record("tell me a joke", False)
+
+    decision = await router.route("what is this vase made of")
+    assert decision.need_rag is True and decision.source == "knn"
+    assert decision.confident
+
+    # 只有一个近邻时置信度不足, 交给 LLM 路由
+    decision = await router.route("tell me another joke")
+    assert decision.need_rag is False and not decision.confident
+
+
+@pytest.mark.asyncio
+async def test_examples_persist(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_router, "SAVE_EVERY", 1)
+    path = tmp_path / "router_examples.npz"
+    router = LocalRouter(fake_embed, path=path)
+    await router.record("tell me a joke", False)
+    # 写文件在后台进行, 路由请求不等待
+    assert router._saving is not None and not router._saving.done()
+    await router._saving
+
+    reloaded = LocalRouter(fake_embed, path=path)
+    assert len(reloaded) == 1
+    assert reloaded._vote(np.array([0.0, 0.0, 1.0]))[0] is False
+
+
+@pytest.mark.asyncio
+async def test_saved_examples_stay_aligned_under_concurrent_records(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(local_router, "SAVE_EVERY", 3)
+    monkeypatch.setattr(local_router, "MAX_EXAMPLES", 8)
+    path = tmp_path / "router_examples.npz"
+    router = LocalRouter(fake_embed, path=path)
+    queries = list(VECTORS) * 8
+
+    # 写文件的线程运行时, 事件循环继续追加和裁剪样本
+    await asyncio.gather(
+        *(router.record(q, "joke" not in q, np.array(VECTORS[q])) for q in queries)
+    )
+    await router._saving
+
+    reloaded = LocalRouter(fake_embed, path=path)
+    assert 0 < len(reloaded) <= 8
+    for query, label, embedding in zip(
+        reloaded._queries, reloaded._labels, reloaded._embeddings
+    ):
+        assert label == ("joke" not in query)
+        assert np.allclose(embedding, VECTORS[query])
+
+
+@pytest.mark.asyncio
+async def test_router_node_skips_llm_when_confident(monkeypatch):
+    monkeypatch.setattr(local_router, "NUM_NEIGHBORS", 1)
+    router = LocalRouter(fake_embed, path=None, audit_rate=0.0)
+    llm = CountingRouter(need_rag=True)
+    monkeypatch.setattr(nodes, "LOCAL_ROUTER", True)
+    monkeypatch.setattr(nodes, "SPECULATIVE_RETRIEVAL", False)
+    monkeypatch.setattr(nodes, "get_local_router", lambda: router)
+    monkeypatch.setattr(nodes, "query_router", llm)
+
+    state = {"messages": [HumanMessage("what is this bowl made of")]}
+    assert await nodes.router(state) == {"need_rag": True}  # type: ignore
+    assert llm.calls == 1 and len(router) == 1
+
+    agree = metrics.counter("router.agreement.agree").value
+    state = {"messages": [HumanMessage("what is this vase made of")]}
+    assert await nodes.router(state) == {"need_rag": True}  # type: ignore
+    assert llm.calls == 1
+
+    # 抽样复核在后台调用 LLM 路由并统计一致率
+    router.audit_rate = 1.0
+    assert await nodes.router(state) == {"need_rag": True}  # type: ignore
+    await asyncio.gather(*router._audits)
+    assert llm.calls == 2
+    assert metrics.counter("router.agreement.agree").value == agree + 1
+
+    assert await nodes.router({"messages": [HumanMessage("hi")]}) == {  # type: ignore
+        "need_rag": False
+    }
+    assert llm.calls == 2
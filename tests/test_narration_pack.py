@@ -0,0 +1,111 @@
+import json
+
+import pytest
+from langchain_core.messages import AIMessage
+
+import narrate
+from src.narration_pack import NarrationPack, read_manifest
+
+
+class FakeGraph:
+    def __init__(self):
+        self.calls = []
+
+    async def ainvoke(self, graph_input):
+        self.calls.append(graph_input["doc_id"])
+        return {
+            "messages": [
+                AIMessage(
+                    content=f"This is {graph_input['doc_id']}. It was made in 1791. "
+                    "It is porcelain."
+                )
+            ]
+        }
+
+
+def write_doc(root, doc_id, text):
+    docs_path = root / "data" / "Collection" / "docs"
+    docs_path.mkdir(parents=True, exist_ok=True)
+    (docs_path / f"{doc_id}.json").write_text(
+        json.dumps({"ids": doc_id, "documents": text, "metadata": {}}),
+        encoding="utf-8",
+    )
+
+
+@pytest.fixture
+def fake_graph(tmp_path, monkeypatch):
+    graph = FakeGraph()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(narrate, "graph", graph)
+    monkeypatch.setattr(narrate, "get_tts", lambda: lambda text: text.encode())
+    return graph
+
+
+@pytest.mark.asyncio
+async def test_only_changed_documents_are_regenerated(tmp_path, fake_graph):
+    output = tmp_path / "narrations"
+    write_doc(tmp_path, "plate", "# Plate")
+    write_doc(tmp_path, "bowl", "# Bowl")
+
+    await narrate.run(output, force=False, concurrency=2, jobs=2)
+    assert sorted(fake_graph.calls) == ["bowl", "plate"]
+    assert read_manifest(output)["version"] == 1
+
+    fake_graph.calls.clear()
+    await narrate.run(output, force=False, concurrency=2, jobs=2)
+    assert fake_graph.calls == []
+    assert read_manifest(output)["version"] == 1
+
+    write_doc(tmp_path, "bowl", "# Bowl (revised)")
+    await narrate.run(output, force=False, concurrency=2, jobs=2)
+    assert fake_graph.calls == ["bowl"]
+
+    # 旧版本的音频文件被清理, 剩余文件都被清单引用
+    manifest = read_manifest(output)
+    referenced = {f for entry in manifest["entries"].values() for f in entry["audio"]}
+    on_disk = {path.name for path in (output / "audio").glob("*.mp3")}
+    assert manifest["version"] == 2
+    assert on_disk == referenced
+
+
+@pytest.mark.asyncio
+async def test_pack_replays_text_and_audio_in_order(tmp_path, fake_graph):
+    output = tmp_path / "narrations"
+    write_doc(tmp_path, "plate", "# Plate")
+    await narrate.run(output, force=False, concurrency=2, jobs=1)
+
+    pack = NarrationPack(output)
+    frames = pack.frames("plate")
+    text = "This is plate. It was made in 1791. It is porcelain."
+
+    assert frames is not None
+    assert frames[0] == {"event": "message", "data": {"chunk": text}}
+    assert b"".join(frames[1:]).decode() == text
+    assert len(frames) > 2
+    assert pack.frames("unknown") is None
+    assert pack.version == 1
+
+
+@pytest.mark.asyncio
+async def test_incomplete_audio_is_regenerated(tmp_path, fake_graph, monkeypatch):
+    output = tmp_path / "narrations"
+    write_doc(tmp_path, "plate", "# Plate")
+
+    def flaky_tts(text):
+        if "1791" in text:
+            raise RuntimeError("TTS unavailable")
+        return text.encode()
+
+    monkeypatch.setattr(narrate, "get_tts", lambda: flaky_tts)
+    await narrate.run(output, force=False, concurrency=2, jobs=1)
+    assert "hash" not in read_manifest(output)["entries"]["plate"]
+    # 缺少音频的讲解不提供给访客, 由实时生成代替
+    assert NarrationPack(output).frames("plate") is None
+
+    # TTS 恢复后, 缺少音频的条目在下次运行时重新生成
+    monkeypatch.setattr(narrate, "get_tts", lambda: lambda text: text.encode())
+    fake_graph.calls.clear()
+    await narrate.run(output, force=False, concurrency=2, jobs=1)
+    assert fake_graph.calls == ["plate"]
+    assert "hash" in read_manifest(output)["entries"]["plate"]
+    assert NarrationPack(output).frames("plate") is not None
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage
+
+from src import metrics, nodes
+from src.models import QueryRouting
+
+
+class FakeRouter:
+    def __init__(self, need_rag: bool, delay: float = 0.05):
+        self.need_rag = need_rag
+        self.delay = delay
+
+    async def ainvoke(self, _):
+        await asyncio.sleep(self.delay)
+        return QueryRouting(need_rag=self.need_rag, reason="test")
+
+
+@pytest.fixture
+def speculation(monkeypatch):
+    """记录推测式检索的开始时间和是否被取消。"""
+    record = {"started": False, "cancelled": False}
+
+    async def fake_speculative_retrieval(state, with_rerank):
+        record["started"] = True
+        try:
+            await asyncio.sleep(0.02)
+        except asyncio.CancelledError:
+            record["cancelled"] = True
+            raise
+        return [Document(id="bowl", page_content="# Bowl")]
+
+    monkeypatch.setattr(nodes, "SPECULATIVE_RETRIEVAL", True)
+    monkeypatch.setattr(nodes, "LOCAL_ROUTER", False)
+    monkeypatch.setattr(nodes, "speculative_retrieval", fake_speculative_retrieval)
+    return record
+
+
+@pytest.mark.asyncio
+async def test_router_uses_speculative_docs(monkeypatch, speculation):
+    """
+    测试：路由判定需要RAG时，直接使用与路由并发取回的文档。
+    """
+    monkeypatch.setattr(nodes, "query_router", FakeRouter(need_rag=True))
+    used = metrics.counter("speculative_retrieval.used").value
+
+    result = await nodes.router({"messages": [HumanMessage("这个碗是什么做的？")]})  # type: ignore
+
+    assert result["need_rag"] is True
+    assert [doc.id for doc in result["docs"]] == ["bowl"]
+    assert metrics.counter("speculative_retrieval.used").value == used + 1
+
+
+@pytest.mark.asyncio
+async def test_router_discards_speculation_for_no_rag(monkeypatch, speculation):
+    monkeypatch.setattr(nodes, "query_router", FakeRouter(need_rag=False, delay=0))
+    wasted = metrics.counter("speculative_retrieval.wasted").value
+
+    result = await nodes.router({"messages": [HumanMessage("hi")]})  # type: ignore
+    await asyncio.sleep(0)
+
+    assert result == {"need_rag": False}
+    assert speculation["cancelled"]
+    assert metrics.counter("speculative_retrieval.wasted").value == wasted + 1
+
+
+@pytest.mark.asyncio
+async def test_router_skips_speculation_for_doc_id(speculation):
+    result = await nodes.router(
+        {"messages": [HumanMessage("tell me more")], "doc_id": "bowl"}  # type: ignore
+    )
+
+    assert result == {"need_rag": True}
+    assert not speculation["started"]
+
+
+@pytest.mark.asyncio
+async def test_generator_streams_only_stages_and_tokens(monkeypatch):
+    from langchain_core.language_models import FakeListChatModel
+
+    from src import chains
+    from src.graph import graph
+
+    monkeypatch.setattr(chains.remote, "llm", FakeListChatModel(responses=["Hi!"]))
+    graph_input = {"messages": [HumanMessage("hello")], "doc_id": None}
+
+    updates = [u async for u in graph.astream(graph_input, stream_mode="custom")]
+
+    assert updates == [
+        {"stage": "generating"},
+        {"chunk": "H"},
+        {"chunk": "i"},
+        {"chunk": "!"},
+    ]
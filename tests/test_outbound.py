@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+from src import metrics
+from src.accumulator import AudioAccumulator
+from src.outbound import OutboundQueue
+
+
+async def drain(outbound: OutboundQueue) -> list:
+    items = []
+    while (item := await outbound.get()) is not None:
+        items.append(item)
+    return items
+
+
+@pytest.mark.asyncio
+async def test_text_is_sent_before_queued_audio():
+    outbound = OutboundQueue()
+    await outbound.put_audio(b"a1")
+    await outbound.put({"event": "message", "data": {"chunk": "hi"}})
+    await outbound.close()
+
+    items = await drain(outbound)
+
+    assert items == [{"event": "message", "data": {"chunk": "hi"}}, b"a1"]
+
+
+@pytest.mark.asyncio
+async def test_queued_audio_is_coalesced_in_order(monkeypatch):
+    monkeypatch.setitem(
+        metrics._counters, "outbound.audio_coalesced", metrics.Counter()
+    )
+    outbound = OutboundQueue(coalesce_max_bytes=4)
+    for chunk in (b"ab", b"cd", b"ef"):
+        await outbound.put_audio(chunk)
+    await outbound.close()
+
+    assert await drain(outbound) == [b"abcd", b"ef"]
+    assert metrics.counter("outbound.audio_coalesced").value == 1
+
+
+@pytest.mark.asyncio
+async def test_drop_policy_skips_rest_of_answer_audio():
+    outbound = OutboundQueue(max_audio_bytes=4, policy="drop")
+    await outbound.put_audio(b"abc")
+    await outbound.put_audio(b"def")  # 超过上限: 放弃本次回答余下的音频
+    await outbound.put_audio(b"g")
+    await outbound.put({"event": "message", "data": {"chunk": "still here"}})
+    await outbound.close()
+
+    items = await drain(outbound)
+
+    assert outbound.audio_dropped
+    assert items == [
+        {"event": "audio_skipped", "data": {"reason": "slow"}},
+        {"event": "message", "data": {"chunk": "still here"}},
+        b"abc",
+    ]
+    assert outbound.high_water >= 3
+
+    # 下一个回答重新发送音频, 会话的峰值保留
+    outbound.reset()
+    await outbound.put_audio(b"h")
+    await outbound.close()
+    assert await drain(outbound) == [b"h"]
+    assert outbound.high_water >= 3
+
+
+@pytest.mark.asyncio
+async def test_block_policy_waits_for_sender():
+    outbound = OutboundQueue(max_audio_bytes=4, coalesce_max_bytes=3, policy="block")
+    await outbound.put_audio(b"abc")
+    producer = asyncio.create_task(outbound.put_audio(b"def"))
+    await asyncio.sleep(0.01)
+    assert not producer.done()
+
+    assert await outbound.get() == b"abc"
+    await asyncio.wait_for(producer, 1)
+    await outbound.close()
+
+    assert await drain(outbound) == [b"def"]
+    assert not outbound.audio_dropped
+    assert outbound.high_water == 3
+
+
+@pytest.mark.asyncio
+async def test_block_policy_pauses_accumulator():
+    started = []
+
+    async def tts(text):
+        started.append(text)
+        return text.encode().ljust(100, b".")
+
+    accumulator = AudioAccumulator(
+        tts_function=tts, num_sentence_cached=1, max_buffered_bytes=100
+    )
+    outbound = OutboundQueue(max_audio_bytes=100, policy="block")
+
+    async def forward():
+        async for chunk in accumulator:
+            await outbound.put_audio(chunk)
+        await outbound.close()
+
+    forwarder = asyncio.create_task(forward())
+    for idx in range(6):
+        await accumulator.add_chunk(f"Sentence {idx}. ")
+    await asyncio.sleep(0.05)
+
+    # 发送队列和 accumulator 都已满, 之后的段落不再合成
+    assert len(started) < 6
+
+    flush = asyncio.create_task(accumulator.flush())
+    assert len(await drain(outbound)) == 6
+    await flush
+    await forwarder
+    assert len(started) == 6
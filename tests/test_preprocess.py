@@ -0,0 +1,36 @@
+import pytest
+import spacy
+
+from src import utils
+from src.utils import preprocess
+
+TEXT = (
+    "# Bowl with cranes and clouds\n\n"
+    "China (Qing dynasty), HKU.C.1972.0432 ![](/static/images/1_1.jpeg)\n"
+    "這件瓷碗來自清代，釉色翠綠。 碗"
+)
+
+
+@pytest.fixture(autouse=True)
+def blank_models(monkeypatch):
+    # 测试环境中不一定安装了训练好的模型, 使用同语言的空白管线
+    monkeypatch.setattr(utils, "en_nlp", spacy.blank("en"))
+    monkeypatch.setattr(utils, "zh_nlp", spacy.blank("zh"))
+
+
+def test_batched_mode_matches_pipeline():
+    assert preprocess(TEXT, mode="batched") == preprocess(TEXT, mode="pipeline")
+
+
+def test_lookup_mode_removes_english_stop_words():
+    tokens = preprocess(TEXT, mode="lookup")
+
+    assert "with" not in tokens and "and" not in tokens
+    assert "cranes" in tokens and "1972" in tokens
+    assert "jpeg" not in tokens  # 图片链接已被移除
+    assert tokens == preprocess(TEXT, mode="batched")
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        preprocess(TEXT, mode="fast")
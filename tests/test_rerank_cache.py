@@ -0,0 +1,77 @@
+import pytest
+from langchain_core.documents import Document
+
+from src import metrics, retrieval_graph
+from src.rerank_cache import RerankScoreCache
+from src.rerank_client import RerankClient
+from tests.stubs import create_rerank_app, serve
+
+
+@pytest.fixture(scope="module")
+def rerank_app():
+    return create_rerank_app()
+
+
+@pytest.fixture
+def rerank(monkeypatch, rerank_app):
+    """让 rerank 节点使用本地桩服务和一个新的分数缓存。"""
+    with serve(rerank_app) as url:
+        client = RerankClient(endpoint=f"{url}/rerank", api_key="test")
+        cache = RerankScoreCache()
+        monkeypatch.setattr(retrieval_graph, "get_rerank_client", lambda: client)
+        monkeypatch.setattr(retrieval_graph, "get_rerank_cache", lambda: cache)
+        monkeypatch.setattr(retrieval_graph, "FINAL_DOCS_COUNT", 2)
+        rerank_app.state.requests.clear()
+        yield rerank_app.state.requests
+
+
+def make_docs(texts: list[str], distances: list[float] | None = None):
+    docs = []
+    for idx, text in enumerate(texts):
+        metadata = {} if distances is None else {"vector_distance": distances[idx]}
+        docs.append(Document(id=f"doc-{idx}", page_content=text, metadata=metadata))
+    return docs
+
+
+@pytest.mark.asyncio
+async def test_only_uncached_pairs_are_sent(rerank):
+    texts = ["blue bowl", "vase", "white bowl"]
+    first = await retrieval_graph._rerank_documents("Blue bowl", make_docs(texts))
+    assert [doc.id for doc in first] == ["doc-0", "doc-2"]
+    assert rerank == [("Blue bowl", 3)]
+
+    # 规范化后相同的查询完全命中缓存, 新增的文档单独请求
+    cached = metrics.counter("rerank.cached").value
+    again = await retrieval_graph._rerank_documents("  blue BOWL ", make_docs(texts))
+    assert [doc.id for doc in again] == ["doc-0", "doc-2"]
+    assert metrics.counter("rerank.cached").value == cached + 1
+
+    await retrieval_graph._rerank_documents(
+        "blue bowl", make_docs(texts + ["blue jar"])
+    )
+    assert rerank[1:] == [("blue bowl", 1)]
+
+
+@pytest.mark.asyncio
+async def test_changed_content_invalidates_cached_score(rerank):
+    await retrieval_graph._rerank_documents("bowl", make_docs(["bowl", "vase"]))
+    await retrieval_graph._rerank_documents("bowl", make_docs(["bowl", "bowl vase"]))
+
+    assert [count for _, count in rerank] == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_decisive_vector_gap_skips_rerank(rerank):
+    skipped = metrics.counter("rerank.skipped").value
+    docs = make_docs(["a", "b", "c", "d"], distances=[0.3, 0.2, 0.9, 1.0])
+
+    ranked = await retrieval_graph._rerank_documents("bowl", docs)
+
+    assert [doc.id for doc in ranked] == ["doc-1", "doc-0"]
+    assert rerank == []
+    assert metrics.counter("rerank.skipped").value == skipped + 1
+
+    # 距离差太小时仍然需要 rerank
+    close = make_docs(["a", "b", "c", "d"], distances=[0.3, 0.2, 0.35, 1.0])
+    await retrieval_graph._rerank_documents("bowl", close)
+    assert len(rerank) == 1
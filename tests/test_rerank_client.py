@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+from src import metrics, retrieval_graph
+from src.rerank_client import RerankClient
+from tests.stubs import create_rerank_app, serve
+
+DOCUMENTS = ["A vase from Jingdezhen", "A blue and white bowl", "A bowl with cranes"]
+
+
+@pytest.fixture(scope="module")
+def rerank_app():
+    return create_rerank_app()
+
+
+@pytest.fixture(scope="module")
+def rerank_url(rerank_app):
+    with serve(rerank_app) as url:
+        yield f"{url}/rerank"
+
+
+@pytest.fixture(autouse=True)
+def reset_stub(rerank_app):
+    rerank_app.state.requests.clear()
+    rerank_app.state.delays.clear()
+
+
+@pytest.mark.asyncio
+async def test_scores_follow_input_order(rerank_url):
+    client = RerankClient(endpoint=rerank_url, api_key="test")
+    scores = await client.scores("blue bowl", DOCUMENTS)
+    await client.aclose()
+
+    assert scores == [0.0, 1.0, 0.5]
+
+
+@pytest.mark.asyncio
+async def test_missed_deadline_returns_none(rerank_app, rerank_url):
+    rerank_app.state.delays.append(0.5)
+    timeouts = metrics.counter("rerank.timeouts").value
+    client = RerankClient(endpoint=rerank_url, api_key="test", deadline=0.1)
+
+    assert await client.scores("blue bowl", DOCUMENTS) is None
+    assert metrics.counter("rerank.timeouts").value == timeouts + 1
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_missed_deadline_cancels_upstream_requests(
+    monkeypatch, rerank_app, rerank_url
+):
+    rerank_app.state.delays.extend([1.0, 1.0])
+    monkeypatch.setitem(metrics._histograms, "rerank.latency", metrics.Histogram())
+    abandoned = metrics.counter("batch.rerank.abandoned").value
+    client = RerankClient(
+        endpoint=rerank_url, api_key="test", deadline=0.2, hedge_delay=0.05
+    )
+
+    assert await client.scores("blue bowl", DOCUMENTS) is None
+    await asyncio.sleep(0.05)
+
+    # 请求和对冲请求都已取消, 不会等到 httpx 超时
+    assert len(rerank_app.state.requests) == 2
+    assert not client._batcher._tasks
+    assert metrics.counter("batch.rerank.abandoned").value == abandoned + 1
+    assert metrics.histogram("rerank.latency").percentile(99) == 0.2
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_wins_over_slow_first_attempt(rerank_app, rerank_url):
+    rerank_app.state.delays.extend([1.0, 0.0])
+    client = RerankClient(
+        endpoint=rerank_url, api_key="test", deadline=0.5, hedge_delay=0.05
+    )
+
+    assert await client.scores("blue bowl", DOCUMENTS) == [0.0, 1.0, 0.5]
+    assert len(rerank_app.state.requests) == 2
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_rerank_falls_back_to_retrieval_order(monkeypatch, rerank_url):
+    """
+    测试：rerank 不可用时保留检索阶段的排序，不会让回答失败。
+    """
+    client = RerankClient(
+        endpoint=rerank_url.replace("/rerank", "/missing"), api_key="test"
+    )
+    monkeypatch.setattr(retrieval_graph, "get_rerank_client", lambda: client)
+    monkeypatch.setattr(retrieval_graph, "FINAL_DOCS_COUNT", 2)
+    docs = [Document(id=str(i), page_content=text) for i, text in enumerate(DOCUMENTS)]
+
+    ranked = await retrieval_graph._rerank_documents("blue bowl", docs)
+    await client.aclose()
+
+    assert [doc.id for doc in ranked] == ["0", "1"]
+    assert metrics.snapshot()["histograms"]["rerank.latency"]["count"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_one_call(rerank_app, rerank_url):
+    client = RerankClient(endpoint=rerank_url, api_key="test", max_wait=0.02)
+
+    results = await asyncio.gather(
+        *(client.scores("blue bowl", DOCUMENTS) for _ in range(10)),
+        client.scores("vase", DOCUMENTS),
+    )
+    await client.aclose()
+
+    assert results[:10] == [[0.0, 1.0, 0.5]] * 10
+    assert results[10] == [1.0, 0.0, 0.0]
+    assert sorted(rerank_app.state.requests) == [("blue bowl", 3), ("vase", 3)]
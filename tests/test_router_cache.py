@@ -0,0 +1,74 @@
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from src import metrics, nodes
+from src.models import QueryRouting
+from src.router_cache import RouterCache, routing_key
+
+ROUTING = QueryRouting(need_rag=True, reason="museum object")
+
+
+def test_routing_key_ignores_trivial_differences():
+    assert routing_key("  What is  this BOWL? ") == routing_key("what is this bowl")
+    assert routing_key("這是什麼？") == routing_key("這是什麼 ?")
+    assert routing_key("ＡＢＣ！") == "abc"
+
+
+def test_memory_tier_expires(monkeypatch):
+    cache = RouterCache(ttl=10)
+    cache.put("What is this bowl?", ROUTING)
+    assert cache.peek("what is this bowl") == ROUTING
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get("what is this bowl") is None
+
+
+def test_memory_tier_evicts_lru():
+    cache = RouterCache(max_entries=2)
+    cache.put("a", ROUTING)
+    cache.put("b", ROUTING)
+    cache.get("a")
+    cache.put("c", ROUTING)
+    assert cache.peek("b") is None
+    assert cache.peek("a") == ROUTING and cache.peek("c") == ROUTING
+
+
+def test_persistent_tier_survives_restart(tmp_path, monkeypatch):
+    path = tmp_path / "router_cache.sqlite"
+    RouterCache(path=path).put("What is this bowl?", ROUTING)
+
+    cache = RouterCache(path=path)
+    hits = metrics.counter("router_cache.hits.disk").value
+    assert cache.peek("what is this bowl") is None
+    assert cache.get("what is this bowl") == ROUTING
+    assert metrics.counter("router_cache.hits.disk").value == hits + 1
+    assert cache.peek("what is this bowl") == ROUTING
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 2 * cache.ttl)
+    assert RouterCache(path=path).get("what is this bowl") is None
+
+
+class CountingRouter:
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, _):
+        self.calls += 1
+        return ROUTING
+
+
+@pytest.mark.asyncio
+async def test_router_node_reuses_cached_routing(monkeypatch):
+    llm = CountingRouter()
+    monkeypatch.setattr(nodes, "LOCAL_ROUTER", False)
+    monkeypatch.setattr(nodes, "SPECULATIVE_RETRIEVAL", False)
+    monkeypatch.setattr(nodes, "query_router", llm)
+
+    for query in ["What is this bowl?", "what is this bowl", "WHAT IS THIS BOWL!!"]:
+        result = await nodes.router({"messages": [HumanMessage(query)]})  # type: ignore
+        assert result == {"need_rag": True}
+    assert llm.calls == 1
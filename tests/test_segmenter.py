@@ -0,0 +1,92 @@
+import random
+import re
+
+from src.segmenter import SegmentationPolicy, SentenceSegmenter
+
+LEGACY_PATTERN = re.compile(r"(.*?)[。！？!:\.\?][\n\s]", flags=re.MULTILINE)
+
+
+def _legacy_boundaries(text: str) -> list[int]:
+    return [match.end() for match in LEGACY_PATTERN.finditer(text)]
+
+
+def test_boundaries_match_legacy_regex():
+    """
+    测试：逐 token 输入时, 增量分句器找到的句子边界与旧版正则完全一致。
+    """
+    rng = random.Random(0)
+    alphabet = list("abc 你好。！？!:.?\n\t") + ["![图片](http://a.com/b.png)"]
+
+    for _ in range(200):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+        segmenter = SentenceSegmenter()
+        pos = 0
+        while pos < len(text):
+            size = rng.randint(1, 5)
+            segmenter.feed(text[pos : pos + size])
+            pos += size
+
+        legacy = _legacy_boundaries(text)
+        assert segmenter.num_sentence == len(legacy)
+        assert segmenter.pop_sentences() == text[: legacy[-1] if legacy else 0]
+
+
+def test_terminator_split_across_chunks():
+    """
+    测试：句末标点和空白字符分属两个文本块时, 仍能识别句子边界。
+    """
+    segmenter = SentenceSegmenter()
+
+    assert segmenter.feed("Hello world.") == 0
+    assert segmenter.feed(" Next") == 1
+    assert segmenter.pop_sentences() == "Hello world. "
+    assert segmenter.buffer == "Next"
+
+
+def test_cjk_and_latin_terminators():
+    segmenter = SentenceSegmenter()
+
+    assert segmenter.feed("第一句。 Second one! 第三句？\n未完") == 3
+    assert segmenter.pop_sentences() == "第一句。 Second one! 第三句？\n"
+    assert segmenter.drain() == "未完"
+    assert segmenter.buffer == ""
+
+
+def test_policy_first_segment_ends_at_first_clause():
+    """
+    测试：第一段在达到预算后的第一个分句边界处切分，之后的段落只在句子边界切分。
+    """
+    policy = SegmentationPolicy(
+        first_segment_chars=5, growth_factor=2, max_segment_chars=100
+    )
+    segmenter = SentenceSegmenter(track_clauses=True)
+
+    segmenter.feed("啊，這件瓷碗來自清代，")
+    split_pos = policy.split_position(segmenter, 0)
+    assert segmenter.pop(split_pos) == "啊，這件瓷碗來自清代，"
+
+    # 第二段的预算为 10 个字符，分句边界不再触发切分
+    segmenter.feed("釉色翠綠，")
+    assert policy.split_position(segmenter, 1) is None
+    segmenter.feed("非常罕見。 接著")
+    assert segmenter.pop(policy.split_position(segmenter, 1)) == "釉色翠綠，非常罕見。 "
+
+
+def test_policy_budget_grows_until_max():
+    policy = SegmentationPolicy(
+        first_segment_chars=10, growth_factor=3, max_segment_chars=200
+    )
+
+    assert [policy.budget(i) for i in range(5)] == [10, 30, 90, 200, 200]
+
+
+def test_policy_never_exceeds_max_segment_length():
+    policy = SegmentationPolicy(first_segment_chars=5, max_segment_chars=20)
+    segmenter = SentenceSegmenter(track_clauses=True)
+
+    segmenter.feed("one two, three four five six seven eight")
+    split_pos = policy.split_position(segmenter, 1)
+
+    assert segmenter.pop(split_pos) == "one two, "
+    segmenter.feed(" nine ten eleven")
+    assert len(segmenter.pop(policy.split_position(segmenter, 2))) <= 20
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.language_models import FakeListChatModel
+from starlette.websockets import WebSocketDisconnect
+from websockets.asyncio.client import connect
+
+from src import chains, main, metrics, nodes
+from src.answer_cache import AnswerCache
+from src.session import SESSION_LIMIT_CLOSE_CODE, SessionRegistry, checkpointer
+from tests.stubs import serve
+
+
+class FakeTTS:
+    async def stream(self, text):
+        yield text.encode()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(chains.remote, "llm", FakeListChatModel(responses=["Hi!"]))
+    monkeypatch.setattr(main, "get_async_tts", lambda: FakeTTS())
+    monkeypatch.setattr(main, "get_answer_cache", lambda: AnswerCache(embed=None))
+    monkeypatch.setattr(main, "sessions", SessionRegistry(max_sessions=4))
+    return TestClient(main.app)
+
+
+def receive_answer(websocket) -> list:
+    frames = []
+    while True:
+        message = websocket.receive()
+        frame = message.get("bytes") or json.loads(message["text"])
+        frames.append(frame)
+        if isinstance(frame, dict) and frame["event"] in ("done", "error"):
+            return frames
+
+
+def test_one_connection_answers_many_queries(monkeypatch, client):
+    monkeypatch.setattr(nodes, "HISTORY_MAX_MESSAGES", 4)
+
+    with client.websocket_connect("/api/v1/invoke") as websocket:
+        for query in ["hello", "thanks", "what is 1 + 1"]:
+            websocket.send_json({"query": query})
+            frames = receive_answer(websocket)
+            assert frames[0]["event"] == "connected"
+            assert frames[-1]["event"] == "done"
+            assert {"event": "message", "data": {"chunk": "H"}} in frames
+            assert b"Hi!" in frames
+
+        assert main.sessions.active == 1
+        (thread_id,) = checkpointer.storage.keys()
+        # 只保留最新的 checkpoint, 历史消息不超过上限
+        assert len(checkpointer.storage[thread_id][""]) == 1
+        state = main.session_graph.get_state({"configurable": {"thread_id": thread_id}})
+        assert [m.content for m in state.values["messages"]] == [
+            "thanks",
+            "Hi!",
+            "what is 1 + 1",
+            "Hi!",
+        ]
+
+    assert main.sessions.active == 0
+    assert thread_id not in checkpointer.storage
+
+
+def test_error_does_not_end_session(client):
+    with client.websocket_connect("/api/v1/invoke") as websocket:
+        websocket.send_json({})
+        assert receive_answer(websocket)[-1]["data"]["error"] == "ValueError"
+
+        websocket.send_json({"query": "hello"})
+        assert receive_answer(websocket)[-1]["event"] == "done"
+
+
+def test_rejects_sessions_over_cap(monkeypatch, client):
+    monkeypatch.setattr(main, "sessions", SessionRegistry(max_sessions=0))
+
+    with client.websocket_connect("/api/v1/invoke") as websocket:
+        error = websocket.receive_json()
+        assert error["data"]["error"] == "SessionLimitExceeded"
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            websocket.receive_json()
+    assert exc_info.value.code == SESSION_LIMIT_CLOSE_CODE
+
+
+def test_setup_failure_releases_session(monkeypatch, client):
+    def missing_tts():
+        raise ValueError("TTS is not configured.")
+
+    monkeypatch.setattr(main, "get_async_tts", missing_tts)
+
+    for _ in range(5):  # 超过 4 个名额也不会被拒绝
+        with client.websocket_connect("/api/v1/invoke") as websocket:
+            error = websocket.receive_json()
+            assert error["event"] == "error"
+            assert error["data"]["error"] == "ValueError"
+    assert main.sessions.active == 0
+
+
+def test_idle_session_is_closed(monkeypatch, client):
+    monkeypatch.setattr(main, "SESSION_IDLE_TIMEOUT", 0.1)
+
+    with client.websocket_connect("/api/v1/invoke") as websocket:
+        with pytest.raises(WebSocketDisconnect):
+            websocket.receive_json()
+    assert main.sessions.active == 0
+
+
+def test_cached_answer_joins_history(monkeypatch, client):
+    cache = AnswerCache(embed=None)
+    monkeypatch.setattr(main, "get_answer_cache", lambda: cache)
+    frames = [{"event": "message", "data": {"chunk": "Cached."}}, b"audio"]
+
+    asyncio.run(cache.store("hello", None, frames))
+
+    with client.websocket_connect("/api/v1/invoke") as websocket:
+        websocket.send_json({"query": "hello"})
+        assert receive_answer(websocket)[1:-1] == frames
+
+        websocket.send_json({"query": "thanks"})
+        receive_answer(websocket)
+        (thread_id,) = checkpointer.storage.keys()
+        state = main.session_graph.get_state({"configurable": {"thread_id": thread_id}})
+        assert [m.content for m in state.values["messages"]] == [
+            "hello",
+            "Cached.",
+            "thanks",
+            "Hi!",
+        ]
+
+
+def test_narration_pack_replayed_after_first_turn(monkeypatch, client):
+    frames = [{"event": "message", "data": {"chunk": "A Qing bowl."}}, b"narration"]
+
+    class FakePack:
+        def frames(self, doc_id):
+            return frames if doc_id == "1_1" else None
+
+    monkeypatch.setattr(main, "get_narration_pack", lambda: FakePack())
+
+    with client.websocket_connect("/api/v1/invoke") as websocket:
+        websocket.send_json({"query": "hello"})
+        receive_answer(websocket)
+
+        # 第二轮扫码: 仍然重放离线讲解, 不调用 LLM 和 TTS
+        websocket.send_json({"doc_id": "1_1"})
+        assert receive_answer(websocket)[1:-1] == frames
+
+        (thread_id,) = checkpointer.storage.keys()
+        state = main.session_graph.get_state({"configurable": {"thread_id": thread_id}})
+        assert [m.content for m in state.values["messages"]] == [
+            "hello",
+            "Hi!",
+            main.DEFAULT_NARRATION_QUERY,
+            "A Qing bowl.",
+        ]
+
+
+def test_llm_error_cancels_answer_and_keeps_session(monkeypatch, client):
+    failing = FakeListChatModel(responses=["Hello there!"], error_on_chunk_number=3)
+    monkeypatch.setattr(chains.remote, "llm", failing)
+    cancelled = metrics.counter("cancel.answers").value
+
+    with client.websocket_connect("/api/v1/invoke") as websocket:
+        websocket.send_json({"query": "hello"})
+        assert receive_answer(websocket)[-1]["event"] == "error"
+        assert metrics.counter("cancel.answers").value == cancelled + 1
+
+        monkeypatch.setattr(chains.remote, "llm", FakeListChatModel(responses=["Hi!"]))
+        websocket.send_json({"query": "thanks"})
+        assert receive_answer(websocket)[-1]["event"] == "done"
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_generation(monkeypatch, client):
+    slow = FakeListChatModel(responses=["a" * 200], sleep=0.02)
+    monkeypatch.setattr(chains.remote, "llm", slow)
+    # 已完成回答的长度中位数为 200 tokens
+    monkeypatch.setitem(metrics._histograms, "generation.tokens", metrics.Histogram())
+    metrics.histogram("generation.tokens").observe(200)
+    cancelled = metrics.counter("cancel.answers").value
+    tokens_saved = metrics.counter("cancel.tokens_saved").value
+
+    with serve(main.app) as base_url:
+        url = base_url.replace("http", "ws") + "/api/v1/invoke"
+        async with connect(url) as websocket:
+            await websocket.send(json.dumps({"query": "hello"}))
+            while json.loads(await websocket.recv())["event"] != "message":
+                pass
+
+        # 访客离开后回答立即被取消, 不必等到生成结束 (约 4 秒)
+        deadline = time.monotonic() + 2
+        while metrics.counter("cancel.answers").value == cancelled:
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.01)
+        assert metrics.counter("cancel.tokens_saved").value > tokens_saved + 100
+        assert main.sessions.active == 0
@@ -0,0 +1,90 @@
+import json
+
+import setup
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+        self.upserts = []
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        self.upserts.append([metadata["parent_id"] for metadata in metadatas])
+        for chunk_id, document, metadata in zip(ids, documents, metadatas):
+            self.docs[chunk_id] = (document, metadata)
+
+    def delete(self, ids=None, where=None):
+        if where is not None:
+            parents = where["parent_id"]["$in"]
+            ids = [i for i, (_, m) in self.docs.items() if m["parent_id"] in parents]
+        for chunk_id in ids:
+            self.docs.pop(chunk_id, None)
+
+
+def fake_embedding_function(documents):
+    return [[float(len(document))] for document in documents]
+
+
+def write_doc(root, doc_id, text, metadata=None):
+    docs_path = root / "data" / "Collection" / "docs"
+    docs_path.mkdir(parents=True, exist_ok=True)
+    (docs_path / f"{doc_id}.json").write_text(
+        json.dumps({"ids": doc_id, "documents": text, "metadata": metadata or {}}),
+        encoding="utf-8",
+    )
+
+
+def test_ingest_skips_unchanged_and_removes_deleted(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    collection = FakeCollection()
+    for i in range(5):
+        write_doc(tmp_path, f"doc-{i}", f"# Object {i}")
+
+    manifest, timings, changed = setup.ingest(
+        collection,
+        {},
+        embedding_function=fake_embedding_function,
+        batch_size=2,
+        docs_per_task=5,
+    )
+    assert changed
+    assert len(manifest) == 5
+    assert [len(batch) for batch in collection.upserts] == [2, 2, 1]
+    assert {"scan", "diff", "embed + upsert", "upsert"} <= timings.keys()
+
+    # 只修改元数据中会被丢弃的字段, 内容哈希不变
+    write_doc(tmp_path, "doc-0", "# Object 0", {"description": "ignored"})
+    collection.upserts.clear()
+    manifest, _, changed = setup.ingest(
+        collection, manifest, embedding_function=fake_embedding_function
+    )
+    assert not changed
+    assert collection.upserts == []
+
+    write_doc(tmp_path, "doc-1", "# Object 1 (revised)")
+    (tmp_path / "data" / "Collection" / "docs" / "doc-2.json").unlink()
+    manifest, _, changed = setup.ingest(
+        collection, manifest, embedding_function=fake_embedding_function
+    )
+    assert changed
+    assert collection.upserts == [["doc-1"]]
+    assert collection.docs["doc-1#0"][0] == "# Object 1 (revised)"
+    assert "doc-2#0" not in collection.docs
+    assert "doc-2" not in manifest
+
+
+def test_ingest_replaces_all_chunks_of_a_changed_document(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    collection = FakeCollection()
+    paragraphs = [f"Paragraph {i}. " + "porcelain " * 60 for i in range(6)]
+    write_doc(tmp_path, "essay", "# Essay\n\n" + "\n\n".join(paragraphs))
+
+    manifest, _, _ = setup.ingest(
+        collection, {}, embedding_function=fake_embedding_function
+    )
+    assert len(collection.docs) > 2
+
+    # 文档变短后, 多出来的旧片段也被删除
+    write_doc(tmp_path, "essay", "# Essay\n\nA short essay.")
+    setup.ingest(collection, manifest, embedding_function=fake_embedding_function)
+    assert list(collection.docs) == ["essay#0"]
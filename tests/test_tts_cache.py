@@ -0,0 +1,56 @@
+from src import metrics
+from src.tts_cache import TTSCache
+
+
+def test_key_ignores_whitespace_and_width():
+    """
+    测试：空白和全角/半角差异不影响缓存键，但声音和模型会影响。
+    """
+    key = TTSCache.make_key("你好！ 歡迎", "alloy", "tts")
+
+    assert TTSCache.make_key("  你好!   歡迎\n", "alloy", "tts") == key
+    assert TTSCache.make_key("你好！ 歡迎", "nova", "tts") != key
+    assert TTSCache.make_key("你好！ 歡迎", "alloy", "tts-hd") != key
+
+
+def test_memory_lru_eviction():
+    cache = TTSCache(cache_dir=None, max_memory_bytes=10)
+
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    assert cache.get("a") == b"12345"  # a 成为最近使用
+    cache.put("c", b"12345")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"12345"
+    assert cache.get("c") == b"12345"
+
+
+def test_disk_tier_survives_restart_and_counts_hits(tmp_path):
+    """
+    测试：磁盘层在新实例中仍可命中，并被提升到内存层。
+    """
+    hits_disk = metrics.counter("tts_cache.hits.disk").value
+    hits_memory = metrics.counter("tts_cache.hits.memory").value
+    misses = metrics.counter("tts_cache.misses").value
+
+    TTSCache(cache_dir=tmp_path).put("key", b"audio")
+    cache = TTSCache(cache_dir=tmp_path)
+
+    assert cache.get("missing") is None
+    assert cache.get("key") == b"audio"
+    assert cache.get("key") == b"audio"
+
+    assert metrics.counter("tts_cache.misses").value == misses + 1
+    assert metrics.counter("tts_cache.hits.disk").value == hits_disk + 1
+    assert metrics.counter("tts_cache.hits.memory").value == hits_memory + 1
+
+
+def test_disk_eviction_removes_oldest_files(tmp_path):
+    cache = TTSCache(cache_dir=tmp_path, max_disk_bytes=10)
+
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    cache.put("c", b"12345")
+
+    assert sorted(p.stem for p in tmp_path.glob("*.mp3")) == ["b", "c"]
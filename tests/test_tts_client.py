@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from src.accumulator import AudioAccumulator
+from src.tts_cache import TTSCache
+from src.tts_client import AsyncTTSClient
+from tests.stubs import create_tts_app, serve
+
+
+@pytest.fixture(scope="module")
+def tts_app():
+    return create_tts_app()
+
+
+@pytest.fixture(scope="module")
+def tts_url(tts_app):
+    with serve(tts_app) as url:
+        yield f"{url}/tts"
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_before_response_completes(tts_url):
+    """
+    测试：响应体的第一块到达时即可产出，不必等待整段音频。
+    """
+    client = AsyncTTSClient(endpoint=tts_url, api_key="test")
+    start = time.perf_counter()
+    arrivals = []
+    chunks = []
+    async for chunk in client.stream("hello"):
+        arrivals.append(time.perf_counter() - start)
+        chunks.append(chunk)
+    await client.aclose()
+
+    assert b"".join(chunks) == b"hello:0;hello:1;hello:2;hello:3;"
+    assert len(arrivals) == 4
+    assert arrivals[0] < arrivals[-1] - 0.1
+
+
+@pytest.mark.asyncio
+async def test_connections_are_reused(tts_app, tts_url):
+    client = AsyncTTSClient(endpoint=tts_url, api_key="test")
+    tts_app.state.requests.clear()
+
+    for _ in range(3):
+        assert await client.synthesize("reuse")
+    await client.aclose()
+
+    ports = {port for _, port in tts_app.state.requests}
+    assert len(ports) == 1
+
+
+@pytest.mark.asyncio
+async def test_per_call_timeout_returns_none(tts_url):
+    client = AsyncTTSClient(endpoint=tts_url, api_key="test")
+
+    assert await client.synthesize("slow text", timeout=0.2) is None
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_skips_network(tts_app, tts_url):
+    cache = TTSCache(cache_dir=None)
+    client = AsyncTTSClient(endpoint=tts_url, api_key="test", cache=cache)
+    tts_app.state.requests.clear()
+
+    first = await client.synthesize("cached")
+    second = await client.synthesize("cached")
+    await client.aclose()
+
+    assert first == second
+    assert len(tts_app.state.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_accumulator_streams_segments_in_order(tts_url):
+    """
+    测试：AudioAccumulator 使用流式TTS时，各段落的音频块按文本顺序交付。
+    """
+    client = AsyncTTSClient(endpoint=tts_url, api_key="test")
+    accumulator = AudioAccumulator(tts_function=client.stream, num_sentence_cached=1)
+
+    await accumulator.add_chunk("First. ")
+    await accumulator.add_chunk("Second. ")
+    await accumulator.flush()
+    audio = b"".join([chunk async for chunk in accumulator])
+    await client.aclose()
+
+    assert audio == b"".join(
+        f"{text}:{idx};".encode()
+        for text in ["First. ", "Second. "]
+        for idx in range(4)
+    )